@@ -0,0 +1,127 @@
+"""
+
+Compares answering queries on the saved course data by loading the JSON into pandas and scanning it, as before, with
+a course store written by udemine.convert_json. The courses of Course Data/Udemy_Data_Science_Courses.json are copied
+--scale times under new links, each with --reviews made up reviews, to see how both grow with the data. For every
+query it reports the time to get the answer from a cold start, which for the JSON includes loading it and for the
+store opening it, and the time of the query alone once loaded or opened.
+Run it from the root of the repository: python benchmarks/bench_course_store.py [--scale 20] [--reviews 20]
+
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import pandas as pd  # noqa: E402
+from udemine import CourseStore, convert_json, to_count, to_number  # noqa: E402
+
+COURSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Course Data',
+                       'Udemy_Data_Science_Courses.json')
+WORDS = ('clear examples great pace boring projects math python explained instructor excellent slow practical '
+         'exercises quizzes outdated helpful detailed beginner advanced').split()
+
+
+def make_data(folder, scale, reviews):
+    """
+
+    writes the scaled courses as a JSON array and their reviews as JSON lines, and returns both paths
+
+    """
+
+    with open(COURSES, encoding='utf-8') as f:
+        courses = json.load(f)
+    random.seed(0)
+    courses_path, reviews_path = os.path.join(folder, 'courses.json'), os.path.join(folder, 'reviews.jsonl')
+    scaled = list()
+    with open(reviews_path, 'w', encoding='utf-8') as f:
+        for copy in range(scale):
+            for course in courses:
+                course = dict(course, link=f"{course['link']}{copy}/")
+                scaled.append(course)
+                for i in range(reviews):
+                    f.write(json.dumps({'course_link': course['link'], 'customer_name': f'learner {i}',
+                                        'time_posted': f'{random.randint(1, 11)} months ago',
+                                        'review': ' '.join(random.sample(WORDS, 8)),
+                                        'ratings': f'Rating: {random.randint(1, 5)}.0 out of 5'}) + '\n')
+    with open(courses_path, 'w', encoding='utf-8') as f:
+        json.dump(scaled, f)
+    return courses_path, reviews_path
+
+
+def has_words(series, words):
+    """
+
+    the pandas scan: rows of series that have every word, the way the store splits text into words
+
+    """
+
+    found = pd.Series(True, index=series.index)
+    for word in words:
+        found &= series.str.lower().str.contains(rf'\b{re.escape(word)}\b', regex=True)
+    return found
+
+
+def load_json(courses_path, reviews_path):
+    with open(courses_path, encoding='utf-8') as f:
+        courses = pd.DataFrame(json.load(f))
+    courses['text'] = courses['title'] + ' ' + courses['topics'] + ' ' + courses['summary'] + ' ' + \
+        courses['lectures_breakdown'].map(lambda lectures: ' '.join(title for title, _ in lectures or []))
+    with open(reviews_path, encoding='utf-8') as f:
+        reviews = pd.DataFrame([json.loads(line) for line in f])
+    return courses, reviews
+
+
+QUERIES = {
+    'keyword': (lambda c, r: c[has_words(c['text'], ['neural', 'networks'])],
+                lambda s: s.search('neural networks', columns=['title'])),
+    'instructor': (lambda c, r: c[c['instructor_name'].str.lower().str.split(' -&- ')
+                                  .map(lambda names: 'jose portilla' in (names or []))],
+                   lambda s: s.search(instructor='Jose Portilla', columns=['title'])),
+    'keyword + students': (lambda c, r: c[has_words(c['text'], ['python']) &
+                                          (to_count(c['total_students']) >= 100000).fillna(False)],
+                           lambda s: s.search('python', total_students=(100000, None), columns=['title'])),
+    'review keyword + rating': (lambda c, r: r[has_words(r['review'], ['excellent', 'practical']) &
+                                               (to_number(r['ratings']) >= 4)],
+                                lambda s: s.search('excellent practical', table='reviews', rating=(4, None),
+                                                   columns=['review'])),
+}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=20, help='copies of the saved courses')
+    parser.add_argument('--reviews', type=int, default=20, help='made up reviews per course')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        courses_path, reviews_path = make_data(folder, args.scale, args.reviews)
+        store_path = os.path.join(folder, 'store')
+        convert_ms, _ = timed(convert_json, courses_path, store_path, reviews_path)
+        load_ms, (courses, reviews) = timed(load_json, courses_path, reviews_path)
+        print(f'{len(courses)} courses and {len(reviews)} reviews; converting to a store took {convert_ms:.0f} ms, '
+              f'loading the JSON into pandas {load_ms:.0f} ms')
+
+        print(f"{'query':>24} {'rows':>6} {'json cold':>10} {'json warm':>10} {'store cold':>11} {'store warm':>11}")
+        for name, (scan, lookup) in QUERIES.items():
+            scan_ms, expected = timed(scan, courses, reviews)
+            cold_ms, found = timed(lambda: lookup(CourseStore(store_path)))
+            store = CourseStore(store_path)
+            lookup(store)
+            warm_ms, found = timed(lookup, store)
+            store.close()
+            assert len(found) == len(expected), (name, len(found), len(expected))
+            print(f'{name:>24} {len(found):>6} {load_ms + scan_ms:>10.1f} {scan_ms:>10.1f} {cold_ms:>11.2f} '
+                  f'{warm_ms:>11.2f}')
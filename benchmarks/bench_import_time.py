@@ -0,0 +1,87 @@
+"""
+
+Measures how long a fresh Python process takes to import udemine, and what it takes to import the dependencies that
+are now loaded lazily, as the module used to on every import. Each case runs in a new interpreter several times and
+the median is reported, together with the modules that took the longest under python -X importtime.
+Run it from the root of the repository: python benchmarks/bench_import_time.py [--repeat 10]
+
+"""
+
+import argparse
+import os
+import py_compile
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+TIMED = "import time; start = time.perf_counter(); {}; print(time.perf_counter() - start)"
+CASES = {
+    'import udemine': 'import udemine',
+    'eager dependencies': 'import selenium.webdriver, selenium.webdriver.support.expected_conditions, tqdm, pandas',
+    'import + DataFrame': 'import udemine; udemine.pd.DataFrame()',
+    'import + parse page': "import udemine; udemine.html_snapshot('<p>x</p>', {'p': '//p'})",
+}
+
+
+def run(code):
+    """
+
+    returns the seconds taken by code in a new interpreter
+
+    """
+
+    output = subprocess.run([sys.executable, '-c', TIMED.format(code)], cwd=ROOT, capture_output=True, text=True,
+                            check=True).stdout
+    return float(output)
+
+
+def import_times(code):
+    """
+
+    returns the cumulative milliseconds of every module imported by code, going by python -X importtime
+
+    """
+
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    times = dict()
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.rstrip()] = int(cumulative) / 1000
+    return times
+
+
+def slowest_imports(count):
+    """
+
+    returns the count modules with the longest cumulative import time when importing udemine, leaving out those the
+    interpreter imports on its own at startup
+
+    """
+
+    startup = {name.strip() for name in import_times('pass')}
+    times = import_times('import udemine')
+    return sorted(((ms, name) for name, ms in times.items() if name.strip() not in startup), reverse=True)[:count]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    args = parser.parse_args()
+
+    py_compile.compile(os.path.join(ROOT, 'udemine.py'))  # time the import, not compiling the source
+    print(f"{'case':>22} {'median ms':>10} {'min ms':>8}")
+    for name, code in CASES.items():
+        try:
+            times = [run(code) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError:  # a dependency of this case is not installed
+            print(f'{name:>22} {"n/a":>10}')
+            continue
+        print(f'{name:>22} {statistics.median(times) * 1000:>10.1f} {min(times) * 1000:>8.1f}')
+    print('\nSlowest imports under import udemine (cumulative ms):')
+    for ms, name in slowest_imports(args.top):
+        print(f'{ms:>8.1f} {name}')
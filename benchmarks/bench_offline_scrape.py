@@ -0,0 +1,86 @@
+"""
+
+Runs udemine.scraper end to end in headless Chrome against the local fixture site of fixture_server.py, so that the
+speed of a change can be measured without going online. For every extraction mode asked for, it reports the courses
+scraped per minute, the WebDriver round-trips per course, the peak memory of the Python side and the time spent in
+each phase. The browsers are lean and shared by all the runs; pass --plain to compare with browsers that download
+everything. Needs Chrome and chromedriver on the PATH.
+Run it from the root of the repository: python benchmarks/bench_offline_scrape.py [--latency 0.05] [--workers 2]
+
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from udemine import EXTRACTIONS, Profiler, RateGovernor, SessionManager, scraper  # noqa: E402
+from fixture_server import FixtureSite, serve  # noqa: E402
+
+PHASES = ['page load', 'requirement check', 'scrape_original', 'scrape_revised', 'review_scraper']
+
+
+def run(base_url, extraction, sessions, args):
+    """
+
+    scrapes the fixture site once and returns the courses, reviews, seconds taken, peak traced memory and profiler
+
+    """
+
+    profiler = Profiler()
+    governor = RateGovernor(rate=1000, burst=1000)  # the fixture site does not need protecting
+    tracemalloc.start()
+    start = time.perf_counter()
+    reviews, courses = scraper('python machine learning', 'Machine Learning', workers=args.workers,
+                               extraction=extraction, max_reviews=args.max_reviews,
+                               review_source=args.review_source, governor=governor, profiler=profiler,
+                               base_url=base_url, sessions=sessions)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return courses, reviews, seconds, peak, profiler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the server waits before every response')
+    parser.add_argument('--courses', type=int, default=40)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--reviews', type=int, default=60, help='reviews on every course page')
+    parser.add_argument('--max-reviews', type=int, default=50)
+    parser.add_argument('--format', choices=['mixed', 'original', 'revised'], default='mixed')
+    parser.add_argument('--archive', help='serve the course pages recorded in this PageArchive folder')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--review-source', choices=['browser', 'api'], default='browser')
+    parser.add_argument('--extraction', nargs='+', choices=EXTRACTIONS, default=list(EXTRACTIONS))
+    parser.add_argument('--plain', action='store_true',
+                        help='use browsers that download everything, to compare against lean ones')
+    args = parser.parse_args()
+
+    site = FixtureSite(args.courses, args.per_page, args.reviews, args.format, archive=args.archive)
+    server, base_url = serve(site, args.latency)
+    print(f'Fixture site with {len(site.paths)} courses at {base_url}, {args.latency * 1000:.0f} ms latency')
+    results = dict()
+    sessions = SessionManager(lean=not args.plain)  # the browsers stay open from one extraction mode to the next
+    try:
+        for extraction in args.extraction:
+            courses, reviews, seconds, peak, profiler = run(base_url, extraction, sessions, args)
+            report = profiler.report()
+            round_trips = report.reindex(PHASES)['round_trips'].sum()
+            results[extraction] = (len(courses), len(reviews), seconds, peak, round_trips, report)
+    finally:
+        sessions.close()
+        server.shutdown()
+
+    print(f"{'extraction':>10} {'courses':>8} {'reviews':>8} {'seconds':>8} {'courses/min':>12} "
+          f"{'trips/course':>13} {'peak MB':>8}")
+    for extraction, (courses, reviews, seconds, peak, round_trips, _) in results.items():
+        print(f'{extraction:>10} {courses:>8} {reviews:>8} {seconds:>8.1f} {courses / seconds * 60:>12.1f} '
+              f'{round_trips / max(courses, 1):>13.1f} {peak / 2 ** 20:>8.1f}')
+    print(f'peak resident memory of the Python process: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB')
+    for extraction, (*_, report) in results.items():
+        print(f'\nTime per phase with {extraction} extraction:')
+        print(report.round(3).to_string())
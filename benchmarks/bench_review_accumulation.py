@@ -0,0 +1,62 @@
+"""
+
+Compares collecting scraped reviews by concatenating DataFrames, which is what review_scraper used to do, against
+collecting them in udemine's ColumnBuffer and building the DataFrame once.
+Run it from the root of the repository: python benchmarks/bench_review_accumulation.py [total reviews ...]
+
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from udemine import ColumnBuffer, REVIEW_COLUMNS  # noqa: E402
+
+REVIEWS_PER_COURSE = 25  # a course page shows about this many reviews after expanding the review section
+
+
+def course_batches(total):
+    """
+
+    yields the review rows of one course at a time until total reviews have been produced
+
+    """
+
+    for start in range(0, total, REVIEWS_PER_COURSE):
+        link = f"https://www.udemy.com/course/course-{start // REVIEWS_PER_COURSE}/"
+        yield [(link, f"Customer {i}", "3 weeks ago", "A very helpful course. " * 8, "4.5 out of 5")
+               for i in range(start, min(start + REVIEWS_PER_COURSE, total))]
+
+
+def accumulate_concat(total):
+    df = pd.DataFrame(columns=REVIEW_COLUMNS)
+    for rows in course_batches(total):
+        df = pd.concat([df, pd.DataFrame(rows, columns=REVIEW_COLUMNS)], ignore_index=True)
+    return df
+
+
+def accumulate_buffer(total):
+    reviews = ColumnBuffer(REVIEW_COLUMNS)
+    for rows in course_batches(total):
+        reviews.extend(rows)
+    return reviews.to_frame()
+
+
+def timed(func, total):
+    start = time.perf_counter()
+    df = func(total)
+    elapsed = time.perf_counter() - start
+    assert len(df) == total
+    return elapsed
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'reviews':>10} {'pd.concat (s)':>15} {'ColumnBuffer (s)':>18} {'speedup':>9}")
+    for total in sizes:
+        concat = timed(accumulate_concat, total)
+        buffer = timed(accumulate_buffer, total)
+        print(f"{total:>10,} {concat:>15.3f} {buffer:>18.3f} {concat / buffer:>8.1f}x")
@@ -0,0 +1,131 @@
+"""
+
+Compares the cost of reading the fields of a course page with each selector profile of udemine. On saved HTML it
+times the XPath of every profile against the selectors used before the registry, which matched both page formats at
+once and told them apart by the text of the rating; with cssselect installed, the CSS of every profile is timed too.
+With --browser, it also times the CSS and XPath of every profile in headless Chrome against the fixture site, read
+element by element and in bulk. Run it from the root of the repository:
+python benchmarks/bench_selector_profiles.py [--pages 50] [--browser]
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lxml import html  # noqa: E402
+from udemine import (ROUND_TRIPS, SELECTOR_PROFILES, REVIEW_SELECTORS, bulk_snapshot, count_round_trips,  # noqa: E402
+                     detect_format, element_snapshot, element_text, html_snapshot, start_browser)
+from fixture_server import FixtureSite, serve  # noqa: E402
+
+try:
+    from lxml.cssselect import CSSSelector
+except ImportError:  # CSS on saved HTML needs cssselect
+    CSSSelector = None
+
+# the requirement fields used before the registry, each matching both page formats
+LEGACY_REQUIREMENTS = {
+    field: ' | '.join(p.requirements.xpath[field] for p in SELECTOR_PROFILES.values())
+    for field in ('enrollment', 'rating', 'locale')
+}
+
+
+def legacy_read(tree):
+    snapshot = html_snapshot(tree, LEGACY_REQUIREMENTS)
+    page_format = 'revised' if '\n' in snapshot['rating'][0] else 'original'
+    html_snapshot(tree, SELECTOR_PROFILES[page_format].course.xpath)
+    html_snapshot(tree, REVIEW_SELECTORS.xpath)
+    return page_format
+
+
+def profile_read(tree):
+    page_format = detect_format(tree)
+    profile = SELECTOR_PROFILES[page_format]
+    html_snapshot(tree, profile.requirements.xpath)
+    html_snapshot(tree, profile.course.xpath)
+    html_snapshot(tree, REVIEW_SELECTORS.xpath)
+    return page_format
+
+
+def css_read(tree, compiled):
+    for name, selectors in compiled.items():
+        if selectors['anchor'](tree):
+            for selector in selectors['fields']:
+                [element_text(e) for e in selector(tree)]
+            return name
+
+
+def compile_css():
+    compiled = dict()
+    for name, profile in SELECTOR_PROFILES.items():
+        fields = {**profile.requirements.css, **profile.course.css, **REVIEW_SELECTORS.css}
+        compiled[name] = {'anchor': CSSSelector(profile.anchor.css),
+                          'fields': [CSSSelector(css) for css in fields.values()]}
+    return compiled
+
+
+def time_offline(trees, read):
+    start = time.perf_counter()
+    for tree in trees:
+        read(tree)
+    return (time.perf_counter() - start) / len(trees) * 1000
+
+
+def time_live(site, pages):
+    """
+
+    times every profile in a live browser, by CSS and by XPath, element by element and in bulk
+
+    """
+
+    server, base_url = serve(site)
+    browser = count_round_trips(start_browser())
+    results = dict()
+    try:
+        for index in range(pages):
+            browser.get(base_url + site.paths[index])
+            page_format = detect_format(browser)
+            profile = SELECTOR_PROFILES[page_format]
+            fields = {'css': {**profile.requirements.css, **profile.course.css},
+                      'xpath': {**profile.requirements.xpath, **profile.course.xpath}}
+            for language, selectors in fields.items():
+                for mode, read in (('element', element_snapshot), ('bulk', bulk_snapshot)):
+                    trips = getattr(ROUND_TRIPS, 'count', 0)
+                    start = time.perf_counter()
+                    read(browser, selectors, language == 'css')
+                    seconds = time.perf_counter() - start
+                    total = results.setdefault((page_format, language, mode), [0.0, 0, 0])
+                    total[0] += seconds
+                    total[1] += getattr(ROUND_TRIPS, 'count', 0) - trips
+                    total[2] += 1
+    finally:
+        browser.quit()
+        server.shutdown()
+    print(f"\n{'profile':>10} {'selectors':>10} {'mode':>8} {'ms/page':>8} {'trips/page':>11}")
+    for (page_format, language, mode), (seconds, trips, count) in sorted(results.items()):
+        print(f'{page_format:>10} {language:>10} {mode:>8} {seconds / count * 1000:>8.2f} {trips / count:>11.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=50, help='course pages of each format')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--browser', action='store_true', help='also time the profiles in headless Chrome')
+    args = parser.parse_args()
+
+    print(f"{'profile':>10} {'reader':>14} {'ms/page':>8}")
+    for page_format in SELECTOR_PROFILES:
+        site = FixtureSite(courses=args.pages, page_format=page_format, skip_every=0)
+        trees = [html.fromstring(site.course(i)) for i in range(args.pages)]
+        readers = {'legacy xpath': legacy_read, 'profile xpath': profile_read}
+        if CSSSelector is not None:
+            compiled = compile_css()
+            readers['profile css'] = lambda tree: css_read(tree, compiled)
+        for name, read in readers.items():
+            best = min(time_offline(trees, read) for _ in range(args.repeat))
+            print(f'{page_format:>10} {name:>14} {best:>8.2f}')
+
+    if args.browser:
+        time_live(FixtureSite(courses=args.pages * 2, skip_every=0), args.pages * 2)
@@ -0,0 +1,288 @@
+"""
+
+A local copy of the parts of udemy.com that udemine visits: the home page with its search box, the filtered search
+results, course landing pages in both the original and the revised format, and the review API. Pages are generated
+from a seed so every run sees the same site, or course pages recorded in a PageArchive can be served in their place.
+Every response waits latency seconds first, to stand in for the network.
+Run it on its own to browse the site: python benchmarks/fixture_server.py [--port 8000] [--latency 0.05]
+
+"""
+
+import argparse
+import html
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from udemine import PageArchive  # noqa: E402
+
+TOPICS = ['Machine Learning', 'Data Science', 'Deep Learning', 'Python']
+LANGUAGES = ['English', 'Spanish', 'Portuguese']
+WORDS = ('model data python learn train feature network course lecture project example practice theory build '
+         'predict cluster regression neural vector matrix deploy test').split()
+REVIEWS_PER_CLICK = 12  # reviews added each time the show more button is pressed
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+class FixtureSite:
+    """
+
+    Builds the pages of the fixture site. Courses alternate between the original and revised page formats, or all
+    use one of them with page_format, and every skip_every-th course is left short of the minimum requirements,
+    which its listing card shows too.
+    Give an archive to serve the course pages recorded in it rather than generated ones.
+
+    """
+
+    def __init__(self, courses=40, per_page=10, reviews=60, page_format='mixed', skip_every=7, seed=0, archive=None):
+        self.per_page = per_page
+        self.reviews = reviews
+        self.page_format = page_format
+        self.skip_every = skip_every
+        self.seed = seed
+        self.recorded = dict()
+        if archive is not None:
+            archive = archive if isinstance(archive, PageArchive) else PageArchive(archive)
+            for link, page in archive.iter_pages('course'):
+                self.recorded[urlsplit(link).path] = page
+            archive.close()
+            self.paths = sorted(self.recorded)
+        else:
+            self.paths = [f'/course/fixture-course-{i}/' for i in range(courses)]
+
+    def course_format(self, index):
+        if self.page_format != 'mixed':
+            return self.page_format
+        return 'original' if index % 2 == 0 else 'revised'
+
+    def page(self, path, query):
+        """
+
+        returns the status, content type and body served for a path and its query string parameters
+
+        """
+
+        if path == '/':
+            return 200, 'text/html', self.home()
+        if path.startswith('/courses/search'):
+            return 200, 'text/html', self.listing(query)
+        if path.startswith('/api-2.0/courses/'):
+            course_id = int(path.strip('/').split('/')[2])
+            return 200, 'application/json', self.review_api(course_id, query)
+        if path in self.recorded:
+            return 200, 'text/html', self.recorded[path]
+        if path in self.paths:
+            return 200, 'text/html', self.course(self.paths.index(path))
+        return 404, 'text/html', '<html><body><h1>Not Found</h1></body></html>'
+
+    def home(self):
+        return """<html><head><title>Online Courses</title></head><body>
+<form action="/courses/search/" method="get"><input type="text" name="q" placeholder="Search for anything"></form>
+</body></html>"""
+
+    def listing(self, query):
+        page = int(query.get('p', ['1'])[0])
+        pages = max(1, -(-len(self.paths) // self.per_page))
+
+        def link(**changes):
+            params = {k: v[0] for k, v in query.items()}
+            params.update(changes)
+            return '/courses/search/?' + urlencode(params)
+
+        def fieldset(name, options, param):
+            chosen = query.get(param, [None])[0]
+            items = ''.join(
+                f"""<label><input type="checkbox" {'checked' if option == chosen else ''}
+                    onclick="location.href='{link(**{param: option, 'p': 1})}'"><div>{option}</div>
+                    <span class="filter--count--33UW8">({100 + 10 * i})</span></label>"""
+                for i, option in enumerate(options))
+            return f'<fieldset name="{name}">{items}</fieldset>'
+
+        cards = ''
+        for index in range((page - 1) * self.per_page, min(page * self.per_page, len(self.paths))):
+            rng = random.Random(self.seed * 100003 + index)
+            cards += f"""<div class="course-card--container--3w8Zm"><a href="{self.paths[index]}">
+                <h3>{html.escape(self.title(index))}</h3><div>4.{rng.randint(0, 9)} ({self.ratings(index):,})</div>
+                <div>{rng.randint(2, 60)} total hours</div><div>Updated {1 + index % 12}/2021</div></a></div>"""
+        nextpage = ''.join(f'<a href="{link(p=number)}">{number}</a>' for number in range(1, pages + 1))
+        if page < pages:
+            nextpage += f'<a href="{link(p=page + 1)}"><span aria-label="Next">Next</span></a>'
+        return f"""<html><head><title>Search results</title></head><body>
+<div class="filter-panel--sidebar--L2lAU"><div class="filter-panel--container--aq5nC">
+  <div class="panel--content-wrapper--1yFBX">
+    <label class="js-panel-toggler  panel--label--qoWJs" aria-expanded="true">Topic</label>
+    <div><label role="button">Show more</label></div>
+    {fieldset('Topic', TOPICS, 'topic')}
+    <label class="js-panel-toggler  panel--label--qoWJs" aria-expanded="false"
+           onclick="this.setAttribute('aria-expanded', 'true')">Language</label>
+    {fieldset('Language', LANGUAGES, 'lang')}
+  </div>
+</div></div>
+<div data-purpose="search-course-cards">{cards}</div>
+<div class="pagination">{nextpage}</div>
+</body></html>"""
+
+    def skipped(self, index):
+        return bool(self.skip_every) and index % self.skip_every == self.skip_every - 1
+
+    def ratings(self, index):
+        return 30 if self.skipped(index) else 1000 + 7 * index
+
+    def title(self, index):
+        return f'Fixture Course {index}: ' + sentence(random.Random(self.seed * 7919 + index), 5)
+
+    def review_list(self, index):
+        rng = random.Random(self.seed * 31337 + index)
+        return [{'name': f'Student {index}-{i}', 'rating': rng.randint(1, 5), 'posted': f'{1 + i % 11} weeks ago',
+                 'content': ' '.join(sentence(rng) for _ in range(rng.randint(1, 4)))}
+                for i in range(self.reviews)]
+
+    def review_html(self, review):
+        return f"""<div class="individual-review">
+            <div data-purpose="review-detail-user-name">{html.escape(review['name'])}</div>
+            <span class="udlite-sr-only">Rating: {review['rating']} out of 5</span>
+            <span class="individual-review--individual-review__detail-date--DEkVn">{review['posted']}</span>
+            <div data-purpose="review-comment-content"><p>{html.escape(review['content'])}</p></div></div>"""
+
+    def course(self, index):
+        rng = random.Random(self.seed * 104729 + index)
+        page_format = self.course_format(index)
+        students = 250 if self.skipped(index) else 10000 + 13 * index
+        ratings = self.ratings(index)
+        lectures = rng.randint(20, 200)
+        reviews = [self.review_html(r) for r in self.review_list(index)]
+        topics = [sentence(rng, 6) for _ in range(rng.randint(4, 10))]
+        summary = ''.join(f'<p>{sentence(rng, 20)}</p>' for _ in range(rng.randint(4, 8)))
+        curriculum = [(sentence(rng, 4), f'{rng.randint(1, 20):02d}:{rng.randint(0, 59):02d}') for _ in range(lectures)]
+        stats = ['4.5 Instructor Rating', '12,345 Reviews', '98,765 Students', '12 Courses']
+        bio = ''.join(f'<p>{sentence(rng)}</p>' for _ in range(3))
+        price = f'${rng.randint(20, 200)}.99'
+        if page_format == 'original':
+            body = f"""<div data-content-group="Landing Page">
+  <div data-purpose="enrollment">{students:,} students</div>
+  <div class="rate-count">4.6 ({ratings:,} ratings)</div>
+  <div class="clp-lead__locale">English</div>
+</div>
+<h1>{html.escape(self.title(index))}</h1>
+<div class="what-you-get"><ul>{''.join(f'<li><span class="what-you-get__text">{t}</span></li>' for t in topics)}</ul>
+  <button class="js-simple-collapse-more-btn">See more</button></div>
+<div data-purpose="course-description"><div class="description__title">Description</div><div>{summary}
+  <p>Who this course is for:</p><p>Beginners</p><p>Everyone else</p></div></div>
+<span class="dib">{lectures} lectures</span><span class="curriculum-header-length">{lectures // 6}:{lectures % 60:02d}:00</span>
+<a data-purpose="load-full-curriculum" href="javascript:void(0)">Expand all</a>
+<a class="sections-toggle" href="javascript:void(0)">Sections</a>
+<div data-purpose="course-curriculum">{''.join(
+    f'<div class="lecture"><div class="title">{t}</div><div class="details">{d}</div></div>' for t, d in curriculum)}</div>
+<div data-purpose="course-old-price-text"><s><span>{price}</span></s></div>
+<div class="instructor--instructor--2qudS">
+  <a class="instructor--title__link--1NJ6S">Instructor {index % 5}</a>
+  {''.join(f'<span class="instructor--instructor__stat-value--2Kwe1">{s}</span>' for s in stats)}
+  <div data-purpose="safely-set-inner-html:trusted-html:content">{bio}</div>
+</div>"""
+        else:
+            body = f"""<div class="course-landing-page__main-content">
+  <div data-purpose="enrollment">{students:,} students</div>
+  <div data-purpose="rating"><span>4.6</span><br><span>({ratings:,} ratings)</span></div>
+  <div class="clp-lead__locale">English</div>
+</div>
+<h1>{html.escape(self.title(index))}</h1>
+<div class="what-you-will-learn--what-will-you-learn--mnJ5T">
+  <ul class="what-you-will-learn--objectives-list--2cWZN">{''.join(f'<li>{t}</li>' for t in topics)}</ul></div>
+<div class="styles--description--3y4KY">
+  <div data-purpose="safely-set-inner-html:description:description">{summary}
+  <p>Who this course is for:</p><p>Beginners</p><p>Everyone else</p></div></div>
+<div data-purpose="curriculum-stats">{lectures // 8} sections • {lectures} lectures • {lectures // 6}h {lectures % 60}m total length</div>
+<button class="curriculum--show-more--2tshH">More sections</button>
+<button data-purpose="expand-toggle">Expand all sections</button>
+<div>{''.join(f'<div class="section--lecture-title-and-description--3lul7">{t}</div>'
+               f'<span class="section--lecture-content--2I4Bi">{d}</span>' for t, d in curriculum)}</div>
+<div class="course-landing-page__purchase-section__main">
+  <div data-purpose="original-price-container"><s><span>{price}</span></s></div></div>
+<div class="styles--instructors--2JsS3"><div>
+  <a class="instructor--instructor__title--34ItB">Instructor {index % 5}</a>
+  <div class="instructor--instructor__image-and-stats--1IqE7"><ul>{''.join(f'<li>{s}</li>' for s in stats)}</ul></div>
+  <div data-purpose="description-content">{bio}</div>
+</div></div>"""
+        return f"""<html><head><title>{html.escape(self.title(index))}</title></head>
+<body data-clp-course-id="{100000 + index}">
+{body}
+<div data-purpose="landing-page-review-list">{''.join(reviews[:REVIEWS_PER_CLICK])}</div>
+{'<button data-purpose="show-more-review-button" onclick="showMore()">Show more reviews</button>'
+ if len(reviews) > REVIEWS_PER_CLICK else ''}
+<script>
+var pending = {json.dumps(reviews[REVIEWS_PER_CLICK:])};
+function showMore() {{
+    var list = document.querySelector('[data-purpose="landing-page-review-list"]');
+    setTimeout(function () {{
+        list.insertAdjacentHTML('beforeend', pending.splice(0, {REVIEWS_PER_CLICK}).join(''));
+        if (!pending.length) document.querySelector('[data-purpose="show-more-review-button"]').remove();
+    }}, 50);
+}}
+</script>
+</body></html>"""
+
+    def review_api(self, course_id, query):
+        reviews = self.review_list(course_id - 100000)
+        page, size = int(query.get('page', ['1'])[0]), int(query.get('page_size', ['12'])[0])
+        results = [{'user': {'public_display_name': r['name']}, 'rating': r['rating'], 'content': r['content'],
+                    'created_formatted_with_time_since': r['posted']}
+                   for r in reviews[(page - 1) * size:page * size]]
+        return json.dumps({'count': len(reviews), 'results': results})
+
+
+def serve(site, latency=0.0, port=0):
+    """
+
+    serves site on localhost in a background thread, waiting latency seconds before every response,
+    and returns the server together with its base URL; call server.shutdown() to stop it
+
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            status, content_type, body = site.page(parts.path, parse_qs(parts.query))
+            time.sleep(latency)
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before every response')
+    parser.add_argument('--courses', type=int, default=40)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--reviews', type=int, default=60, help='reviews on every course page')
+    parser.add_argument('--format', choices=['mixed', 'original', 'revised'], default='mixed')
+    parser.add_argument('--archive', help='serve the course pages recorded in this PageArchive folder')
+    args = parser.parse_args()
+    server, base_url = serve(FixtureSite(args.courses, args.per_page, args.reviews, args.format, archive=args.archive),
+                             args.latency, args.port)
+    print(f'Serving the fixture site at {base_url}; press Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
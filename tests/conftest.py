@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import udemine  # noqa: E402
+
+LINKS = [f'https://www.udemy.com/course/course-{i}/' for i in range(8)]
+
+
+class Browser:
+    """
+
+    stands in for a headless Chrome session; it stops answering once it has crashed or quit
+
+    """
+
+    def __init__(self):
+        self.alive = True
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise udemine.WebDriverException('the browser is gone')
+        return 'about:blank'
+
+    def crash(self):
+        self.alive = False
+        raise udemine.WebDriverException('chrome not reachable')
+
+    def quit(self):
+        self.alive = False
+
+
+class Listings:
+    """
+
+    the browsers opened and closed by a scrape job run on stubbed search results
+
+    """
+
+    links = LINKS
+
+    def __init__(self):
+        self.opened = list()
+        self.closed = list()
+        self.lock = threading.Lock()
+
+    def open(self, settings=None):
+        browser = Browser()
+        with self.lock:
+            self.opened.append(browser)
+        return browser
+
+    def close(self, browser, settings=None):
+        browser.quit()
+        with self.lock:
+            self.closed.append(browser)
+
+    def load(self, browser, link):
+        """
+
+        what loading a course page does; replace it to make pages fail
+
+        """
+
+    def get(self, browser, link, settings=None):
+        self.load(browser, link)
+
+    @staticmethod
+    def course(browser, courses, link, settings=None):
+        courses.append({'link': link, 'title': link, 'lectures_breakdown': [('Intro', '03:33')]})
+        return True, courses
+
+    @staticmethod
+    def reviews(browser, reviews, link, settings=None):
+        reviews.extend([(link, 'name', 'a week ago', 'good', '5')])
+        return reviews
+
+
+@pytest.fixture
+def listings(monkeypatch):
+    """
+
+    Stubs out the browsers, the search results and the course pages, so that a scrape job lists pages of LINKS, four
+    links a page, and finds every course with one review. Everything else is the scraper as it is.
+
+    """
+
+    stub = Listings()
+    pages = [LINKS[:4], LINKS[4:]]
+    monkeypatch.setattr(udemine, 'open_browser', stub.open)
+    monkeypatch.setattr(udemine, 'close_browser', stub.close)
+    monkeypatch.setattr(udemine, 'search_listings', lambda browser, term, category, settings=None: (pages[0], 'next'))
+    monkeypatch.setattr(udemine, 'last_listing_page', lambda browser: None)
+    monkeypatch.setattr(udemine, 'iter_listings', lambda browser, nextpage, page_count, settings=None:
+                        iter([(2, pages[1], None)]))
+    monkeypatch.setattr(udemine, 'governed_get', stub.get)
+    monkeypatch.setattr(udemine, 'course_scraper', stub.course)
+    monkeypatch.setattr(udemine, 'review_scraper', stub.reviews)
+    return stub
+
+
+@pytest.fixture
+def finishes():
+    """
+
+    returns a function that runs a scrape job in a thread and fails the test if it is still running after timeout
+    seconds rather than letting it hang; it returns what the job returned or raises what it raised
+
+    """
+
+    def run(func, timeout=30):
+        outcome = dict()
+
+        def target():
+            try:
+                outcome['result'] = func()
+            except BaseException as e:
+                outcome['error'] = e
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        assert not thread.is_alive(), 'the scrape job hangs'
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    return run
@@ -0,0 +1,36 @@
+import pytest
+
+import udemine
+
+QUERIES = [('python', 'Machine Learning'), ('pandas', 'Data Science')]
+
+
+@pytest.fixture
+def batch(monkeypatch, listings):
+    """
+
+    lists the first five links for the first query and the last five for the second, so three are listed by both
+
+    """
+
+    found = {QUERIES[0]: listings.links[:5], QUERIES[1]: listings.links[3:]}
+    monkeypatch.setattr(udemine, 'list_search', lambda browser, term, category, settings=None:
+                        list(found[term, category]))
+    return listings
+
+
+def test_batch_scrapes_a_course_listed_twice_once(batch, finishes):
+    reviews, courses = finishes(lambda: udemine.batch_scraper(QUERIES, workers=2, queue_size=2, prefilter=False))
+    assert sorted(courses['link']) == sorted(batch.links)
+    shared = courses.set_index('link').loc[batch.links[3], 'queries']
+    assert shared == [list(query) for query in QUERIES]
+
+
+def test_batch_raises_when_every_browser_fails(monkeypatch, batch, finishes):
+    def course(browser, courses, link, settings=None):
+        raise TypeError('a parse helper got None')
+
+    monkeypatch.setattr(udemine, 'course_scraper', course)
+    with pytest.raises(TypeError, match='parse helper'):
+        finishes(lambda: udemine.batch_scraper(QUERIES, workers=2, queue_size=1, prefilter=False), timeout=10)
+    assert sorted(map(id, batch.closed)) == sorted(map(id, batch.opened))
@@ -0,0 +1,30 @@
+import pytest
+
+import udemine
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_resumed_run_writes_each_course_to_the_sinks_once(monkeypatch, tmp_path, listings, finishes, workers):
+    checkpoint, output = str(tmp_path / 'job.checkpoint'), str(tmp_path / 'courses.jsonl')
+    scraped = list()
+
+    def load(browser, link):
+        if len(scraped) == 5:
+            raise Crash('the program dies part way through')
+        scraped.append(link)
+
+    monkeypatch.setattr(listings, 'load', load)
+    with pytest.raises(Crash):
+        finishes(lambda: udemine.scraper(workers=workers, checkpoint=checkpoint, prefilter=False,
+                                         sinks=[udemine.JSONLSink(output)]))
+
+    monkeypatch.setattr(listings, 'load', lambda browser, link: None)
+    reviews, courses = finishes(lambda: udemine.scraper(workers=workers, checkpoint=checkpoint, resume=True,
+                                                        prefilter=False, sinks=[udemine.JSONLSink(output)]))
+    assert sorted(courses['link']) == sorted(listings.links)
+    with open(output, encoding='utf-8') as f:
+        assert len(f.readlines()) == len(listings.links)
@@ -0,0 +1,39 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import udemine
+
+
+def test_work_queue_with_a_batch_is_rejected_before_any_output_is_made(tmp_path):
+    output = tmp_path / 'udemy.sqlite'
+    with pytest.raises(SystemExit):
+        udemine.main(['-q', 'python', 'Machine Learning', '--work-queue', str(tmp_path / 'queue.sqlite'),
+                      '-o', str(output)])
+    assert not output.exists()
+
+
+@pytest.mark.parametrize('arguments', [['-w', '0'], ['--resume'], ['--max-reviews', '-1']])
+def test_invalid_arguments_are_rejected_before_any_output_is_made(tmp_path, capsys, arguments):
+    output = tmp_path / 'udemy.sqlite'
+    with pytest.raises(SystemExit):
+        udemine.main(['python', *arguments, '-o', str(output)])
+    assert 'should be' in capsys.readouterr().err
+    assert not output.exists()
+
+
+@pytest.mark.parametrize('arguments', [['--checkpoint', 'job.checkpoint'], ['--resume'], ['--listing-workers', '2']])
+def test_options_a_batch_does_not_use_are_rejected(tmp_path, capsys, arguments):
+    with pytest.raises(SystemExit):
+        udemine.main(['-q', 'python', 'Machine Learning', *arguments, '-o', str(tmp_path / 'udemy.sqlite')])
+    assert 'is not used by a batch of searches' in capsys.readouterr().err
+
+
+def test_outputs_are_written_and_closed(tmp_path, listings):
+    csv, sqlite = str(tmp_path / 'courses.csv'), str(tmp_path / 'udemy.sqlite')
+    udemine.main(['python', '-w', '2', '-o', csv, '-o', sqlite])
+    assert sorted(pd.read_csv(csv)['link']) == sorted(listings.links)
+    assert len(pd.read_csv(str(tmp_path / 'courses_reviews.csv'))) == len(listings.links)
+    with sqlite3.connect(sqlite) as db:
+        assert db.execute("SELECT COUNT(*) FROM courses").fetchone() == (len(listings.links),)
@@ -0,0 +1,9 @@
+import pytest
+
+import udemine
+
+
+def test_parse_page_source_without_lxml(monkeypatch):
+    monkeypatch.setattr(udemine, 'optional_import', lambda name: None)
+    with pytest.raises(ImportError, match='pip install lxml'):
+        udemine.parse_page_source('<html></html>', 'https://www.udemy.com/course/python/')
@@ -0,0 +1,84 @@
+import itertools
+
+import pytest
+
+import udemine
+
+
+def test_browsers_of_the_pool_scrape_every_link_once(listings, finishes):
+    reviews, courses = finishes(lambda: udemine.scraper(workers=3, queue_size=2, prefilter=False))
+    assert sorted(courses['link']) == sorted(listings.links)
+    assert sorted(reviews['course_link']) == sorted(listings.links)
+    assert len(listings.opened) == 4  # the listing browser and three course browsers
+    assert sorted(map(id, listings.closed)) == sorted(map(id, listings.opened))
+
+
+def test_crashed_browser_is_restarted_and_its_link_tried_again(monkeypatch, listings, finishes):
+    crashed = set()
+
+    def load(browser, link):
+        if link == listings.links[2] and link not in crashed:
+            crashed.add(link)
+            browser.crash()
+
+    monkeypatch.setattr(listings, 'load', load)
+    reviews, courses = finishes(lambda: udemine.scraper(workers=2, prefilter=False))
+    assert sorted(courses['link']) == sorted(listings.links)
+    assert len(listings.opened) == 4  # one more for the browser that crashed
+    assert all(not browser.alive for browser in listings.opened)
+
+
+def test_link_that_crashes_twice_is_left_out(monkeypatch, listings, finishes):
+    def load(browser, link):
+        if link == listings.links[5]:
+            browser.crash()
+
+    monkeypatch.setattr(listings, 'load', load)
+    reviews, courses = finishes(lambda: udemine.scraper(workers=2, prefilter=False))
+    assert sorted(courses['link']) == sorted(set(listings.links) - {listings.links[5]})
+    assert len(listings.opened) == 5  # restarted after each of the two attempts
+
+
+def test_page_that_does_not_parse_is_skipped_without_a_restart(monkeypatch, listings, finishes):
+    def course(browser, courses, link, settings=None):
+        if link == listings.links[1]:
+            courses.append({'link': link})  # half scraped when the page turns out not to parse
+            raise ValueError('could not convert string to float')
+        return listings.course(browser, courses, link, settings)
+
+    monkeypatch.setattr(udemine, 'course_scraper', course)
+    reviews, courses = finishes(lambda: udemine.scraper(workers=2, prefilter=False))
+    assert sorted(courses['link']) == sorted(set(listings.links) - {listings.links[1]})
+    assert len(listings.opened) == 3
+
+
+def test_stopping_early_stops_the_pool_and_closes_the_browsers(listings, finishes):
+    def take_two():
+        results = udemine.iter_scrape(workers=3, queue_size=1, prefilter=False)
+        taken = list(itertools.islice(results, 2))
+        results.close()
+        return taken
+
+    assert len(finishes(take_two)) == 2
+    assert sorted(map(id, listings.closed)) == sorted(map(id, listings.opened))
+
+
+def test_scraper_raises_when_every_browser_of_the_pool_fails(monkeypatch, listings, finishes):
+    def course(browser, courses, link, settings=None):
+        raise TypeError('a parse helper got None')
+
+    monkeypatch.setattr(udemine, 'course_scraper', course)
+    with pytest.raises(TypeError, match='parse helper'):
+        finishes(lambda: udemine.scraper(workers=2, queue_size=1, prefilter=False), timeout=10)
+    assert sorted(map(id, listings.closed)) == sorted(map(id, listings.opened))
+
+
+def test_no_previous_links(listings, finishes):
+    reviews, courses = finishes(lambda: udemine.scraper(previous_links=None, prefilter=False))
+    assert sorted(courses['link']) == sorted(listings.links)
+
+
+def test_previous_links_are_left_out(listings, finishes):
+    previous = [link + '?src=sac' for link in listings.links[:3]]
+    reviews, courses = finishes(lambda: udemine.scraper(previous_links=previous, workers=2, prefilter=False))
+    assert sorted(courses['link']) == sorted(listings.links[3:])
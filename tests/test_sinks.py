@@ -0,0 +1,55 @@
+import os
+import sqlite3
+
+import pytest
+
+import udemine
+
+LINK = 'https://www.udemy.com/course/python/'
+
+
+def test_parquet_sinks_in_the_same_partition_keep_each_others_files(tmp_path):
+    pytest.importorskip('pyarrow')
+    pd = pytest.importorskip('pandas')
+    for _ in range(2):  # two runs, or two sinks, opened in the same second
+        sink = udemine.ParquetSink(str(tmp_path), partition='20240101T000000', batch_size=1)
+        sink.write({'link': LINK, 'title': 'Python'}, [(LINK, 'name', 'a week ago', 'good', '5')])
+        sink.close()
+    assert len(os.listdir(tmp_path / 'courses' / 'partition=20240101T000000')) == 2
+    assert len(pd.read_parquet(tmp_path / 'reviews')) == 2
+
+
+def stored_reviews(path):
+    with sqlite3.connect(path) as db:
+        return sorted(db.execute(f"SELECT {', '.join(udemine.REVIEW_COLUMNS)} FROM reviews").fetchall())
+
+
+def test_sqlite_sink_keeps_reviews_that_share_a_key(tmp_path):
+    path = str(tmp_path / 'udemy.sqlite')
+    rows = [(LINK, 'Udemy User', 'a week ago', 'Great course', '5'),
+            (LINK, 'Udemy User', '2 weeks ago', 'Great course', '4')]
+    assert udemine.review_key(rows[0]) == udemine.review_key(rows[1])
+    sink = udemine.SQLiteSink(path)
+    sink.write({'link': LINK, 'title': 'Python'}, rows)
+    sink.close()
+    assert stored_reviews(path) == sorted(rows)
+
+    # a refresh brings in one new review on top of those already stored
+    refreshed = [(LINK, 'Ada', 'a day ago', 'Clear examples', '5')] + rows
+    sink = udemine.SQLiteSink(path)
+    sink.write({'link': LINK, 'title': 'Python 2024'}, refreshed)
+    sink.close()
+    assert stored_reviews(path) == sorted(refreshed)
+
+
+def test_sqlite_sink_opens_a_database_written_before_reviews_were_keyed(tmp_path):
+    path = str(tmp_path / 'udemy.sqlite')
+    rows = [(LINK, 'Udemy User', 'a week ago', 'Great course', '5'),
+            (LINK, 'Udemy User', '2 weeks ago', 'Great course', '4')]
+    with sqlite3.connect(path) as db:
+        db.execute(f"CREATE TABLE reviews ({', '.join(udemine.REVIEW_COLUMNS)})")
+        db.executemany("INSERT INTO reviews VALUES (?, ?, ?, ?, ?)", rows)
+    sink = udemine.SQLiteSink(path)
+    sink.write({'link': LINK, 'title': 'Python'}, rows[:1])
+    sink.close()
+    assert stored_reviews(path) == sorted(rows)
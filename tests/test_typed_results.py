@@ -0,0 +1,35 @@
+import json
+import os
+
+import pandas as pd
+
+import udemine
+
+COURSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Course Data',
+                       'Udemy_Data_Science_Courses.json')
+
+
+def test_to_duration_formats():
+    parsed = udemine.to_duration(pd.Series(['10:05:00', '05:30', 'Preview\n03:33', '10h 5m', '1hr 30min',
+                                            '10.5 total hours', '45 min', '12 modules', '5 questions', '99 pages',
+                                            'Processing..', '', None]))
+    assert parsed[:7].tolist() == [pd.Timedelta(hours=10, minutes=5), pd.Timedelta(minutes=5, seconds=30),
+                                   pd.Timedelta(minutes=3, seconds=33), pd.Timedelta(hours=10, minutes=5),
+                                   pd.Timedelta(hours=1, minutes=30), pd.Timedelta(hours=10, minutes=30),
+                                   pd.Timedelta(minutes=45)]
+    assert parsed[7:].isna().all()
+
+
+def test_to_duration_on_the_saved_courses():
+    with open(COURSES, encoding='utf-8') as f:
+        courses = json.load(f)
+    lectures = pd.Series([duration for course in courses for _, duration in course['lectures_breakdown'] or []],
+                         dtype='object')
+    clocks = lectures.str.fullmatch(r'(?:Preview\n)?(?:\d+:)?\d+:\d+')
+    assert lectures.str.startswith('Preview\n').sum() > 1000
+    parsed = udemine.to_duration(lectures)
+    assert parsed[clocks].notna().all()
+    assert parsed[~clocks].isna().all()  # question counts, page counts and lectures still processing
+
+    totals = pd.Series([course['total_video_duration'] for course in courses], dtype='object')
+    assert udemine.to_duration(totals)[totals.str.fullmatch(r'(?:\d+:)?\d+:\d+', na=False)].notna().all()
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+import udemine
+
+
+def test_each_run_reports_only_its_own_savings(monkeypatch, capsys, listings):
+    monkeypatch.setattr(udemine, 'WAIT_STATS', dict())
+
+    def load(browser, link):
+        udemine.record_wait('course page', waited=1.0, budget=11.0)  # saves 10 seconds per course
+
+    monkeypatch.setattr(listings, 'load', load)
+    for _ in range(2):
+        udemine.scraper(workers=1, prefilter=False)
+        assert 'Adaptive waiting saved 80 seconds' in capsys.readouterr().out
+    assert udemine.saved_waiting() == 160
+
+
+class Page:
+    """
+
+    a page whose condition is met after delay seconds
+
+    """
+
+    def __init__(self, delay):
+        self.ready = time.monotonic() + delay
+
+    def execute_script(self, script, *args):
+        return time.monotonic() >= self.ready
+
+
+def test_a_slow_site_never_shows_negative_savings(monkeypatch):
+    monkeypatch.setattr(udemine, 'WAIT_STATS', dict())
+    udemine.record_wait('slow', 0.3, 0.3)  # the site has been taking 0.3 seconds
+    with pytest.raises(udemine.TimeoutException):
+        udemine.wait_until(Page(10), lambda page: page.execute_script(''), 'slow', timeout=0.1)
+    udemine.settle(Page(0.25), 'slow', budget=0.1)
+    udemine.settle(Page(10), 'slow', budget=0.1)
+    stats = udemine.wait_stats().loc['slow']
+    assert stats['calls'] == 4 and stats['timeouts'] == 2
+    assert stats['saved'] >= 0
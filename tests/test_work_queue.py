@@ -0,0 +1,77 @@
+import time
+
+import udemine
+
+LINKS = [f'https://www.udemy.com/course/course-{i}/' for i in range(8)]
+
+
+def course(link):
+    return {'link': link, 'title': link, 'lectures_breakdown': [('Intro', '03:33')]}
+
+
+def test_lease_expiry_and_duplicate_ack(tmp_path):
+    queue = udemine.SQLiteWorkQueue(str(tmp_path / 'queue.sqlite'), visibility=0.2, max_attempts=2)
+    queue.start()
+    assert queue.put([LINKS[0] + '?src=sac', LINKS[0], LINKS[1]]) == 2
+    first, second = queue.lease('a'), queue.lease('b')
+    assert {first, second} == {LINKS[0] + '?src=sac', LINKS[1]}
+    assert queue.lease('c') is None
+
+    time.sleep(0.3)  # both leases run out
+    again = queue.lease('c')
+    assert again == first
+    queue.ack(again, [course(again)], [(again, 'name', 'a week ago', 'good', '5')])
+    queue.ack(first, [course(first)], [])  # the worker whose lease ran out acks late
+    results = queue.take_results()
+    assert len(results) == 1
+    link, courses, rows = results[0]
+    assert link == again and courses[0]['lectures_breakdown'] == [('Intro', '03:33')] and len(rows) == 1
+    assert queue.take_results() == []
+
+    queue.finish()
+    assert not queue.done()  # the second link may still be leased again
+    assert queue.lease('c') == second
+    time.sleep(0.3)
+    assert queue.lease('c') is None  # out of attempts
+    assert queue.done()
+    queue.close()
+
+
+def test_release_hands_the_link_back(tmp_path):
+    queue = udemine.SQLiteWorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.start()
+    queue.put(LINKS[:1])
+    link = queue.lease('a')
+    assert queue.lease('b') is None
+    queue.release(link)
+    assert queue.lease('b') == link
+    queue.close()
+
+
+def test_second_job_on_the_same_file(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    queue = udemine.SQLiteWorkQueue(path)
+    queue.start()
+    queue.put(LINKS[:2])
+    late = queue.lease('old worker')
+    queue.ack(queue.lease('a'), [course(LINKS[1])], [])
+    queue.finish()
+
+    other = udemine.SQLiteWorkQueue(path)  # the next job, from another process
+    other.start()
+    assert other.put(LINKS[:2]) == 2
+    assert not other.done()
+    assert other.take_results() == []
+    queue.ack(late, [course(late)], [])  # the earlier job's worker acks after the new job started
+    assert other.take_results() == []
+    assert {other.lease('b'), other.lease('c')} == set(LINKS[:2])
+    queue.close()
+    other.close()
+
+
+def test_scraper_twice_on_one_work_queue(tmp_path, listings):
+    path = str(tmp_path / 'queue.sqlite')
+    for _ in range(2):
+        reviews, courses = udemine.scraper(workers=2, work_queue=path, prefilter=False)
+        assert sorted(courses['link']) == sorted(LINKS)
+        assert len(reviews) == len(LINKS)
@@ -1,36 +1,191 @@
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
-from selenium.common.exceptions import StaleElementReferenceException, ElementNotInteractableException
+from selenium.common.exceptions import StaleElementReferenceException, ElementNotInteractableException, WebDriverException
 
+import os
+import re
+import json
+import bisect
+import math
+import mmap
 import time
-from tqdm import tqdm
-import pandas as pd
+import contextlib
+import functools
+import gzip
+import queue
+import socket
+import sqlite3
+import hashlib
+import uuid
+import shutil
+import importlib
+import itertools
+import collections
+import threading
+from urllib.parse import urlsplit, urlunsplit, urlencode, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
 
 
-def scraper(search_term='python machine learning', filter_category='Machine Learning', previous_links=[]):
+class LazyImport:
+    """
+
+    Stands in for a module, or for attribute of that module when given, and only imports it the first time it is
+    used, so that importing udemine to work on saved data does not load Selenium, pandas and tqdm.
+
+    """
+
+    def __init__(self, module, attribute=None):
+        # underscored so that they never hide an attribute of the module, such as numpy.load
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            self._target = getattr(target, self._attribute) if self._attribute else target
+        return self._target
+
+    def __getattr__(self, name):
+        if name in ('_module', '_attribute', '_target'):  # not set yet, as when copied or unpickled
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy {self._module}{'.' + self._attribute if self._attribute else ''}>"
+
+
+def optional_import(module):
+    """
+
+    returns the given module, importing it the first time, or None if it is not installed
+
+    """
+
+    if module not in OPTIONAL_MODULES:
+        try:
+            OPTIONAL_MODULES[module] = importlib.import_module(module)
+        except ImportError:
+            OPTIONAL_MODULES[module] = None
+    return OPTIONAL_MODULES[module]
+
+
+webdriver = LazyImport('selenium.webdriver')
+Keys = LazyImport('selenium.webdriver.common.keys', 'Keys')
+By = LazyImport('selenium.webdriver.common.by', 'By')
+EC = LazyImport('selenium.webdriver.support.expected_conditions')
+tqdm = LazyImport('tqdm', 'tqdm')
+pd = LazyImport('pandas')
+np = LazyImport('numpy')
+asyncio = LazyImport('asyncio')
+ProcessPoolExecutor = LazyImport('concurrent.futures', 'ProcessPoolExecutor')
+# lxml.html to parse saved pages, zstandard to compress archived pages, httpx or aiohttp for the review API and
+# pyarrow for ParquetSink are all optional and looked up with optional_import when they are needed
+OPTIONAL_MODULES = dict()
+
+
+def scraper(search_term='python machine learning', filter_category='Machine Learning', previous_links=[], workers=1, queue_size=50,
+            extraction='element', archive=None, visited_path=None, checkpoint=None, resume=False, sinks=(),
+            max_reviews=50, review_source='browser', governor=None, refresh=None, profiler=None,
+            base_url='https://www.udemy.com', requirements=None, prefilter=True, sessions=None,
+            filter_cache=None, listing_workers=1, work_queue=None):
     """
 
     This scrapes udemy.com for courses and reviews given a term to execute a search and a category to filter.
     To ensure that it works properly, visit udemy.com beforehand to find the appropriate search_term and filter_category.
     Only choose one of the categories from the top most panel on the page containing a listing of the results.
     Provide a list of links, if you so choose, that should be left out from the scrape job as previous_links.
+    Give a file as visited_path to keep every link visited in it, so that the next run leaves them out on its own.
+    Set workers to the number of headless browsers that should scrape the course pages at the same time.
+    With more than one worker, the search results are walked by a separate browser while the courses are scraped and
+    at most queue_size course links are kept waiting in between.
+    Set extraction to 'bulk' to read each page with a single injected script rather than one request per element,
+    or to 'html' to take the page source in one request and parse it with lxml outside the browser.
+    Give a folder or a PageArchive as archive to keep a compressed copy of every listing and course page visited.
+    Give a file as checkpoint to keep adding the progress of the scrape job to it as it goes. If the job stops early,
+    run it again with resume=True and the same checkpoint to pick it up from where it was.
+    Give a list of sinks, such as JSONLSink, ParquetSink or SQLiteSink, to also write every course to them as it is scraped.
+    At most max_reviews reviews are collected per course. With review_source='api', they are fetched from the Udemy
+    review API for many courses at once rather than by expanding the review section in the browser.
+    Every page load goes through governor, a RateGovernor that limits the pages per second and the pages loading at
+    the same time on each host; a default one is used if none is given.
+    Give a file as refresh to only scrape again the courses whose rating count, enrollment or last updated date on
+    their listing card changed since they were last scraped into it, rather than leaving out every link visited.
+    The reviews of a refreshed course are collected up to the first one already stored.
+    The time and WebDriver round-trips spent in each phase of the job are recorded by profiler, a Profiler which can
+    also write a JSONL trace of every phase; a default one is used if none is given and summed up at the end.
+    The search starts from the home page at base_url, which can point at a local copy of the site for testing.
+    Only courses with at least min_students students and min_reviews reviews in the given language are scraped;
+    give requirements as a dict with any of these keys to change the defaults of REQUIREMENTS.
+    With prefilter, courses whose listing card already shows too few reviews or students are left out without
+    opening their page.
+    Give a SessionManager as sessions to take the browsers from it and hand them back at the end rather than starting
+    new ones and closing them, so that several scrape jobs in a row share warm browsers.
+    The filters set through the filter menus are remembered for each filter_category, so later scrape jobs load the
+    filtered search results straight from their URL. Give a file as filter_cache to keep them from one run to the next.
+    With listing_workers above 1, the pages of search results are loaded by their number that many at a time.
+    Give a WorkQueue, a SQLite file or a redis:// URL as work_queue to hand the course links out through it, so that
+    worker nodes running queue_worker on the same work queue scrape them along with the workers browsers here.
     It returns 2 Pandas DataFrame; the first one contains the reviews and the other is a description of the courses.
+    Use iter_scrape instead to get the courses one by one as they are scraped.
     The default for the input variables are:
     search_term='python machine learning'
     filter_term='Machine Learning'
     previous_links=[]
+    workers=1
+    queue_size=50
+    extraction='element'
+    archive=None
+    visited_path=None
+    checkpoint=None
+    resume=False
+    sinks=()
+    max_reviews=50
+    review_source='browser'
+    governor=None
+    refresh=None
+    profiler=None
+    base_url='https://www.udemy.com'
+    requirements=None
+    prefilter=True
+    sessions=None
+    filter_cache=None
+    listing_workers=1
+    work_queue=None
 
     """
-# ===========================Preprocessing=======================================
-    cols = ['course_link', 'customer_name', 'time_posted', 'review', 'ratings']
-    df = pd.DataFrame(columns=cols)  # empty DataFrame for reviews
+
+    reviews = ColumnBuffer(REVIEW_COLUMNS)  # empty buffer for reviews, turned into a DataFrame at the end
     courses = list()  # empty list for course details
-    visited_links = list()  # to keep tab on links that have been scraped or checked to not meet the requirement
+    results = iter_scrape(search_term, filter_category, previous_links, workers, queue_size,
+                          extraction, archive, visited_path, checkpoint, resume, max_reviews, review_source,
+                          governor, refresh, profiler, base_url, requirements, prefilter, sessions,
+                          filter_cache, listing_workers, work_queue)
+    for course, rows in stream_to(results, *sinks):
+        courses.append(course)
+        reviews.extend(rows)
+
+    return reviews.to_frame(), pd.DataFrame(courses)
 
+
+def iter_scrape(search_term='python machine learning', filter_category='Machine Learning', previous_links=[], workers=1,
+                queue_size=50, extraction='element', archive=None, visited_path=None, checkpoint=None, resume=False,
+                max_reviews=50, review_source='browser', governor=None, refresh=None, profiler=None,
+                base_url='https://www.udemy.com', requirements=None, prefilter=True, sessions=None,
+                filter_cache=None, listing_workers=1, work_queue=None):
+    """
+
+    This takes the same input variables as scraper but rather than returning everything at the end, it gives back
+    each course as soon as it is scraped, as a dict of the course details together with a list of its reviews.
+    Every review is a tuple of course_link, customer_name, time_posted, review and ratings.
+    Nothing is kept once it is handed over, so the results can be streamed anywhere with memory usage that stays flat.
+    Stopping the iteration early stops the scrape job and closes the browsers.
+
+    """
+
+# ===========================Preprocessing=======================================
     # validate input data types
     if not isinstance(search_term, str):
         raise TypeError(
@@ -38,30 +193,248 @@ def scraper(search_term='python machine learning', filter_category='Machine Lear
     if not isinstance(filter_category, str):
         raise TypeError(
             f"Input variable, filter_category, should be a string and not type {type(filter_category)}.")
-    if previous_links and not isinstance(previous_links, list):
+    settings, visited_links, state = prepare_job(
+        previous_links, workers, queue_size, extraction, archive, visited_path, checkpoint, resume, max_reviews,
+        review_source, governor, refresh, profiler, base_url, requirements, prefilter, sessions, filter_cache,
+        listing_workers, work_queue)
+    task = functools.partial(crawl, search_term, filter_category, visited_links, workers, queue_size, state, settings)
+
+    return finish_results(stream_results(task, visited_links, settings), settings)
+
+
+def prepare_job(previous_links, workers, queue_size, extraction, archive, visited_path, checkpoint, resume,
+                max_reviews, review_source, governor, refresh, profiler, base_url, requirements, prefilter, sessions,
+                filter_cache, listing_workers, work_queue=None):
+    """
+
+    Checks the input variables shared by iter_scrape and iter_batch and returns the settings of the scrape job, the
+    index of links to leave out and the state of the checkpoint to resume from, if any.
+
+    """
+
+    if previous_links is None:
+        previous_links = []
+    if isinstance(previous_links, (str, bytes)) or not hasattr(previous_links, '__iter__'):
         raise TypeError(
             "Input variable, previous_links, should be a list of previous visited links.")
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError(
+            f"Input variable, workers, should be a positive integer and not {workers}.")
+    if not isinstance(listing_workers, int) or listing_workers < 1:
+        raise ValueError(
+            f"Input variable, listing_workers, should be a positive integer and not {listing_workers}.")
+    if not isinstance(queue_size, int) or queue_size < 1:
+        raise ValueError(
+            f"Input variable, queue_size, should be a positive integer and not {queue_size}.")
+    if extraction not in EXTRACTIONS:
+        raise ValueError(
+            f"Input variable, extraction, should be one of {', '.join(EXTRACTIONS)} and not {extraction}.")
+    if not isinstance(max_reviews, int) or max_reviews < 0:
+        raise ValueError(
+            f"Input variable, max_reviews, should be a non-negative integer and not {max_reviews}.")
+    if review_source not in REVIEW_SOURCES:
+        raise ValueError(
+            f"Input variable, review_source, should be one of {', '.join(REVIEW_SOURCES)} and not {review_source}.")
+    if requirements is not None and not set(requirements) <= set(REQUIREMENTS):
+        raise ValueError(
+            f"Input variable, requirements, should only have the keys {', '.join(REQUIREMENTS)}.")
+    if resume and not checkpoint:
+        raise ValueError("Input variable, checkpoint, should be given to resume from it.")
+    if archive is not None and not isinstance(archive, PageArchive):
+        archive = PageArchive(archive)
+    if refresh is not None and not isinstance(refresh, RefreshIndex):
+        refresh = RefreshIndex(refresh)
+    if work_queue is not None:
+        work_queue = open_work_queue(work_queue)
+    state = load_checkpoint(checkpoint) if resume and os.path.exists(checkpoint) else None
+    settings = {'extraction': extraction, 'archive': archive,
+                'checkpoint': Checkpoint(checkpoint) if checkpoint else None,
+                'results': queue.Queue(maxsize=queue_size), 'stop': threading.Event(), 'scraped': 0,
+                'max_reviews': max_reviews, 'review_source': review_source,
+                'governor': governor if governor is not None else RateGovernor(), 'refresh': refresh,
+                'profiler': profiler if profiler is not None else Profiler(), 'base_url': base_url,
+                'requirements': {**REQUIREMENTS, **(requirements or {})}, 'prefilter': prefilter,
+                'cards': dict(), 'avoided': set(), 'sessions': sessions,
+                'filter_cache': FilterCache(filter_cache) if filter_cache else FILTER_CACHE,
+                'listing_workers': listing_workers, 'last_page': None, 'work_queue': work_queue}
+
+    if isinstance(previous_links, pd.DataFrame):
+        previous_links = previous_links['link']  # the courses DataFrame of a previous run
+    # to keep tab on links that have been scraped or checked to not meet the requirement
+    visited_links = VisitedIndex(path=visited_path)
+    visited_links.update(previous_links)  # merge user given links into the index
+
+    return settings, visited_links, state
+
+
+def finish_results(results, settings):
+    """
+
+    adds the reviews from the review API and the bookkeeping of the refresh index to the results of a scrape job,
+    as set in its settings
+
+    """
+
+    if settings['review_source'] == 'api':
+        results = with_api_reviews(results, settings['max_reviews'], refresh=settings['refresh'],
+                                   base_url=settings['base_url'])
+    if settings['refresh'] is not None:
+        results = with_refresh(results, settings['refresh'])
+    return results
+
+
+def stream_results(task, visited_links, settings):
+    """
+
+    Runs task, the scrape job as a function without arguments, in a thread of its own and yields the courses it hands
+    over on the results queue of settings.
+
+    """
+
+    outcome = dict()
+    done = object()  # marks the end of the results
+
+    def run():
+        try:
+            task()
+        except ScrapeStopped:
+            pass
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            for resource in (settings['archive'], settings['checkpoint'], settings['profiler'], settings['work_queue'],
+                             visited_links):
+                if resource is not None:
+                    resource.close()
+            try:
+                put_checked(settings['results'], done, settings)
+            except ScrapeStopped:
+                pass
+
+    saved_before = saved_waiting()  # the stats add up over every job, so report only what this one saved
+    job = threading.Thread(target=run, daemon=True)
+    job.start()
+    try:
+        while True:
+            try:
+                item = settings['results'].get(timeout=0.5)
+            except queue.Empty:
+                if job.is_alive():
+                    continue
+                break  # the job was stopped by one of its own threads failing and could not hand over done
+            if item is done:
+                break
+            yield item
+    finally:
+        # the caller stopped early or the job is over; either way wait for the browsers to close
+        settings['stop'].set()
+        job.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    saved = saved_waiting() - saved_before
+    print(f'All done! Adaptive waiting saved {saved:.0f} seconds over fixed waits.')
+    for host, stats in settings['governor'].report().iterrows():
+        print(f"{host}: {stats['pages']:.0f} pages at {stats['pages_per_second']:.2f} pages per second, "
+              f"{stats['backoffs']:.0f} backoffs.")
+    if settings['prefilter']:
+        print(f"Listing cards ruled out {len(settings['avoided'])} courses without opening their page.")
+    for phase, stats in settings['profiler'].report().iterrows():
+        print(f"{phase}: {stats['calls']:.0f} calls, {stats['seconds']:.1f} seconds, "
+              f"{stats['round_trips_per_call']:.1f} round-trips per call.")
+
+
+def crawl(search_term, filter_category, visited_links, workers, queue_size, state, settings):
+    """
 
-    visited_links.extend(previous_links)  # merge user given links into one list
+    Walks through the filtered search results and scrapes every course link that has not been visited,
+    handing the courses over through emit. With a checkpoint state, the courses it holds are handed over first and
+    the job carries on from there.
+
+    """
+
+    reviews = ColumnBuffer(REVIEW_COLUMNS)
+    courses = list()
+    if state is not None:
+        # hand over what was scraped before the checkpoint, each course with its own reviews
+        rows_by_link = dict()
+        for row in state['reviews']:
+            rows_by_link.setdefault(row[0], list()).append(row)
+        for course in state['courses']:
+            emit(settings, course, rows_by_link.get(course['link'], []), replayed=True)
+        visited_links.update(state['visited'])
 # ===========================Start Searching=====================================
-    options = webdriver.ChromeOptions()
-    options.add_argument('headless')
-    options.add_argument('window-size=1920x1080')
-    options.add_argument("disable-gpu")
-    browser = webdriver.Chrome('chromedriver', chrome_options=options)
-    browser.get('http://www.udemy.com')
+    browser = open_browser(settings)
+    browsers = list()
+    try:
+        if state is not None and state['page_count']:
+            # carry on with the links of the pages already listed and then the page after them
+            links, nextpage, page_count = state['pending'], state['nextpage'], state['page_count']
+            print(f"Resuming from page {page_count} of filtered search results with {settings['scraped']} courses scraped...")
+        else:
+            links, nextpage = search_listings(browser, search_term, filter_category, settings)
+            page_count = 1
+            settings['last_page'] = last_listing_page(browser)
+            record_page(settings, page_count, links, nextpage)
+# =======================Iteratively Scrape Links================================
+        if settings['work_queue'] is not None:
+            # the course links go through the work queue, scraped by these browsers and any other worker node
+            browsers.extend(open_browser(settings) for _ in range(workers))
+            print(f'Scraping filtered search results through the work queue with {workers} browsers...')
+            page_count = queue_crawl(browser, browsers, links, nextpage, page_count, visited_links, settings)
+            print(
+                f"Finished with all {page_count} pages of course listings! {settings['scraped']} courses scraped.")
+        elif workers > 1:
+            # the search browser walks the listings while the course browsers scrape the links it finds
+            browsers.extend(open_browser(settings) for _ in range(workers))
+            print(f'Scraping filtered search results with {workers} browsers...')
+            reviews, courses, page_count = scrape_pipeline(browser, browsers, links, nextpage, page_count,
+                                                           reviews, courses, visited_links, queue_size, settings)
+            print(
+                f"Finished with all {page_count} pages of course listings! {settings['scraped']} courses scraped.")
+        else:
+            print(f'Iterating through page {page_count} of filtered search results...')
+            reviews, courses = scrape_links_navigator(browser, reviews, courses, links, visited_links, settings)
+            print(
+                f"Finished with all course listings on page {page_count}! {settings['scraped']} courses scraped so far.")
+
+            for page_count, links, nextpage in iter_listings(browser, nextpage, page_count, settings):
+                print(f'Iterating through page {page_count} of filtered search results...')
+                reviews, courses = scrape_links_navigator(browser, reviews, courses, links, visited_links, settings)
+                print(
+                    f"Finished with all course listings on page {page_count}! {settings['scraped']} courses scraped so far.")
+    finally:
+        for b in [browser] + browsers:
+            close_browser(b, settings)
+
+
+def search_listings(browser, search_term, filter_category, settings=None):
+    """
+
+    Sends the search query, filters the search results by filter_category and English, and returns the course links
+    on the first page of filtered search results together with the link to the next page.
+    If the filters of filter_category are in the filter cache, the filtered search results are loaded straight away.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    params = settings['filter_cache'].get(settings['base_url'], filter_category) if settings['filter_cache'] else None
+    if params:
+        print('Loading filtered search results...')
+        return load_listings_page(browser, search_url(settings['base_url'], search_term, params), settings)
+
+    governed_get(browser, settings['base_url'], settings)
 
     print('Sending search query...')
     message = "Taking much too long to load. Please check your internet connection."
-    elem = WebDriverWait(browser, 3).until(
-        EC.visibility_of_element_located((By.NAME, "q")), message=message)
+    elem = wait_until(browser, EC.visibility_of_element_located((By.NAME, "q")),
+                      'homepage search box', message=message)
     elem.send_keys(search_term + Keys.RETURN)
 
-    time.sleep(1)
     # check for issues that the search yield no results.
     message = "Encounter a problem while attempting to refine search results. Unable to locate filter."
-    WebDriverWait(browser, 3).until(EC.visibility_of_any_elements_located(
-        (By.XPATH, "//div[@class='filter-panel--sidebar--L2lAU'] | //button[contains(@class,'filter-button--filter-button--y-iVA')]")), message=message)
+    wait_until(browser, EC.visibility_of_any_elements_located(
+        (By.XPATH, "//div[@class='filter-panel--sidebar--L2lAU'] | //button[contains(@class,'filter-button--filter-button--y-iVA')]")),
+        'search results filter', message=message)
 
     try:
         filterbutton = browser.find_element_by_xpath(
@@ -71,352 +444,3051 @@ def scraper(search_term='python machine learning', filter_category='Machine Lear
         panel_filter_add(browser, filter_category)
     else:
         overlay_filter_add(browser, filter_category)
-# =================First Filtered Search Results Page Returned===================
-    time.sleep(1)
+
+    # first filtered search results page returned
+    settle(browser, 'filtered search results')
     # access links of search results
-    courses_links = browser.find_elements_by_xpath(
-        "//div[@class='course-list--container--3zXPS']//a[contains(@class,'udlite-custom-focus-visible')] | //div[@data-purpose='search-course-cards']//a")
+    courses_links = browser.find_elements_by_xpath(LISTING_LINKS)
     links = [c.get_attribute("href") for c in courses_links]
-    nextpage = get_nextpage(browser)  # access link to next page of search results
-
-# =======================Iteratively Scrape Links================================
-    page_count = 1
-    print(f'Iterating through page {page_count} of filtered search results...')
-    df, courses = scrape_links_navigator(browser, df, cols, courses, links, visited_links)
-    print(
-        f'Finished with all course listings on page {page_count}! {len(courses)} courses scraped so far.')
-
-    while nextpage:
-        print(f'Iterating through page {page_count + 1} of filtered search results...')
-        df, courses, page_count, nextpage = listings_page_iterator(browser, nextpage, page_count, df,
-                                                                   cols, courses, links, visited_links)
-        print(
-            f'Finished with all course listings on page {page_count}! {len(courses)} courses scraped so far.')
+    observe_cards(browser, LISTING_LINKS, settings)
+    archive_page(browser, browser.current_url, 'listing', settings)
+    params = filter_params(browser.current_url)
+    if params and settings['filter_cache'] is not None:
+        settings['filter_cache'].put(settings['base_url'], filter_category, params)
 
-    browser.quit()
-    print('All done!')
-    return df, pd.DataFrame(courses)
+    return links, get_nextpage(browser)  # access link to next page of search results
 
 
-def panel_filter_add(browser, filter_category):
+def start_browser(lean=True):
     """
 
-    This adds filter to narrow down the search results using the filter_category provided.
-    It also adds a filter to limit the language of the courses to English.
+    starts a new headless Chrome session; a lean one does not download images, fonts, video or trackers and
+    leaves out the Chrome features the scraper does not need
 
     """
-    print('Filtering search results...')
-    # attempt to expand the Topic menu list
-    while True:
-        try:
-            expandlist = WebDriverWait(browser, 3).until(EC.visibility_of_element_located(
-                (By.XPATH, "//label[contains(text(),'Topic')]/following-sibling::node()//label[@role='button']")))
-            browser.execute_script("arguments[0].click();", expandlist)
-            break
-        except TimeoutException:
-            try:
-                expose_filter_menu(browser, 'Topic')
-                continue
-            except ValueError:
-                break
-
-    # find the checkbox that match the filter category and attempt to mark it
-    filtercat = browser.find_elements_by_xpath(
-        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Topic']//span[@class='filter--count--33UW8']/parent::node()")
-    try:
-        indc = [cat.text.split("\n")[0]
-                for cat in filtercat].index(filter_category)
-    except ValueError:
-        catlist = ', '.join([cat.text.split("\n")[0] for cat in filtercat])
-        browser.quit()
-        raise ValueError(
-            f"Encountered a problem while filtering search results. Unable to filter by the category given, {filter_category}. Categories::{catlist}")
-
-    checkbox = browser.find_elements_by_xpath(
-        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Topic']//input")[indc]
-    browser.execute_script("arguments[0].click();", checkbox)
-
-    time.sleep(1)
-    gotofix = browser.find_element_by_xpath(
-        "//div[@class='filter-button-container--button-bar--DU5FK'] | //div[@class='filter-panel--container--aq5nC']")
-    browser.execute_script("arguments[0].scrollIntoView();", gotofix)
-
-    time.sleep(1)
-    expose_filter_menu(browser, 'Language')
-    # attempt to mark the English language checkbox
-    filterlang = browser.find_elements_by_xpath(
-        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Language']//span[@class='filter--count--33UW8']/parent::node()")
-    indl = [lang.text.split("(")[0].split("\n")[0]
-            for lang in filterlang].index('English')
-    checkbox = browser.find_elements_by_xpath(
-        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Language']//input")[indl]
-    browser.execute_script("arguments[0].click();", checkbox)
 
-    time.sleep(1)
-    gotofix = browser.find_element_by_xpath(
-        "//div[@class='filter-button-container--button-bar--DU5FK'] | //div[@class='filter-panel--container--aq5nC']")
-    browser.execute_script("arguments[0].scrollIntoView();", gotofix)
+    options = webdriver.ChromeOptions()
+    options.add_argument('headless')
+    options.add_argument('window-size=1920x1080')
+    options.add_argument("disable-gpu")
+    if lean:
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+        options.add_experimental_option('prefs', LEAN_PREFS)
+    browser = count_round_trips(webdriver.Chrome('chromedriver', chrome_options=options))
+    if lean:
+        block_resources(browser)
+    return browser
 
 
-def get_nextpage(browser):
+def browser_alive(browser):
     """
 
-    returns the link to the next page of search results if any is found
+    checks whether the browser session still responds to commands
 
     """
 
     try:
-        nextpage = WebDriverWait(browser, 3).until(EC.presence_of_element_located(
-            (By.XPATH, "//div[@class='pagination--container--2wc6Z']//a[@data-page='+1'] | //span[@aria-label='Next']/parent::node()"))).get_attribute("href")
-    except (NoSuchElementException, TimeoutException):
-        return None
-    try:
-        attribute_value = browser.find_element_by_xpath(
-            "//ul[@class='pagination pagination-expanded']/li[last()]").get_attribute("class")
-    except NoSuchElementException:
-        return nextpage
-    else:
-        if attribute_value:
-            return None
-        return nextpage
+        browser.current_url
+    except WebDriverException:
+        return False
+    return True
 
 
-def scrape_links_navigator(browser, df, cols, courses, links, visited_links):
+def restart_browser(browser, settings=None):
     """
 
-    Given a list of course links, this navigates and iterate through the list.
+    closes a crashed browser session, as far as it is possible, and returns a fresh one in its place
 
     """
 
-    for link in tqdm(links):
-        if link not in visited_links:  # scrape links only if not in list
-            browser.get(link)
-            proceed, courses = course_scraper(browser, courses, link)
-            # if requirements are not met in course scraper, the link is not to be scraped.
-            if proceed:
-                df = review_scraper(browser, df, cols, link)
-            visited_links.append(link)
+    settings = settings or DEFAULT_SETTINGS
+    if settings['sessions'] is not None:
+        settings['sessions'].discard(browser)
+    else:
+        quit_browser(browser)
+    return open_browser(settings)
 
-    return df, courses
 
+# ===========================Browser Sessions====================================
+BLOCKED_URLS = [
+    # images, fonts and video previews are never read by the scraper
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.webm', '*.m3u8',
+    # trackers and ads
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*', '*hotjar.com*',
+    '*optimizely.com*', '*segment.io*', '*bat.bing.com*', '*adroll.com*', '*sentry.io*',
+]
+LEAN_ARGUMENTS = ['disable-extensions', 'disable-background-networking', 'disable-default-apps', 'disable-sync',
+                  'disable-translate', 'disable-notifications', 'mute-audio', 'no-first-run',
+                  'disable-features=TranslateUI,MediaRouter,OptimizationHints', 'blink-settings=imagesEnabled=false']
+LEAN_PREFS = {'profile.managed_default_content_settings.images': 2,
+              'profile.default_content_setting_values.notifications': 2,
+              'profile.managed_default_content_settings.media_stream': 2}
 
-def listings_page_iterator(browser, nextpage, page_count, df, cols, courses, links, visited_links):
+
+def block_resources(browser, urls=BLOCKED_URLS):
     """
 
-    For course listings page 2 to the last page, this grabs the list of course links and the next page of listings.
+    stops the browser from downloading anything matching urls, through the DevTools protocol where chromedriver
+    supports it; images stay blocked by the preferences of a lean browser either way
 
     """
 
-    browser.get(nextpage)
-    page_count += 1
-    # trick to force javascript to expose elements in the DOM
-    while True:
-        try:
-            time.sleep(1)
-            gotofix = browser.find_element_by_xpath(
-                "//div[@class='filter-button-container--button-bar--DU5FK'] | //div[@class='filter-panel--container--aq5nC']")
-            browser.execute_script("arguments[0].scrollIntoView();", gotofix)
-            break
-        except NoSuchElementException:
-            browser.execute_script("window.scrollTo(0,document.body.scrollHeight)")
-            continue
-    # check for new search results and next search result link.
     try:
-        WebDriverWait(browser, 3).until(EC.visibility_of_any_elements_located(
-            (By.XPATH, "//div[@class='course-list--container--3zXPS']//a[contains(@class,'udlite-custom-focus-visible')]  | //div[@data-purpose='search-course-cards']//a")))
-    except TimeoutException:
-        nextpage = get_nextpage(browser)
-        # end scraper if no new search results and no next search result link
-        return df, courses, page_count, nextpage
-
-    courses_links = browser.find_elements_by_xpath(
-        "//div[@class='course-list--container--3zXPS']//a[contains(@class,'udlite-custom-focus-visible')] | //div[@data-purpose='search-course-cards']//a")
-    links = [c.get_attribute("href") for c in courses_links]
-    nextpage = get_nextpage(browser)
+        browser.execute_cdp_cmd('Network.enable', {})
+        browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(urls)})
+    except (AttributeError, WebDriverException):
+        pass
 
-    df, courses = scrape_links_navigator(browser, df, cols, courses, links, visited_links)
 
-    return df, courses, page_count, nextpage
+class SessionManager:
+    """
 
+    Keeps headless browsers open across several scraper calls, so that each call picks up browsers that are already
+    started and have the site in their cache rather than starting new ones. Browsers are lean unless lean is False:
+    they leave out images, fonts, video and trackers and run without the Chrome features the scraper has no use for.
+    Pass it to scraper as sessions, and close it, or use it in a with block, once the scrape jobs are over.
 
-def course_scraper(browser, courses, link):
     """
 
-    This checks if minimum requirements are met before scraping all details related to the description of the course.
+    def __init__(self, lean=True):
+        self.lean = lean
+        self.lock = threading.Lock()
+        self.idle = list()
+        self.busy = list()
 
-    """
+    def __enter__(self):
+        return self
 
-# =========================Minimum Requirement Check=============================
-    try:
-        enrolled = WebDriverWait(browser, 3).until(EC.presence_of_element_located((By.XPATH,
-                                                                                   """//div[contains(@data-content-group,'Landing Page')]//div[@data-purpose='enrollment'] |
-         //div[@class='course-landing-page__main-content']//div[@data-purpose='enrollment']"""))).text.split(" ", 1)[0]
-    except TimeoutException:
-        print(f"Unable to parse current page. Skipping page :: {link}")
-        return False, courses
-    else:
-        try:
-            num_of_reviews = browser.find_element_by_xpath(
-                """//div[contains(@data-content-group,'Landing Page')]//div[@class='rate-count'] |
-                //div[@class='course-landing-page__main-content']//div[@data-purpose='rating']""").text
-        except NoSuchElementException:
-            return False, courses
-        language = browser.find_element_by_xpath(
-            """//div[contains(@data-content-group,'Landing Page')]//div[@class='clp-lead__locale'] |
-            //div[@class='course-landing-page__main-content']//div[contains(@class,'clp-lead__locale')]""").text
+    def __exit__(self, *exc):
+        self.close()
 
-    if '\n' in num_of_reviews:
-        num_of_reviews = num_of_reviews.split('\n')[-1].split()[0][1:]
-        page_format = 'revised'
-    else:
-        num_of_reviews = num_of_reviews.split()[1][1:]
-        page_format = 'original'
-    # check if students enrolled, number of reviews and language requirements are met
-    if int(enrolled.replace(",", "")) < 500 or int(num_of_reviews.replace(",", "")) < 50 or language != "English":
-        return False, courses  # skip scraping if not
-# ===============================Scrape Page=====================================
-    if page_format == 'original':
-        proceed, courses = scrape_original(browser, courses, link)
-    else:
-        proceed, courses = scrape_revised(browser, courses, link)
+    def __len__(self):
+        return len(self.idle) + len(self.busy)
 
-    return proceed, courses
+    def warm_up(self, count, url=None):
+        """
 
+        starts browsers, at the same time, until count of them are idle, and opens url in each to fill their cache
 
-def review_scraper(browser, df, cols, link):
-    """
+        """
 
-    This scrapes all details about the reviews of a course.
+        with ThreadPoolExecutor(max_workers=max(count, 1)) as executor:
+            started = list(executor.map(lambda _: start_browser(self.lean), range(count - len(self.idle))))
+        for browser in started:
+            if url is not None:
+                try:
+                    browser.get(url)
+                except WebDriverException:
+                    pass
+            self.release(browser)
 
-    """
-    # repeat the specified number of times to expand the review section
-    repeats = 5
-    while repeats:
-        try:
-            browser.find_element_by_xpath(
-                "//button[@data-purpose='show-more-review-button']").click()
-        except NoSuchElementException:
-            break
-        except StaleElementReferenceException:
-            break
-        repeats -= 1
-    # expand to reveal the complete review of long reviews that are partially hidden
-    see_more = browser.find_elements_by_xpath(
-        "//div[@data-purpose='landing-page-review-list']//label[contains(@class,'show-more--focusable-label--14fP5')]")
-    if see_more:
-        for s in see_more:
-            try:
-                s.click()
-            except ElementClickInterceptedException:
-                browser.execute_script("arguments[0].click();", s)
+    def acquire(self):
+        """
 
-    posts = browser.find_elements_by_xpath(
-        "//div[@data-purpose='landing-page-review-list']//div[@data-purpose='review-comment-content']")
-    review = [post.text for post in posts]
-    course_link = [link]*len(review)
+        returns an idle browser that still responds, or a new one if there is none
+
+        """
 
-    customers = browser.find_elements_by_xpath(
-        "//div[@data-purpose='landing-page-review-list']//div[@data-purpose='review-detail-user-name']")
-    customer_name = [c.text for c in customers]
+        while True:
+            with self.lock:
+                browser = self.idle.pop() if self.idle else None
+            if browser is None:
+                browser = start_browser(self.lean)
+            elif not browser_alive(browser):
+                quit_browser(browser)
+                continue
+            with self.lock:
+                self.busy.append(browser)
+            return browser
+
+    def release(self, browser):
+        """
+
+        puts a browser back for the next scrape job, on a blank page to free the memory of the last one
+
+        """
 
-    stars = browser.find_elements_by_xpath(
-        "//div[@data-purpose='landing-page-review-list']//span[@class='udlite-sr-only']")
-    ratings = [s.text[8:] for s in stars]
+        with self.lock:
+            if browser in self.busy:
+                self.busy.remove(browser)
+        try:
+            browser.get('about:blank')
+        except WebDriverException:
+            quit_browser(browser)  # a crashed browser is of no use to the next job
+            return
+        with self.lock:
+            self.idle.append(browser)
 
-    posted_when = browser.find_elements_by_xpath(
-        "//div[@data-purpose='landing-page-review-list']//span[contains(@class,'individual-review--individual-review__detail-date--DEkVn')]")
-    time_posted = [w.text for w in posted_when]
+    def discard(self, browser):
+        with self.lock:
+            if browser in self.busy:
+                self.busy.remove(browser)
+        quit_browser(browser)
 
-    return pd.concat([df, pd.DataFrame(list(zip(course_link, customer_name, time_posted, review, ratings)), columns=cols)], ignore_index=True)
+    def close(self):
+        with self.lock:
+            browsers, self.idle, self.busy = self.idle + self.busy, list(), list()
+        for browser in browsers:
+            quit_browser(browser)
 
 
-def expand_section(browser, path):
+def quit_browser(browser):
     """
 
-    attempts to expand a section and at the same time handles exceptions thrown
+    closes a browser session, as far as it is possible
 
     """
 
     try:
-        browser.find_element_by_xpath(path).click()
-    except NoSuchElementException:
+        browser.quit()
+    except WebDriverException:
         pass
-    except ElementClickInterceptedException:
-        see_more_section = browser.find_element_by_class_xpath(path)
-        browser.execute_script("arguments[0].click();", see_more_section)
 
 
-def expand_toggle(browser, path):
+def open_browser(settings=None):
     """
 
-    wait for element to be visible before expand a toggle; also handles exceptions thrown
+    returns a browser from the session manager of settings, or a new one if there is no session manager
 
     """
 
-    try:
-        toggle = WebDriverWait(browser, 3).until(
-            EC.visibility_of_element_located((By.XPATH, path)))
-        browser.execute_script("arguments[0].click();", toggle)
-    except TimeoutException:
-        pass
+    settings = settings or DEFAULT_SETTINGS
+    if settings['sessions'] is not None:
+        return settings['sessions'].acquire()
+    return start_browser()
 
 
-def get_bio_stats_original(browser):
+def close_browser(browser, settings=None):
     """
 
-    locate and capture instructor bio and stats information from original page format
+    hands a browser back to the session manager of settings, or closes it if there is no session manager
 
     """
 
-    see_more_bio = browser.find_elements_by_xpath(
-        "//button[contains(@class,'instructor--view-more-wrapper__button--2egB6')]")
-    for s in see_more_bio:
-        try:
-            s.click()
-        except ElementClickInterceptedException:
-            browser.execute_script("arguments[0].click();", s)
+    settings = settings or DEFAULT_SETTINGS
+    if settings['sessions'] is not None:
+        settings['sessions'].release(browser)
+    else:
+        quit_browser(browser)
+
+
+# ===========================Batch Queries=======================================
+def batch_scraper(queries, previous_links=[], workers=1, queue_size=50, extraction='element', archive=None,
+                  visited_path=None, sinks=(), max_reviews=50, review_source='browser', governor=None, refresh=None,
+                  profiler=None, base_url='https://www.udemy.com', requirements=None, prefilter=True, sessions=None,
+                  filter_cache=None):
+    """
+
+    This scrapes the courses found by many searches in a single scrape job. Give queries as a list of
+    (search_term, filter_category) pairs. The searches are listed side by side on workers browsers, and the course
+    links they list are merged before any course page is opened, so a course listed by several searches is only
+    scraped once. Every course has a queries column with each (search_term, filter_category) pair that listed it.
+    The other input variables are the same as those of scraper; a batch is not checkpointed.
+    It returns 2 Pandas DataFrame; the first one contains the reviews and the other is a description of the courses.
 
-    bio = browser.find_elements_by_xpath(
-        "//div[@class='instructor--instructor--2qudS']//div[@data-purpose='safely-set-inner-html:trusted-html:content']//p")
-    instructor_bio = '\n'.join([b.text.strip() for b in bio])
+    """
 
-    stats = browser.find_elements_by_xpath(
-        "//span[@class='instructor--instructor__stat-value--2Kwe1']")
-    stats = [s.text for s in stats]
+    reviews = ColumnBuffer(REVIEW_COLUMNS)
+    courses = list()
+    results = iter_batch(queries, previous_links, workers, queue_size, extraction, archive, visited_path,
+                         max_reviews, review_source, governor, refresh, profiler, base_url, requirements, prefilter,
+                         sessions, filter_cache)
+    for course, rows in stream_to(results, *sinks):
+        courses.append(course)
+        reviews.extend(rows)
 
-    return instructor_bio, stats
+    return reviews.to_frame(), pd.DataFrame(courses)
 
 
-def get_bio_stats_revised(browser):
+def iter_batch(queries, previous_links=[], workers=1, queue_size=50, extraction='element', archive=None,
+               visited_path=None, max_reviews=50, review_source='browser', governor=None, refresh=None,
+               profiler=None, base_url='https://www.udemy.com', requirements=None, prefilter=True, sessions=None,
+               filter_cache=None):
     """
 
-    locate and capture instructor bio and stats information from revised page format
+    This takes the same input variables as batch_scraper but gives back each course as soon as it is scraped, as
+    iter_scrape does, with the queries that listed it added to the course details.
 
     """
 
-    see_more_bio = browser.find_elements_by_xpath(
-        "//div[@class='styles--instructors--2JsS3']//label")
-    for s in see_more_bio:
-        try:
-            s.click()
-        except ElementClickInterceptedException:
-            browser.execute_script("arguments[0].click();", s)
+    if isinstance(queries, (str, bytes)) or not hasattr(queries, '__iter__'):
+        raise TypeError(
+            "Input variable, queries, should be a list of (search_term, filter_category) pairs.")
+    queries = [tuple(query) for query in queries]
+    if not queries or not all(len(query) == 2 and all(isinstance(q, str) for q in query) for query in queries):
+        raise TypeError(
+            "Input variable, queries, should be a non-empty list of (search_term, filter_category) pairs of strings.")
+    queries = list(dict.fromkeys(queries))  # the same search twice is listed once
+    settings, visited_links, _ = prepare_job(
+        previous_links, workers, queue_size, extraction, archive, visited_path, None, False, max_reviews,
+        review_source, governor, refresh, profiler, base_url, requirements, prefilter, sessions, filter_cache, 1)
+    found = dict()  # the queries that listed each course, by normalized link
+    task = functools.partial(batch_crawl, queries, found, visited_links, workers, queue_size, settings)
 
-    bio = browser.find_elements_by_xpath(
-        "//div[@data-purpose='description-content']//p")
-    instructor_bio = '\n'.join([b.text.strip() for b in bio])
+    return finish_results(with_queries(stream_results(task, visited_links, settings), found), settings)
 
-    stats = browser.find_elements_by_xpath(
-        "//div[@class='instructor--instructor__image-and-stats--1IqE7']//li")
-    stats = [s.text for s in stats]
 
-    return instructor_bio, stats
+def list_search(browser, search_term, filter_category, settings=None):
+    """
 
+    returns every course link on every page of the filtered search results of a search
 
-def expose_filter_menu(browser, filter_by):
     """
 
-    find the text of the label that matches with what is provided and attempt to expose the menu
+    links, nextpage = search_listings(browser, search_term, filter_category, settings)
+    listed = list(links)
+    for _, links, _ in iter_listings(browser, nextpage, 1, settings):
+        listed.extend(links)
+
+    return listed
+
+
+def batch_crawl(queries, found, visited_links, workers, queue_size, settings):
+    """
+
+    Lists the search results of every query, up to workers of them at the same time on browsers shared by all, and
+    adds the queries that listed each course link to found. Once every query is listed, each course link that is to
+    be scraped is handed to the same browsers exactly once, however many queries listed it.
+
+    """
+
+    browsers = list()
+    links = dict()  # the first link seen for every normalized link, in the order they were listed
+    try:
+        browsers.extend(open_browser(settings) for _ in range(min(workers, len(queries))))
+        idle = queue.Queue()
+        for browser in browsers:
+            idle.put(browser)
+
+        def list_query(query):
+            browser = idle.get()
+            try:
+                return query, list_search(browser, *query, settings)
+            finally:
+                idle.put(browser)
+
+        print(f'Listing the filtered search results of {len(queries)} searches with {len(browsers)} browsers...')
+        with ThreadPoolExecutor(max_workers=len(browsers)) as executor:
+            for query, listed in executor.map(list_query, queries):
+                for link in listed:
+                    key = normalize_link(link)
+                    links.setdefault(key, link)
+                    tags = found.setdefault(key, list())
+                    if query not in tags:
+                        tags.append(query)
+                print(f'{len(listed)} course listings for {query[0]} in {query[1]}.')
+        check_stop(settings)
+        todo = [link for link in links.values() if should_scrape(link, visited_links, settings)]
+        shared = sum(len(tags) > 1 for tags in found.values())
+        print(f'{len(links)} courses listed, {shared} of them by more than one search. Scraping {len(todo)}...')
+
+        browsers.extend(open_browser(settings) for _ in range(workers - len(browsers)))
+        pending = queue.Queue(maxsize=queue_size)
+        progress = tqdm(total=len(todo), unit='course')
+        with ThreadPoolExecutor(max_workers=len(browsers)) as executor:
+            consumers = [executor.submit(links_consumer, browsers, slot, pending, visited_links, progress, settings)
+                         for slot in range(len(browsers))]
+            watch_consumers(consumers, settings)
+            try:
+                for link in todo:
+                    put_checked(pending, link, settings)
+                for _ in browsers:
+                    put_checked(pending, None, settings)
+            except ScrapeStopped:
+                pass  # the consumers stop on their own, and if one of them failed its error is raised below
+            consumer_results(consumers)
+        progress.close()
+        print(f"Finished with all {len(queries)} searches! {settings['scraped']} courses scraped.")
+    finally:
+        for b in browsers:
+            close_browser(b, settings)
+
+
+def with_queries(results, found):
+    """
+
+    adds the (search_term, filter_category) pairs that listed each course to its details as queries
+
+    """
+
+    for course, rows in results:
+        course['queries'] = [list(query) for query in found.get(normalize_link(course['link']), [])]
+        yield course, rows
+
+
+# ===========================Result Buffers======================================
+REVIEW_COLUMNS = ['course_link', 'customer_name', 'time_posted', 'review', 'ratings']
+
+
+class ColumnBuffer:
+    """
+
+    Collects rows one column list at a time so that adding to it never copies what is already there, unlike
+    concatenating DataFrames. It is turned into a DataFrame once, at the end, with to_frame.
+
+    """
+
+    def __init__(self, columns):
+        self.columns = {c: list() for c in columns}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def extend(self, rows):
+        """
+
+        adds rows, given as tuples in the order of the columns or as another buffer with the same columns
+
+        """
+
+        if isinstance(rows, ColumnBuffer):
+            for c, values in rows.columns.items():
+                self.columns[c].extend(values)
+            return
+        for values, column in zip(zip(*rows), self.columns.values()):
+            column.extend(values)
+
+    def rows(self, start=0):
+        """
+
+        returns the rows from start onwards as tuples in the order of the columns
+
+        """
+
+        return list(zip(*(column[start:] for column in self.columns.values())))
+
+    def truncate(self, size):
+        """
+
+        drops every row after the first size rows
+
+        """
+
+        for column in self.columns.values():
+            del column[size:]
+
+    def to_frame(self):
+        return pd.DataFrame(self.columns, columns=list(self.columns))
+
+
+# ===========================Typed Results=======================================
+AGE_UNITS = {'second': 1 / 86400, 'minute': 1 / 1440, 'hour': 1 / 24, 'day': 1, 'week': 7, 'month': 30.44,
+             'year': 365.25}  # in days
+GROUP_COLUMNS = {'group_instructor_rating': 'rating', 'group_reviews': 'reviews', 'group_students': 'students',
+                 'group_courses': 'courses'}
+INSTRUCTOR_COLUMNS = {'instructor_rating': 'rating', 'total_reviews': 'reviews', 'total_students': 'students',
+                      'total_courses': 'courses'}
+
+
+def to_count(values):
+    """
+
+    turns counts such as '12,345 students' or '1.2k' into whole numbers, leaving out anything without a number
+
+    """
+
+    parts = values.astype('string').str.replace(',', '', regex=False).str.extract(r'(\d+(?:\.\d+)?)\s*([kKmM]?)')
+    scale = parts[1].str.lower().map({'k': 1e3, 'm': 1e6}).astype('float64').fillna(1.0)
+    return (pd.to_numeric(parts[0], errors='coerce') * scale).round().astype('Int64')
+
+
+def to_number(values):
+    """
+
+    turns the first number in each value, such as '4.5 out of 5' or '$94.99', into a float
+
+    """
+
+    number = values.astype('string').str.replace(',', '', regex=False).str.extract(r'(\d+(?:\.\d+)?)')[0]
+    return pd.to_numeric(number, errors='coerce').astype('float64')
+
+
+def to_duration(values):
+    """
+
+    turns durations written as a clock, such as '10:05:00', '05:30' or 'Preview\n03:33' for a lecture that can be
+    previewed, or in words, such as '10h 5m', '1hr 30min' or '10.5 total hours', into timedeltas
+
+    """
+
+    text = values.astype('string').str.strip()
+    clock = text.str.extract(r'(?<![\d:])(?:(\d+):)?(\d+):(\d+)(?![\d:])').apply(pd.to_numeric)
+    seconds = clock[0].fillna(0) * 3600 + clock[1] * 60 + clock[2]
+    hours = pd.to_numeric(text.str.extract(r'\b(\d+(?:\.\d+)?)\s*(?:total\s+)?(?:h|hr|hrs|hours?)\b', expand=False),
+                          errors='coerce')
+    minutes = pd.to_numeric(text.str.extract(r'\b(\d+)\s*(?:m|min|mins|minutes?)\b', expand=False), errors='coerce')
+    words = hours.fillna(0) * 3600 + minutes.fillna(0) * 60
+    words = words.where(hours.notna() | minutes.notna())
+    return pd.to_timedelta(seconds.fillna(words), unit='s')
+
+
+def to_age(values):
+    """
+
+    turns how long ago something was posted, such as '3 weeks ago' or 'a month ago', into timedeltas
+
+    """
+
+    parts = values.astype('string').str.lower().str.extract(
+        r'(a|an|\d+)\s+(second|minute|hour|day|week|month|year)s?\s+ago')
+    count = pd.to_numeric(parts[0].replace({'a': '1', 'an': '1'}), errors='coerce')
+    return pd.to_timedelta(count * parts[1].map(AGE_UNITS).astype('float64'), unit='D')
+
+
+def normalize_results(reviews, courses, scraped_at=None):
+    """
+
+    This turns the reviews and courses DataFrames returned by scraper, with every field as text, into typed tables in
+    one pass over each column: counts become integers, ratings and prices floats, durations and ages timedeltas,
+    time posted an absolute date counted back from scraped_at (now by default) and links and names categoricals.
+    The lectures of every course and the stats of every instructor are moved to child tables of their own.
+    It returns 4 Pandas DataFrame; the reviews, the courses, the lectures and the instructors.
+
+    """
+
+    scraped_at = pd.Timestamp(scraped_at) if scraped_at is not None else pd.Timestamp.now()
+    courses = courses.reindex(columns=list(dict.fromkeys(list(courses.columns) + COURSE_COLUMNS + ['course_id'])))
+    reviews = reviews.reindex(columns=REVIEW_COLUMNS)
+    # one set of categories for the links of every table, so that they can be joined without losing the categoricals
+    links = pd.CategoricalDtype(pd.unique(pd.concat([courses['link'], reviews['course_link']]).dropna()))
+
+    typed_reviews = pd.DataFrame({
+        'course_link': reviews['course_link'].astype(links),
+        'customer_name': reviews['customer_name'].astype('string'),
+        'age': to_age(reviews['time_posted']),
+        'review': reviews['review'].astype('string'),
+        'rating': to_number(reviews['ratings']),
+    })
+    typed_reviews.insert(3, 'posted_on', (scraped_at - typed_reviews['age']).dt.normalize())
+
+    typed_courses = pd.DataFrame({
+        'link': courses['link'].astype(links),
+        'course_id': to_count(courses['course_id']),
+        'title': courses['title'].astype('string'),
+        'topics': courses['topics'].astype('string'),
+        'summary': courses['summary'].astype('string'),
+        'number_of_lectures': to_count(courses['number_of_lectures']),
+        'total_video_duration': to_duration(courses['total_video_duration']),
+        'original_price': to_number(courses['original_price']),
+        'currency': courses['original_price'].astype('string').str.extract(r'^\s*([^\d\s.,]+)', expand=False)
+                                              .astype('category'),
+        'instructor_name': courses['instructor_name'].astype('category'),
+        'instructor_bio': courses['instructor_bio'].astype('string'),
+        'instructor_rating': to_number(courses['instructor_rating']),
+        'total_reviews': to_count(courses['total_reviews']),
+        'total_students': to_count(courses['total_students']),
+        'total_courses': to_count(courses['total_courses']),
+    })
+    if 'queries' in courses:
+        typed_courses['queries'] = courses['queries']  # the searches that listed each course of a batch
+
+    # one row per lecture
+    lectures = courses[['link', 'lectures_breakdown']].explode('lectures_breakdown').dropna()
+    lecture_parts = pd.DataFrame(lectures['lectures_breakdown'].tolist(), index=lectures.index,
+                                 columns=['title', 'duration']).reindex(columns=['title', 'duration'])
+    typed_lectures = pd.DataFrame({
+        'link': lectures['link'].astype(links),
+        'position': lectures.groupby(level=0).cumcount(),
+        'title': lecture_parts['title'].astype('string'),
+        'duration': to_duration(lecture_parts['duration']),
+    }).reset_index(drop=True)
+
+    # one row per instructor, out of the group columns of courses with many and the single columns of the rest
+    many = courses['group_instructor_rating'].notna()
+    group = courses.loc[many, ['link', 'instructor_name', *GROUP_COLUMNS]].rename(columns=GROUP_COLUMNS)
+    group['instructor_name'] = group['instructor_name'].str.split(' -&- ')
+    sizes = group[['instructor_name', *GROUP_COLUMNS.values()]].apply(lambda column: column.str.len())
+    group = group[sizes.eq(sizes['instructor_name'], axis=0).all(axis=1)]  # stats that do not line up are left out
+    group = group.explode(['instructor_name', *GROUP_COLUMNS.values()]) if len(group) else group
+    single = courses.loc[~many, ['link', 'instructor_name', *INSTRUCTOR_COLUMNS]].rename(columns=INSTRUCTOR_COLUMNS)
+    instructors = pd.concat([single, group]).dropna(subset=['instructor_name']).sort_index(kind='stable')
+    typed_instructors = pd.DataFrame({
+        'link': instructors['link'].astype(links),
+        'position': instructors.groupby(level=0).cumcount(),
+        'instructor_name': instructors['instructor_name'].astype('category'),
+        'rating': to_number(instructors['rating']),
+        'reviews': to_count(instructors['reviews']),
+        'students': to_count(instructors['students']),
+        'courses': to_count(instructors['courses']),
+    }).reset_index(drop=True)
+
+    return typed_reviews, typed_courses, typed_lectures, typed_instructors
+
+
+# ===========================Course Store========================================
+STORE_VERSION = 1
+STORE_TABLES = ('courses', 'reviews', 'lectures', 'instructors')
+STORE_TEXT = {'courses': ['title', 'topics', 'summary'], 'reviews': ['review']}  # lecture titles go with courses
+STORE_LINKS = {'courses': 'link', 'reviews': 'course_link', 'lectures': 'link', 'instructors': 'link'}
+TOKEN = re.compile(r'\w+')
+
+
+def tokens(text):
+    """
+
+    returns the distinct lower case words of text, as indexed for keyword lookups
+
+    """
+
+    return set(TOKEN.findall(text.lower())) if isinstance(text, str) else set()
+
+
+def column_kind(values):
+    """
+
+    tells how a column of a typed table is stored: as text, as a count or number in float64 with NaN where missing,
+    as a duration in seconds or as a date in nanoseconds
+
+    """
+
+    if pd.api.types.is_timedelta64_dtype(values):
+        return 'duration'
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'date'
+    if pd.api.types.is_integer_dtype(values):
+        return 'count'
+    if pd.api.types.is_float_dtype(values):
+        return 'number'
+    return 'string'
+
+
+def store_value(kind, value):
+    """
+
+    turns a value to compare with a stored column, such as a Timedelta or a date, into the number stored for it
+
+    """
+
+    if kind == 'duration' and not isinstance(value, (int, float)):
+        return pd.Timedelta(value).total_seconds()
+    if kind == 'date' and not isinstance(value, (int, float)):
+        return pd.Timestamp(value).value
+    return value
+
+
+def write_strings(path, values):
+    """
+
+    writes text as one UTF-8 file holding every value back to back and the offsets where each one starts
+
+    """
+
+    encoded = [v.encode('utf-8') if isinstance(v, str) else
+               b'' if v is None or v is pd.NA or (isinstance(v, float) and math.isnan(v)) else
+               json.dumps(v, ensure_ascii=False, default=str).encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    with open(path + '.utf8', 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(path + '.offsets.npy', offsets)
+
+
+def write_terms(path, postings):
+    """
+
+    writes a map of terms to row numbers as the sorted terms, the row numbers of every term one after the other and
+    the offsets where those of each term start
+
+    """
+
+    terms = sorted(postings)
+    write_strings(path + '.terms', terms)
+    rows = [np.unique(np.asarray(postings[term], dtype='int32')) for term in terms]
+    offsets = np.zeros(len(rows) + 1, dtype='int64')
+    np.cumsum([len(r) for r in rows], out=offsets[1:])
+    np.save(path + '.postings.npy', np.concatenate(rows) if rows else np.zeros(0, dtype='int32'))
+    np.save(path + '.postings.offsets.npy', offsets)
+
+
+def write_store(path, reviews, courses):
+    """
+
+    This writes the reviews and courses DataFrames returned by scraper to the folder path as a course store, which
+    CourseStore opens without reading it all in. They are typed with normalize_results first and every column is kept
+    in files of its own. The store has an inverted index of the words in the title, topics, summary and lecture titles
+    of every course and in every review, an index of the courses of every instructor, an index of the rows of every
+    link and every number, duration and date column sorted, for queries that only touch the rows they return.
+    A store already at path is replaced once the new one is complete.
+
+    """
+
+    tables = dict(zip(('reviews', 'courses', 'lectures', 'instructors'), normalize_results(reviews, courses)))
+    temp = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(temp)
+    meta = {'version': STORE_VERSION, 'tables': dict()}
+    course_rows = {link: row for row, link in enumerate(tables['courses']['link'].astype('object'))}
+    for name in STORE_TABLES:
+        table = tables[name]
+        folder = os.path.join(temp, name)
+        os.makedirs(folder)
+        kinds = {c: column_kind(table[c]) for c in table.columns}
+        meta['tables'][name] = {'rows': len(table), 'columns': kinds}
+        for c, kind in kinds.items():
+            values = table[c]
+            if kind == 'string':
+                write_strings(os.path.join(folder, c), values.astype('object').tolist())
+                continue
+            if kind == 'duration':
+                data = values.dt.total_seconds().to_numpy(dtype='float64', na_value=np.nan)
+            elif kind == 'date':
+                data = values.to_numpy(dtype='datetime64[ns]').astype('int64').astype('float64')
+                data[values.isna().to_numpy()] = np.nan
+            else:
+                data = values.astype('float64').to_numpy(na_value=np.nan)
+            np.save(os.path.join(folder, f'{c}.npy'), data)
+            present = np.flatnonzero(~np.isnan(data))
+            order = present[np.argsort(data[present], kind='stable')]
+            np.save(os.path.join(folder, f'{c}.order.npy'), order.astype('int32'))
+            np.save(os.path.join(folder, f'{c}.sorted.npy'), data[order])
+
+        links = dict()
+        for row, link in enumerate(table[STORE_LINKS[name]].astype('object')):
+            links.setdefault(link, list()).append(row)
+        write_terms(os.path.join(folder, 'link'), links)
+
+    words = dict()
+    for name, columns in STORE_TEXT.items():
+        postings = dict()
+        for c in columns:
+            for row, text in enumerate(tables[name][c].astype('object')):
+                for term in tokens(text):
+                    postings.setdefault(term, list()).append(row)
+        words[name] = postings
+    for link, title in zip(tables['lectures']['link'].astype('object'), tables['lectures']['title'].astype('object')):
+        for term in tokens(title):
+            words['courses'].setdefault(term, list()).append(course_rows[link])
+    for name, postings in words.items():
+        write_terms(os.path.join(temp, name, 'text'), postings)
+
+    instructors = dict()
+    for link, instructor in zip(tables['instructors']['link'].astype('object'),
+                                tables['instructors']['instructor_name'].astype('object')):
+        instructors.setdefault(instructor.strip().lower(), list()).append(course_rows[link])
+    write_terms(os.path.join(temp, 'courses', 'instructor'), instructors)
+
+    with open(os.path.join(temp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=1)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(temp, path)
+
+
+def convert_json(courses_path, path, reviews_path=None):
+    """
+
+    This converts courses saved as JSON, such as Course Data/Udemy_Data_Science_Courses.json or the courses file of a
+    JSONLSink, and their reviews as written by a JSONLSink, if given, into a course store at the folder path.
+
+    """
+
+    with open(courses_path, encoding='utf-8') as f:
+        start = f.read(1)
+        f.seek(0)
+        courses = json.load(f) if start == '[' else [json.loads(line) for line in f if line.strip()]
+    reviews = list()
+    if reviews_path is not None:
+        with open(reviews_path, encoding='utf-8') as f:
+            reviews = [json.loads(line) for line in f if line.strip()]
+    write_store(path, pd.DataFrame(reviews, columns=REVIEW_COLUMNS), pd.DataFrame(courses))
+
+
+class StringColumn:
+    """
+
+    A column of text in a course store, memory-mapped and decoded one value at a time as it is read
+
+    """
+
+    def __init__(self, path):
+        self.offsets = np.load(path + '.offsets.npy', mmap_mode='r')
+        self.data = b''
+        if os.path.getsize(path + '.utf8'):
+            with open(path + '.utf8', 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.data[int(self.offsets[row]):int(self.offsets[row + 1])].decode('utf-8')
+
+
+class TermIndex:
+    """
+
+    A map of terms to row numbers in a course store, looked up by a binary search of the memory-mapped terms
+
+    """
+
+    def __init__(self, path):
+        self.terms = StringColumn(path + '.terms')
+        self.offsets = np.load(path + '.postings.offsets.npy', mmap_mode='r')
+        self.postings = np.load(path + '.postings.npy', mmap_mode='r')
+
+    def get(self, term):
+        """
+
+        returns the sorted row numbers of term, which are empty if it is not in the index
+
+        """
+
+        i = bisect.bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return np.zeros(0, dtype='int32')
+        return np.asarray(self.postings[self.offsets[i]:self.offsets[i + 1]])
+
+
+class CourseStore:
+    """
+
+    This opens a course store written by write_store or convert_json. Only the description of the tables is read
+    when it opens; every column and index is memory-mapped the first time a query needs it, so a query reads little
+    more than the rows it returns. search returns the matching rows of a table as a DataFrame and match their numbers.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['version'] != STORE_VERSION:
+            raise ValueError(f"The course store at {path} is version {meta['version']} and not {STORE_VERSION}.")
+        self.tables = meta['tables']
+        self.loaded = dict()
+
+    def count(self, table='courses'):
+        return self.tables[table]['rows']
+
+    def load(self, table, name, kind):
+        key = (table, name, kind)
+        if key not in self.loaded:
+            path = os.path.join(self.path, table, name)
+            if kind == 'terms':
+                self.loaded[key] = TermIndex(path)
+            elif kind == 'string':
+                self.loaded[key] = StringColumn(path)
+            else:  # the values of a column, or its rows in order of value and the values in that order
+                self.loaded[key] = np.load(f"{path}{'' if kind == 'values' else '.' + kind}.npy", mmap_mode='r')
+        return self.loaded[key]
+
+    def match(self, text=None, table='courses', instructor=None, link=None, **ranges):
+        """
+
+        Returns the sorted row numbers of table that have every word of text, given instructor among their
+        instructors (courses only) and link as their course link. Give the bounds of any number, duration or date
+        column as a keyword, such as instructor_rating=(4.5, None), total_students=(10000, None) or rating=5;
+        None leaves that end open and a single value has to match exactly.
+
+        """
+
+        columns = self.tables[table]['columns']
+        found = list()
+        if text is not None:
+            if table not in STORE_TEXT:
+                raise ValueError(f"Only the {' and '.join(STORE_TEXT)} of a course store can be searched by text.")
+            found.extend(self.load(table, 'text', 'terms').get(term) for term in tokens(text) or {''})
+        if instructor is not None:
+            if table != 'courses':
+                raise ValueError("Only the courses of a course store can be searched by instructor.")
+            found.append(self.load(table, 'instructor', 'terms').get(instructor.strip().lower()))
+        if link is not None:
+            found.append(self.load(table, 'link', 'terms').get(link))
+        for column, bounds in ranges.items():
+            if columns.get(column, 'string') == 'string':
+                raise ValueError(f"{column} is not a number, duration or date column of the {table}.")
+            low, high = bounds if isinstance(bounds, (tuple, list)) else (bounds, bounds)
+            values = self.load(table, column, 'sorted')
+            start = 0 if low is None else np.searchsorted(values, store_value(columns[column], low), 'left')
+            end = len(values) if high is None else np.searchsorted(values, store_value(columns[column], high), 'right')
+            found.append(np.sort(self.load(table, column, 'order')[start:end]))
+        if not found:
+            return np.arange(self.count(table))
+        rows = found[0]
+        for other in found[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def rows(self, rows, table='courses', columns=None):
+        """
+
+        reads the given rows of table into a DataFrame indexed by row number, with only the given columns if any
+
+        """
+
+        kinds = self.tables[table]['columns']
+        rows = np.asarray(rows, dtype='int64')
+        data = dict()
+        for c in columns or kinds:
+            kind = kinds[c]
+            if kind == 'string':
+                column = self.load(table, c, 'string')
+                data[c] = pd.array([column[row] or None for row in rows], dtype='string')
+                continue
+            values = np.asarray(self.load(table, c, 'values')[rows])
+            if kind == 'count':
+                data[c] = pd.array(np.where(np.isnan(values), None, values), dtype='Int64')
+            elif kind == 'duration':
+                data[c] = pd.to_timedelta(values, unit='s')
+            elif kind == 'date':
+                data[c] = pd.to_datetime(values, unit='ns')
+            else:
+                data[c] = values
+
+        return pd.DataFrame(data, index=pd.Index(rows, name='row'))
+
+    def search(self, text=None, table='courses', instructor=None, link=None, columns=None, limit=None, **ranges):
+        """
+
+        returns the rows of table that match, as for match, as a DataFrame; only the first limit of them if given
+
+        """
+
+        return self.rows(self.match(text, table, instructor, link, **ranges)[:limit], table, columns)
+
+    def close(self):
+        for loaded in self.loaded.values():
+            for column in (loaded, getattr(loaded, 'terms', None)):
+                if isinstance(getattr(column, 'data', None), mmap.mmap):
+                    column.data.close()
+        self.loaded = dict()
+
+
+# ===========================Visited Links=======================================
+def normalize_link(link):
+    """
+
+    Returns the form of a course link that is kept in the visited index. Links that only differ in their scheme, the
+    case of the host, a trailing slash or the query string and fragment (e.g. ?src=sac) point to the same course.
+
+    """
+
+    parts = urlsplit(str(link).strip())
+    path = parts.path if parts.path.endswith('/') else parts.path + '/'
+    return urlunsplit(('https', parts.netloc.lower(), path, '', ''))
+
+
+class VisitedIndex:
+    """
+
+    A set of normalized links that have been scraped or checked to not meet the requirement, with constant time
+    lookups. Given a path, the links are also kept in a SQLite file and loaded from it, so the index carries over
+    from one run to the next.
+
+    """
+
+    def __init__(self, links=(), path=None):
+        self.links = set()
+        self.lock = threading.Lock()
+        self.store = None
+        self.unsaved = 0
+        if path is not None:
+            self.store = sqlite3.connect(path, check_same_thread=False)
+            self.store.execute("CREATE TABLE IF NOT EXISTS visited (link TEXT PRIMARY KEY)")
+            self.links.update(link for link, in self.store.execute("SELECT link FROM visited"))
+        self.update(links)
+
+    def __contains__(self, link):
+        return normalize_link(link) in self.links
+
+    def __len__(self):
+        return len(self.links)
+
+    def __iter__(self):
+        return iter(self.links)
+
+    def add(self, link):
+        self.update([link])
+
+    def update(self, links):
+        new = {normalize_link(link) for link in links if link} - self.links
+        if not new:
+            return
+        with self.lock:
+            self.links.update(new)
+            if self.store is not None:
+                self.store.executemany("INSERT OR IGNORE INTO visited VALUES (?)", [(link,) for link in new])
+                self.unsaved += len(new)
+                if self.unsaved >= 50:  # commit in batches rather than once per link
+                    self.store.commit()
+                    self.unsaved = 0
+
+    def close(self):
+        with self.lock:
+            if self.store is not None:
+                self.store.commit()
+                self.store.close()
+                self.store = None
+
+
+# ===========================Conditional Refresh=================================
+LISTING_LINKS = ("//div[@class='course-list--container--3zXPS']//a[contains(@class,'udlite-custom-focus-visible')] | "
+                 "//div[@data-purpose='search-course-cards']//a")
+CARD_SCRIPT = """
+var nodes = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null), cards = [];
+for (var i = 0; i < nodes.snapshotLength; i++) {
+    var link = nodes.snapshotItem(i);
+    var card = link.closest('[class*="course-card--container"], [data-purpose*="course-card"]') || link;
+    cards.push([link.href, card.innerText || '']);
+}
+return cards;
+"""
+CARD_SIGNALS = {
+    'rating_count': re.compile(r'\(([\d,.]+k?)\)'),
+    'enrollment': re.compile(r'([\d,]+) students'),
+    'last_updated': re.compile(r'Updated\s+(\d{1,2}/\d{4}|[A-Z][a-z]+ \d{4})'),
+}
+
+
+def card_signals(text):
+    """
+
+    reads the rating count, enrollment and last updated date, whichever are shown, off the text of a listing card
+
+    """
+
+    signals = dict()
+    for name, pattern in CARD_SIGNALS.items():
+        match = pattern.search(text)
+        if match:
+            signals[name] = match.group(1)
+    return signals
+
+
+def review_key(row):
+    """
+
+    identifies a review row by its customer name and the start of its text, which stay the same between runs
+    unlike the time posted, e.g. '2 weeks ago'
+
+    """
+
+    text = ' '.join(str(row[3] or '').split())[:80]
+    return hashlib.sha1(f"{row[1]}\n{text}".encode('utf-8')).hexdigest()[:16]
+
+
+def new_reviews(rows, known):
+    """
+
+    returns the review rows that come before the first one already stored
+
+    """
+
+    for i, row in enumerate(rows):
+        if review_key(row) in known:
+            return rows[:i]
+    return rows
+
+
+class RefreshIndex:
+    """
+
+    Keeps the listing card signals of every course visited and the keys of its stored reviews in a SQLite file,
+    so a later run only scrapes again the courses whose card on the search results has changed since.
+    A course that has not been seen on a listing card in this run, or whose card shows none of the signals,
+    counts as changed.
+
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.store = sqlite3.connect(path, check_same_thread=False)
+        self.store.execute("CREATE TABLE IF NOT EXISTS cards (link TEXT PRIMARY KEY, signals TEXT)")
+        self.store.execute("CREATE TABLE IF NOT EXISTS reviews (link TEXT, review_key TEXT, "
+                           "PRIMARY KEY (link, review_key))")
+        self.cards = {link: signals for link, signals in self.store.execute("SELECT link, signals FROM cards")}
+        self.seen = dict()  # link -> signals of its card in this run
+        self.unchanged = set()  # links left alone because their card did not change
+
+    def observe(self, cards):
+        """
+
+        takes the signals off the listing cards of a page of search results, given as pairs of link and card text
+
+        """
+
+        with self.lock:
+            for link, text in cards:
+                signals = card_signals(text)
+                if signals:
+                    self.seen[normalize_link(link)] = json.dumps(signals, sort_keys=True)
+
+    def changed(self, link):
+        link = normalize_link(link)
+        with self.lock:
+            if link not in self.seen or self.seen[link] != self.cards.get(link):
+                return True
+            self.unchanged.add(link)
+            return False
+
+    def record(self, link):
+        """
+
+        stores the card signals of a course once it has been visited
+
+        """
+
+        link = normalize_link(link)
+        with self.lock:
+            if link in self.seen:
+                self.cards[link] = self.seen[link]
+                self.store.execute("INSERT OR REPLACE INTO cards VALUES (?, ?)", (link, self.seen[link]))
+
+    def known_reviews(self, link):
+        with self.lock:
+            return {key for key, in self.store.execute("SELECT review_key FROM reviews WHERE link = ?",
+                                                       (normalize_link(link),))}
+
+    def add_reviews(self, link, rows):
+        with self.lock:
+            self.store.executemany("INSERT OR IGNORE INTO reviews VALUES (?, ?)",
+                                   [(normalize_link(link), review_key(row)) for row in rows])
+            self.store.commit()
+
+    def close(self):
+        with self.lock:
+            if self.store is not None:
+                self.store.commit()
+                self.store.close()
+                self.store = None
+
+
+def observe_cards(browser, path, settings=None):
+    """
+
+    reads the listing cards of the page in the browser for the refresh index and the pre-filter, if either is set
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    if settings['refresh'] is None and not settings['prefilter']:
+        return
+    cards = browser.execute_script(CARD_SCRIPT, path)
+    if settings['refresh'] is not None:
+        settings['refresh'].observe(cards)
+    if settings['prefilter']:
+        settings['cards'].update((normalize_link(link), card_signals(text)) for link, text in cards)
+
+
+def should_scrape(link, visited_links, settings=None):
+    """
+
+    tells whether a course link is to be scraped: when refreshing, if its listing card changed since it was stored,
+    otherwise if it has not been visited. With the pre-filter on, a link whose listing card shows it falls short of
+    the requirements is not scraped either, but marked as visited.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    if settings['refresh'] is not None:
+        due = settings['refresh'].changed(link)
+    else:
+        due = link not in visited_links
+    if due and settings['prefilter']:
+        signals = settings['cards'].get(normalize_link(link), {})
+        if not card_meets_requirements(signals, settings['requirements']):
+            settings['avoided'].add(normalize_link(link))
+            visited_links.add(link)
+            record_visit(settings, link)
+            return False
+    return due
+
+
+def card_count(text):
+    """
+
+    reads a count shown on a listing card, such as 12,345 or 1.2k, as a number; None if it is not shown
+
+    """
+
+    if not text:
+        return None
+    text = text.replace(',', '')
+    if text.endswith('k'):
+        return int(float(text[:-1]) * 1000)
+    return int(float(text))
+
+
+def card_meets_requirements(signals, requirements):
+    """
+
+    checks the number of reviews and students shown on a listing card, where they are shown, against the requirements
+
+    """
+
+    reviews, students = card_count(signals.get('rating_count')), card_count(signals.get('enrollment'))
+    return not ((reviews is not None and reviews < requirements['min_reviews']) or
+                (students is not None and students < requirements['min_students']))
+
+
+def with_refresh(results, refresh):
+    """
+
+    stores the keys of the reviews of every course passing by, so the next refresh stops at them, and closes the
+    refresh index at the end
+
+    """
+
+    try:
+        for item in results:
+            course, rows = item
+            refresh.add_reviews(course['link'], rows)
+            yield item
+    finally:
+        results.close()
+        print(f"Refresh left {len(refresh.unchanged)} unchanged courses alone.")
+        refresh.close()
+
+
+# ===========================Review API==========================================
+REVIEW_SOURCES = ('browser', 'api')
+REVIEW_API = '/api-2.0/courses/{course_id}/reviews/'
+
+
+def review_row(link, review):
+    """
+
+    turns a review from the review API into a row laid out like the ones scraped off the course page
+
+    """
+
+    user = review.get('user') or dict()
+    name = user.get('public_display_name') or user.get('display_name') or user.get('title') or user.get('name')
+    posted = review.get('created_formatted_with_time_since') or review.get('created')
+    rating = review.get('rating')
+
+    return link, name, posted, review.get('content'), f"{rating} out of 5" if rating is not None else None
+
+
+async def get_json(client, url, params):
+    """
+
+    fetches url with params from a shared httpx or aiohttp client and returns the decoded JSON body
+
+    """
+
+    httpx = optional_import('httpx')
+    if httpx is not None and isinstance(client, httpx.AsyncClient):
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+    async with client.get(url, params=params) as response:
+        response.raise_for_status()
+        return await response.json()
+
+
+async def fetch_course_reviews(client, base_url, course_id, link, max_reviews, page_size, known=()):
+    """
+
+    Pages through the reviews of one course. The first page tells how many reviews there are; the rest of the pages
+    needed to reach max_reviews are then fetched at the same time. Reviews are kept up to the first one in known.
+
+    """
+
+    url = base_url.rstrip('/') + REVIEW_API.format(course_id=course_id)
+    size = max(1, min(page_size, max_reviews))
+    first = await get_json(client, url, {'page': 1, 'page_size': size})
+    results = list(first.get('results', []))
+    rows = [review_row(link, review) for review in results]
+    if len(new_reviews(rows, known)) < len(rows):
+        return new_reviews(rows, known)[:max_reviews]  # the rest of the pages are already stored
+    pages = math.ceil(min(first.get('count', len(results)), max_reviews) / size)
+    rest = await asyncio.gather(*(get_json(client, url, {'page': page, 'page_size': size})
+                                  for page in range(2, pages + 1)))
+    for data in rest:
+        results.extend(data.get('results', []))
+
+    return new_reviews([review_row(link, review) for review in results], known)[:max_reviews]
+
+
+async def fetch_reviews(courses, max_reviews, concurrency, base_url, page_size, known=None):
+    """
+
+    fetches the reviews of many courses at once over a single pool of at most concurrency connections, each up to
+    the first of the review keys given for its link in known
+
+    """
+
+    httpx, aiohttp = optional_import('httpx'), optional_import('aiohttp')
+    if httpx is not None:
+        client = httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency), timeout=30)
+    elif aiohttp is not None:
+        client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency),
+                                       timeout=aiohttp.ClientTimeout(total=30))
+    else:
+        raise ImportError("Collecting reviews from the API requires httpx or aiohttp. Install one with pip.")
+
+    async def one(course):
+        if max_reviews == 0 or not course.get('course_id'):
+            return []
+        try:
+            return await fetch_course_reviews(client, base_url, course['course_id'], course['link'],
+                                              max_reviews, page_size, (known or {}).get(course['link'], ()))
+        except Exception as e:  # one course failing should not cost the others their reviews
+            print(f"Unable to collect reviews. Skipping reviews of :: {course['link']} ({e!r})")
+            return []
+
+    try:
+        return await asyncio.gather(*(one(course) for course in courses))
+    finally:
+        if httpx is not None and isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            await client.close()
+
+
+def collect_reviews(courses, max_reviews=50, concurrency=16, base_url='https://www.udemy.com', page_size=50,
+                    known=None):
+    """
+
+    This collects up to max_reviews reviews for each of the courses, which need the course_id found by course_scraper,
+    from the review API of base_url, many courses at a time. It returns a list with the review rows of each course.
+    Give known as a dict of link to the review_key of reviews already stored to stop collecting at the first of them.
+    Point base_url at a local server serving fixture JSON to try it out without going online.
+
+    """
+
+    return asyncio.run(fetch_reviews(list(courses), max_reviews, concurrency, base_url, page_size, known))
+
+
+def with_api_reviews(results, max_reviews, batch_size=16, refresh=None, **kwargs):
+    """
+
+    takes courses coming from iter_scrape without reviews, collects their reviews from the API a batch at a time and
+    passes each course on with its reviews; with a refresh index, only the reviews newer than those stored
+
+    """
+
+    try:
+        while True:
+            batch = list(itertools.islice(results, batch_size))
+            if not batch:
+                break
+            courses = [course for course, _ in batch]
+            if refresh is not None:
+                kwargs['known'] = {course['link']: refresh.known_reviews(course['link']) for course in courses}
+            for item, rows in zip(batch, collect_reviews(courses, max_reviews, **kwargs)):
+                yield type(item)((item[0], rows))  # a replayed course stays marked as such
+    finally:
+        results.close()  # stops the scrape job if the caller stopped early
+
+
+# ===========================Output Sinks========================================
+COURSE_COLUMNS = ['link', 'title', 'topics', 'summary', 'number_of_lectures', 'total_video_duration',
+                  'lectures_breakdown', 'original_price', 'instructor_name', 'instructor_bio', 'instructor_rating',
+                  'total_reviews', 'total_students', 'total_courses', 'group_instructor_rating', 'group_reviews',
+                  'group_students', 'group_courses']
+
+
+class Sink:
+    """
+
+    Base of the output sinks. Courses and their reviews are held until batch_size courses are waiting and then
+    written together by write_batch, which every sink implements. Closing a sink writes whatever is still waiting.
+
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.courses = list()
+        self.reviews = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, course, rows):
+        self.courses.append(course)
+        self.reviews.extend(rows)
+        if len(self.courses) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.courses:
+            self.write_batch(self.courses, self.reviews)
+            self.courses, self.reviews = list(), list()
+
+    def write_batch(self, courses, reviews):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+class JSONLSink(Sink):
+    """
+
+    Appends courses, one JSON object per line, to path and their reviews to reviews_path, which defaults to path with
+    _reviews added before the extension. Running it again on the same files adds to them.
+
+    """
+
+    def __init__(self, path, reviews_path=None, batch_size=100):
+        super().__init__(batch_size)
+        root, ext = os.path.splitext(path)
+        self.path = path
+        self.reviews_path = reviews_path or f"{root}_reviews{ext or '.jsonl'}"
+
+    def write_batch(self, courses, reviews):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(c, ensure_ascii=False) + '\n' for c in courses))
+        with open(self.reviews_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(dict(zip(REVIEW_COLUMNS, r)), ensure_ascii=False) + '\n' for r in reviews))
+
+
+class SQLiteSink(Sink):
+    """
+
+    Writes courses and reviews to the courses and reviews tables of a SQLite database. A course that is already there,
+    going by its link, is updated in place. Its reviews are added to those already stored, leaving out any whose
+    review_key was stored by an earlier batch, so the handful of new reviews a refresh brings in never wipes out the
+    older ones. Reviews of one batch are all kept even when two share a key, as two people can post the same short
+    review under the same name. Lists are stored as JSON text.
+
+    """
+
+    def __init__(self, path, batch_size=100):
+        super().__init__(batch_size)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        columns = ', '.join(f'"{c}" TEXT' for c in COURSE_COLUMNS[1:])
+        self.db.execute(f'CREATE TABLE IF NOT EXISTS courses (link TEXT PRIMARY KEY, {columns})')
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS reviews ({', '.join(REVIEW_COLUMNS)}, review_key)")
+        if 'review_key' not in [row[1] for row in self.db.execute("PRAGMA table_info(reviews)")]:
+            # a database written before reviews were keyed
+            self.db.execute("ALTER TABLE reviews ADD COLUMN review_key")
+            with self.db:
+                self.db.executemany("UPDATE reviews SET review_key = ? WHERE rowid = ?",
+                                    [(review_key(row), row[-1]) for row in self.db.execute(
+                                        f"SELECT {', '.join(REVIEW_COLUMNS)}, rowid FROM reviews")])
+        self.db.execute("DROP INDEX IF EXISTS reviews_key")  # the keys are not unique, see write_batch
+        self.db.execute("CREATE INDEX IF NOT EXISTS reviews_course_key ON reviews (course_link, review_key)")
+        self.columns = [row[1] for row in self.db.execute("PRAGMA table_info(courses)")]
+
+    def write_batch(self, courses, reviews):
+        # add a column for any course detail the table does not have yet
+        for c in dict.fromkeys(k for course in courses for k in course):
+            if c not in self.columns:
+                self.db.execute(f'ALTER TABLE courses ADD COLUMN "{c}" TEXT')
+                self.columns.append(c)
+        names = ', '.join(f'"{c}"' for c in self.columns)
+        updates = ', '.join(f'"{c}" = excluded."{c}"' for c in self.columns[1:])
+        values = [[v if v is None or isinstance(v, (str, int, float)) else json.dumps(v, ensure_ascii=False)
+                   for v in (course.get(c) for c in self.columns)] for course in courses]
+        with self.db:
+            self.db.executemany(f"""INSERT INTO courses ({names}) VALUES ({', '.join('?' * len(self.columns))})
+                                    ON CONFLICT (link) DO UPDATE SET {updates}""", values)
+            stored = {link: {key for key, in self.db.execute(
+                "SELECT review_key FROM reviews WHERE course_link = ?", (link,))}
+                for link in dict.fromkeys(row[0] for row in reviews)}
+            keyed = [(row, review_key(row)) for row in reviews]
+            self.db.executemany(f"INSERT INTO reviews VALUES ({', '.join('?' * (len(REVIEW_COLUMNS) + 1))})",
+                                [(*row, key) for row, key in keyed if key not in stored[row[0]]])
+
+    def close(self):
+        super().close()
+        self.db.close()
+
+
+class ParquetSink(Sink):
+    """
+
+    Writes courses and reviews as Parquet files under path/courses and path/reviews, partitioned by partition, which
+    defaults to the time the sink was opened. Every batch is a new file of its own, named after the sink as well, so
+    later runs and other sinks writing in the same second only add files to the dataset. It needs pyarrow.
+
+    """
+
+    def __init__(self, path, partition=None, batch_size=1000):
+        if optional_import('pyarrow.parquet') is None:
+            raise ImportError("Writing Parquet files requires pyarrow. Install it with pip install pyarrow.")
+        super().__init__(batch_size)
+        self.path = path
+        self.partition = partition or time.strftime('%Y%m%dT%H%M%S')
+        self.run = uuid.uuid4().hex
+        self.part = 0
+
+    def write_batch(self, courses, reviews):
+        pa = optional_import('pyarrow')
+        columns = list(dict.fromkeys(COURSE_COLUMNS + [k for course in courses for k in course]))
+        data = dict()
+        for c in columns:
+            values = [course.get(c) for course in courses]
+            if c == 'lectures_breakdown':
+                data[c] = pa.array([[list(lecture) for lecture in v] if v is not None else None for v in values],
+                                   type=pa.list_(pa.list_(pa.string())))
+            elif c.startswith('group_'):
+                data[c] = pa.array(values, type=pa.list_(pa.string()))
+            else:
+                data[c] = pa.array([v if v is None or isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+                                    for v in values], type=pa.string())
+        self.write_table('courses', pa.table(data))
+        self.write_table('reviews', pa.table({c: pa.array(list(v), type=pa.string())
+                                              for c, v in zip(REVIEW_COLUMNS, zip(*reviews) if reviews else
+                                                              [()] * len(REVIEW_COLUMNS))}))
+        self.part += 1
+
+    def write_table(self, name, table):
+        folder = os.path.join(self.path, name, f'partition={self.partition}')
+        os.makedirs(folder, exist_ok=True)
+        optional_import('pyarrow.parquet').write_table(table, os.path.join(folder, f'part-{self.part:05d}-{self.run}.parquet'))
+
+
+def stream_to(results, *sinks):
+    """
+
+    Writes the courses and reviews coming from iter_scrape to every sink and passes them on.
+    Courses replayed from a checkpoint were written by the run that was resumed, so they are only passed on.
+    The sinks are closed, so whatever they still hold is written, once the results run out or the loop is left.
+
+    """
+
+    try:
+        for item in results:
+            if not isinstance(item, Replayed):
+                for sink in sinks:
+                    sink.write(*item)
+            yield item
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+# ===========================Checkpoints=========================================
+class Checkpoint:
+    """
+
+    An append-only log of the progress of a scrape job, one JSON record per line. A record is added for every course
+    link visited, with the course and reviews it gave, and for every page of search results listed. Lines are
+    flushed to disk at least every interval seconds and right away for pages.
+
+    """
+
+    def __init__(self, path, interval=10):
+        self.file = open(path, 'a', encoding='utf-8')
+        if self.file.tell():
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.file.write('\n')  # end a line cut short by a crash so new records start on their own line
+        self.lock = threading.Lock()
+        self.interval = interval
+        self.last_flush = time.monotonic()
+
+    def write(self, record, flush=False):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.file.write(line)
+            if flush or time.monotonic() - self.last_flush >= self.interval:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+
+class Replayed(tuple):
+    """
+
+    A course and its review rows handed over again by iter_scrape on resume, as they were restored from the
+    checkpoint rather than scraped by this run. It unpacks like any other result.
+
+    """
+
+
+def record_visit(settings, link, courses=(), rows=()):
+    """
+
+    adds a visited course link, with the course details and review rows scraped from it, to the checkpoint if one is set
+
+    """
+
+    if settings['checkpoint'] is not None:
+        settings['checkpoint'].write({'link': link, 'courses': list(courses), 'reviews': [list(r) for r in rows]})
+
+
+def record_page(settings, page_count, links, nextpage):
+    """
+
+    adds a page of search results that was listed, with its course links, to the checkpoint if one is set
+
+    """
+
+    if settings['checkpoint'] is not None:
+        settings['checkpoint'].write({'page_count': page_count, 'links': links, 'nextpage': nextpage}, flush=True)
+
+
+def load_checkpoint(path):
+    """
+
+    This reads a checkpoint back into the courses, review rows and links visited so far, the last page of search
+    results listed with the link to the one after it, and the links listed but not visited yet, as pending.
+    A line that was cut short by a crash is left out.
+
+    """
+
+    state = {'courses': list(), 'reviews': list(), 'visited': list(), 'page_count': 0, 'nextpage': None}
+    listed = list()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'page_count' in record:
+                state['page_count'], state['nextpage'] = record['page_count'], record['nextpage']
+                listed.extend(record['links'])
+                continue
+            state['visited'].append(record['link'])
+            for course in record['courses']:
+                course['lectures_breakdown'] = [tuple(lecture) for lecture in course['lectures_breakdown']]
+                state['courses'].append(course)
+            state['reviews'].extend(tuple(r) for r in record['reviews'])
+    visited = VisitedIndex(state['visited'])
+    state['pending'] = [link for link in dict.fromkeys(listed) if link not in visited]
+
+    return state
+
+
+# ===========================Work Queue==========================================
+class WorkQueue:
+    """
+
+    Base of the shared work queues that hand the course links of a scrape job out to worker nodes. The scrape job
+    calls start first, which begins a new job on the queue and drops whatever an earlier job left on it. put adds
+    links not seen before in this job, lease takes the next one out for visibility seconds, and ack hands back the
+    course and reviews it gave and marks it done. A link whose lease runs out, because its worker crashed or hung, is
+    handed out again, up to max_attempts times in all; release hands it back right away. A link is acked or released
+    for the job it was leased in, so a late worker of an earlier job never marks a link of the new one. The scrape job
+    takes the results that were acked with take_results, and once it calls finish, done tells the workers that there
+    is nothing left to do.
+
+    """
+
+    def __init__(self, visibility=600, max_attempts=3):
+        self.visibility = visibility
+        self.max_attempts = max_attempts
+        self.leases = dict()  # the job every link leased by this process was leased in
+        self.leases_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def leased(self, link, job):
+        with self.leases_lock:
+            self.leases[normalize_link(link)] = job
+
+    def leased_job(self, link):
+        with self.leases_lock:
+            return self.leases.pop(normalize_link(link), None)
+
+    def start(self):
+        raise NotImplementedError
+
+    def put(self, links):
+        raise NotImplementedError
+
+    def lease(self, worker):
+        raise NotImplementedError
+
+    def ack(self, link, courses=(), rows=()):
+        raise NotImplementedError
+
+    def release(self, link):
+        raise NotImplementedError
+
+    def take_results(self, limit=100):
+        raise NotImplementedError
+
+    def finish(self):
+        raise NotImplementedError
+
+    def done(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def encode_result(link, courses, rows):
+    return json.dumps({'link': link, 'courses': list(courses), 'reviews': [list(r) for r in rows]},
+                      ensure_ascii=False)
+
+
+def decode_result(payload):
+    """
+
+    returns the link, courses and review rows of a result as acked, with tuples where scrape_course_page has them
+
+    """
+
+    record = json.loads(payload)
+    for course in record['courses']:
+        course['lectures_breakdown'] = [tuple(lecture) for lecture in course['lectures_breakdown']]
+    return record['link'], record['courses'], [tuple(r) for r in record['reviews']]
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+
+    A work queue kept in a SQLite file, which every process on the same machine can open to share it. Links are told
+    apart once tracking parameters are removed.
+
+    """
+
+    def __init__(self, path, visibility=600, max_attempts=3):
+        super().__init__(visibility, max_attempts)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS tasks (job TEXT, key TEXT, link TEXT, state TEXT, "
+                        "attempts INTEGER, lease_until REAL, worker TEXT, added REAL, PRIMARY KEY (job, key))")
+        self.db.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (job, state, added)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY AUTOINCREMENT, job TEXT, "
+                        "payload TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")  # take the write lock up front so two workers never lease one link
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def meta(self, db, key):
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def start(self):
+        job = uuid.uuid4().hex
+        with self.transaction() as db:
+            db.execute("DELETE FROM tasks")
+            db.execute("DELETE FROM results")
+            db.execute("DELETE FROM meta WHERE key = 'finished'")
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('job', ?)", (job,))
+        return job
+
+    def put(self, links):
+        now = time.time()
+        with self.transaction() as db:
+            job = self.meta(db, 'job')
+            if job is None:
+                raise ValueError("Start a job on the work queue before putting links on it.")
+            return db.executemany("INSERT OR IGNORE INTO tasks VALUES (?, ?, ?, 'pending', 0, NULL, NULL, ?)",
+                                  [(job, normalize_link(link), link, now) for link in links]).rowcount
+
+    def lease(self, worker):
+        now = time.time()
+        with self.transaction() as db:
+            job = self.meta(db, 'job')
+            row = db.execute("SELECT key, link FROM tasks WHERE job = ? AND attempts < ? AND (state = 'pending' OR "
+                             "(state = 'leased' AND lease_until < ?)) ORDER BY added LIMIT 1",
+                             (job, self.max_attempts, now)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE tasks SET state = 'leased', attempts = attempts + 1, lease_until = ?, worker = ? "
+                       "WHERE job = ? AND key = ?", (now + self.visibility, worker, job, row[0]))
+        self.leased(row[1], job)
+        return row[1]
+
+    def ack(self, link, courses=(), rows=()):
+        job = self.leased_job(link)
+        with self.transaction() as db:
+            job = job or self.meta(db, 'job')
+            # a link acked twice, after its lease ran out and it was handed out again, gives one result
+            if db.execute("UPDATE tasks SET state = 'done' WHERE job = ? AND key = ? AND state != 'done'",
+                          (job, normalize_link(link))).rowcount:
+                db.execute("INSERT INTO results (job, payload) VALUES (?, ?)",
+                           (job, encode_result(link, courses, rows)))
+
+    def release(self, link):
+        job = self.leased_job(link)
+        with self.transaction() as db:
+            db.execute("UPDATE tasks SET state = 'pending', lease_until = NULL "
+                       "WHERE job = ? AND key = ? AND state = 'leased'",
+                       (job or self.meta(db, 'job'), normalize_link(link)))
+
+    def take_results(self, limit=100):
+        with self.transaction() as db:
+            rows = db.execute("SELECT id, payload FROM results WHERE job = ? ORDER BY id LIMIT ?",
+                              (self.meta(db, 'job'), limit)).fetchall()
+            if rows:
+                db.execute("DELETE FROM results WHERE id IN (%s)" % ', '.join('?' * len(rows)),
+                           [i for i, _ in rows])
+        return [decode_result(payload) for _, payload in rows]
+
+    def finish(self):
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('finished', ?)", (self.meta(db, 'job'),))
+
+    def done(self):
+        with self.lock:
+            job = self.meta(self.db, 'job')
+            if job is None or self.meta(self.db, 'finished') != job:
+                return False
+            # a link is out of attempts once its last lease has run out
+            return not self.db.execute(
+                "SELECT 1 FROM tasks WHERE job = ? AND ((state = 'pending' AND attempts < ?) OR "
+                "(state = 'leased' AND (attempts < ? OR lease_until >= ?))) LIMIT 1",
+                (job, self.max_attempts, self.max_attempts, time.time())).fetchone()
+
+    def stats(self):
+        """
+
+        returns the number of links of the current job in each state
+
+        """
+
+        with self.lock:
+            return dict(self.db.execute("SELECT state, COUNT(*) FROM tasks WHERE job = "
+                                        "(SELECT value FROM meta WHERE key = 'job') GROUP BY state"))
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+REDIS_PUT = """
+local added = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+        redis.call('RPUSH', KEYS[2], ARGV[i])
+        added = added + 1
+    end
+end
+return added
+"""
+REDIS_LEASE = """
+local now, visibility, max_attempts = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+for _, key in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    redis.call('ZREM', KEYS[2], key)
+    redis.call('RPUSH', KEYS[1], key)
+end
+while true do
+    local key = redis.call('LPOP', KEYS[1])
+    if not key then
+        return false
+    end
+    if redis.call('SISMEMBER', KEYS[5], key) == 0 and redis.call('HINCRBY', KEYS[3], key, 1) <= max_attempts then
+        redis.call('ZADD', KEYS[2], now + visibility, key)
+        return redis.call('HGET', KEYS[4], key)
+    end
+end
+"""
+REDIS_ACK = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('HEXISTS', KEYS[4], ARGV[1]) == 1 and redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[2])
+end
+"""
+REDIS_RELEASE = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+end
+"""
+REDIS_TAKE = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+redis.call('LTRIM', KEYS[1], #items, -1)
+return items
+"""
+REDIS_JOB_KEYS = ('links', 'pending', 'leased', 'attempts', 'done', 'results', 'finished')
+
+
+class RedisWorkQueue(WorkQueue):
+    """
+
+    A work queue kept under the keys starting with name on a Redis server, or anything that speaks its protocol, at
+    url, for worker nodes on several machines. Every job has keys of its own under name and the id of the job, and
+    those of the job before are deleted when a new one starts. Every step runs as a script on the server so that it
+    is atomic. It needs the redis package.
+
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', name='udemine', visibility=600, max_attempts=3):
+        redis = optional_import('redis')
+        if redis is None:
+            raise ImportError("A Redis work queue requires redis. Install it with pip install redis.")
+        super().__init__(visibility, max_attempts)
+        self.name = name
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.scripts = {step: self.client.register_script(script) for step, script in
+                        (('put', REDIS_PUT), ('lease', REDIS_LEASE), ('ack', REDIS_ACK), ('release', REDIS_RELEASE),
+                         ('take', REDIS_TAKE))}
+
+    def job(self):
+        return self.client.get(f'{self.name}:job')
+
+    def keys(self, job, *names):
+        return [f'{self.name}:{job}:{key}' for key in names]
+
+    def start(self):
+        job, previous = uuid.uuid4().hex, self.job()
+        self.client.set(f'{self.name}:job', job)
+        if previous is not None:
+            self.client.delete(*self.keys(previous, *REDIS_JOB_KEYS))
+        return job
+
+    def put(self, links):
+        job = self.job()
+        if job is None:
+            raise ValueError("Start a job on the work queue before putting links on it.")
+        pairs = [value for link in links for value in (normalize_link(link), link)]
+        if not pairs:
+            return 0
+        return self.scripts['put'](keys=self.keys(job, 'links', 'pending'), args=pairs)
+
+    def lease(self, worker):
+        job = self.job()
+        if job is None:
+            return None
+        link = self.scripts['lease'](keys=self.keys(job, 'pending', 'leased', 'attempts', 'links', 'done'),
+                                     args=[time.time(), self.visibility, self.max_attempts])
+        if link is not None:
+            self.leased(link, job)
+        return link
+
+    def ack(self, link, courses=(), rows=()):
+        job = self.leased_job(link) or self.job()
+        self.scripts['ack'](keys=self.keys(job, 'leased', 'done', 'results', 'links'),
+                            args=[normalize_link(link), encode_result(link, courses, rows)])
+
+    def release(self, link):
+        job = self.leased_job(link) or self.job()
+        self.scripts['release'](keys=self.keys(job, 'leased', 'pending'), args=[normalize_link(link)])
+
+    def take_results(self, limit=100):
+        job = self.job()
+        if job is None:
+            return []
+        return [decode_result(payload) for payload in self.scripts['take'](keys=self.keys(job, 'results'),
+                                                                            args=[limit])]
+
+    def finish(self):
+        self.client.set(*self.keys(self.job(), 'finished'), 1)
+
+    def done(self):
+        job = self.job()
+        if job is None:
+            return False
+        finished, pending, leased = self.keys(job, 'finished', 'pending', 'leased')
+        return bool(self.client.exists(finished)) and not self.client.llen(pending) and not self.client.zcard(leased)
+
+    def close(self):
+        self.client.close()
+
+
+def open_work_queue(spec, **kwargs):
+    """
+
+    returns the work queue at spec: a RedisWorkQueue for a redis:// URL and a SQLiteWorkQueue for a file otherwise
+
+    """
+
+    if isinstance(spec, WorkQueue):
+        return spec
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisWorkQueue(spec, **kwargs)
+    return SQLiteWorkQueue(spec, **kwargs)
+
+
+def collect_results(work_queue, visited_links, settings, limit=100):
+    """
+
+    takes the results acked on the work queue and hands their courses over as if they were scraped here,
+    returning how many links they were for
+
+    """
+
+    results = work_queue.take_results(limit)
+    for link, courses, rows in results:
+        visited_links.add(link)
+        if settings['refresh'] is not None:
+            settings['refresh'].record(link)
+        record_visit(settings, link, courses, rows)
+        for course in courses:
+            emit(settings, course, rows)
+
+    return len(results)
+
+
+def queue_worker(work_queue, workers=1, extraction='element', archive=None, max_reviews=50,
+                 review_source='browser', governor=None, profiler=None, requirements=None, sessions=None):
+    """
+
+    This runs a worker node of a scrape job whose course links go through work_queue, a WorkQueue or where to find
+    one as for open_work_queue. It scrapes the links it leases with workers headless browsers and acks each with what
+    it found until the scrape job has listed every page and nothing is left to lease.
+    Start the scrape job itself with scraper(..., work_queue=...) on one node and this on as many others as needed.
+    The other input variables are the same as those of scraper. It returns the number of course links scraped.
+
+    """
+
+    work_queue = open_work_queue(work_queue)
+    settings, visited_links, _ = prepare_job(
+        [], workers, 1, extraction, archive, None, None, False, max_reviews, review_source, governor, None,
+        profiler, 'https://www.udemy.com', requirements, False, sessions, None, 1, work_queue)
+    settings['results'] = None  # keep what is scraped to ack it
+    browsers = list()
+    try:
+        browsers.extend(open_browser(settings) for _ in range(workers))
+        print(f'Scraping course links off the work queue with {workers} browsers...')
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            scraped = sum(executor.map(lambda slot: queue_consumer(browsers, slot, work_queue, settings),
+                                       range(workers)))
+    finally:
+        for b in browsers:
+            close_browser(b, settings)
+        for resource in (settings['archive'], settings['profiler'], work_queue, visited_links):
+            if resource is not None:
+                resource.close()
+    print(f'Worker done! {scraped} course links scraped.')
+
+    return scraped
+
+
+# ===========================Streaming Results===================================
+STREAM_LOCK = threading.Lock()
+
+
+class ScrapeStopped(Exception):
+    """
+
+    raised inside a scrape job once the caller of iter_scrape has stopped taking results
+
+    """
+
+
+def check_stop(settings):
+    """
+
+    raises ScrapeStopped if the scrape job has been asked to stop
+
+    """
+
+    if settings['stop'] is not None and settings['stop'].is_set():
+        raise ScrapeStopped
+
+
+def put_checked(q, item, settings):
+    """
+
+    puts item on the queue, waiting for room as long as the scrape job has not been asked to stop
+
+    """
+
+    while True:
+        check_stop(settings)
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def get_checked(q, settings):
+    """
+
+    takes the next item off the queue, waiting for one as long as the scrape job has not been asked to stop
+
+    """
+
+    while True:
+        check_stop(settings)
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+
+
+def watch_consumers(consumers, settings):
+    """
+
+    Sets the stop event of settings as soon as one of the consumer futures fails, so that whatever feeds their queue
+    does not wait for room on it forever once they are gone.
+
+    """
+
+    def stop_on_error(consumer):
+        if not consumer.cancelled() and consumer.exception() is not None:
+            settings['stop'].set()
+
+    for consumer in consumers:
+        consumer.add_done_callback(stop_on_error)
+
+
+def consumer_results(consumers):
+    """
+
+    waits for every consumer future and returns their results, or raises the error of one that failed rather than
+    the ScrapeStopped of those that stopped because of it
+
+    """
+
+    errors = [c.exception() for c in consumers if c.exception() is not None]
+    failed = [e for e in errors if not isinstance(e, ScrapeStopped)] or errors
+    if failed:
+        raise failed[0]
+    return [c.result() for c in consumers]
+
+
+def emit(settings, course, rows, replayed=False):
+    """
+
+    hands a scraped course and its review rows over on the results queue of settings; replayed marks a course
+    restored from a checkpoint
+
+    """
+
+    put_checked(settings['results'], Replayed((course, rows)) if replayed else (course, rows), settings)
+    with STREAM_LOCK:
+        settings['scraped'] += 1
+
+
+# ===========================Rate Governor=======================================
+ERROR_PAGE_SCRIPT = """
+var body = document.body;
+return [document.title, body ? body.className : '', body ? (body.innerText || '').slice(0, 500) : ''];
+"""
+ERROR_PAGE_MARKERS = ('Too Many Requests', 'Access Denied', 'Service Unavailable', 'Bad Gateway',
+                      'neterror', 'Just a moment', 'verify you are a human')
+
+
+class RateGovernor:
+    """
+
+    Schedules every page load of a scrape job. Each host gets a token bucket allowing rate pages per second, with
+    bursts of up to burst pages, and at most concurrency pages loading at the same time (None for no limit).
+    A page that takes longer than slow seconds or comes back as an error page halves the rate of its host, and an
+    error page is loaded again after a pause. Pages that load fine raise the rate step by step back to max_rate.
+    report gives the pages per second achieved on each host, to tune the rate towards the highest safe throughput.
+
+    """
+
+    def __init__(self, rate=2.0, burst=4, concurrency=None, slow=10.0, max_rate=None, min_rate=0.05, retries=2):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.slow = slow
+        self.max_rate = max_rate or rate
+        self.min_rate = min_rate
+        self.retries = retries
+        self.lock = threading.Lock()
+        self.hosts = dict()
+
+    def host(self, url):
+        name = urlsplit(url).netloc.lower()
+        with self.lock:
+            if name not in self.hosts:
+                self.hosts[name] = {
+                    'rate': self.rate, 'tokens': float(self.burst), 'refilled': time.monotonic(),
+                    'slots': threading.BoundedSemaphore(self.concurrency) if self.concurrency else None,
+                    'pages': 0, 'errors': 0, 'slow': 0, 'backoffs': 0, 'started': time.monotonic(), 'finished': None}
+            return self.hosts[name]
+
+    def take_token(self, host):
+        """
+
+        waits until the bucket of the host has a token and takes it
+
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                host['tokens'] = min(self.burst, host['tokens'] + (now - host['refilled']) * host['rate'])
+                host['refilled'] = now
+                if host['tokens'] >= 1:
+                    host['tokens'] -= 1
+                    return
+                wait = (1 - host['tokens']) / host['rate']
+            time.sleep(wait)
+
+    def adjust(self, host, ok):
+        """
+
+        raises the rate of the host a step after a page that loaded fine and halves it after one that did not
+
+        """
+
+        with self.lock:
+            if ok:
+                host['rate'] = min(self.max_rate, host['rate'] + 0.1 * self.max_rate)
+            else:
+                host['rate'] = max(self.min_rate, host['rate'] / 2)
+                host['tokens'] = min(host['tokens'], 0)
+                host['backoffs'] += 1
+
+    def get(self, browser, url):
+        """
+
+        loads url in browser once the host allows it, backing off and loading it again if it comes back as an error page
+
+        """
+
+        host = self.host(url)
+        for attempt in range(self.retries + 1):
+            self.take_token(host)
+            if host['slots'] is not None:
+                host['slots'].acquire()
+            try:
+                start = time.monotonic()
+                browser.get(url)
+                elapsed = time.monotonic() - start
+                error = is_error_page(browser)
+            finally:
+                if host['slots'] is not None:
+                    host['slots'].release()
+            with self.lock:
+                host['pages'] += 1
+                host['finished'] = time.monotonic()
+                host['errors'] += error
+                host['slow'] += elapsed > self.slow
+            self.adjust(host, not error and elapsed <= self.slow)
+            if not error:
+                return
+            time.sleep(2 ** attempt / host['rate'])  # give the host room before trying again
+
+    def report(self):
+        """
+
+        returns a DataFrame with the pages loaded, error pages, slow pages, backoffs, current rate and
+        pages per second achieved on each host
+
+        """
+
+        with self.lock:
+            rows = {name: {'pages': h['pages'], 'errors': h['errors'], 'slow': h['slow'], 'backoffs': h['backoffs'],
+                           'rate': h['rate'],
+                           'pages_per_second': h['pages'] / max(h['finished'] - h['started'], 1e-9)
+                           if h['finished'] else 0.0}
+                    for name, h in self.hosts.items()}
+        return pd.DataFrame.from_dict(rows, orient='index',
+                                      columns=['pages', 'errors', 'slow', 'backoffs', 'rate', 'pages_per_second'])
+
+
+def is_error_page(browser):
+    """
+
+    checks whether the page in the browser is an error, rate limiting or bot check page rather than the page asked for
+
+    """
+
+    try:
+        text = ' '.join(browser.execute_script(ERROR_PAGE_SCRIPT) or [])
+    except WebDriverException:
+        return True
+    return any(marker in text for marker in ERROR_PAGE_MARKERS)
+
+
+def governed_get(browser, url, settings=None):
+    """
+
+    loads url in browser through the rate governor of settings, if there is one
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    with profile(settings, 'page load', url):
+        if settings['governor'] is None:
+            browser.get(url)
+        else:
+            settings['governor'].get(browser, url)
+
+
+# ===========================Profiling===========================================
+ROUND_TRIPS = threading.local()  # WebDriver commands sent by the browsers of the current thread
+
+
+def count_round_trips(browser):
+    """
+
+    makes the browser count every WebDriver command it sends, which is every round-trip to the browser, including
+    the ones sent by its elements
+
+    """
+
+    execute = browser.execute
+
+    def counted(*args, **kwargs):
+        ROUND_TRIPS.count = getattr(ROUND_TRIPS, 'count', 0) + 1
+        return execute(*args, **kwargs)
+
+    browser.execute = counted
+    return browser
+
+
+class Profiler:
+    """
+
+    Records the wall time and WebDriver round-trips of every phase of a scrape job: page loads, the minimum
+    requirement check, scrape_original and scrape_revised, expand_section and expand_toggle, and review_scraper.
+    report gives the totals of each phase as a DataFrame. Given a file as trace, every single phase is also appended
+    to it as a line of JSON with the link it was on, to compare runs or find the slow pages and selectors.
+
+    """
+
+    def __init__(self, trace=None):
+        self.trace = trace
+        self.lock = threading.Lock()
+        self.stats = dict()  # phase -> counters of the time and round-trips spent in it
+        self.file = None
+
+    @contextlib.contextmanager
+    def phase(self, name, link=None):
+        start, started = time.perf_counter(), time.time()
+        trips = getattr(ROUND_TRIPS, 'count', 0)
+        try:
+            yield
+        finally:
+            self.record(name, link, started, time.perf_counter() - start, getattr(ROUND_TRIPS, 'count', 0) - trips)
+
+    def record(self, name, link, started, seconds, round_trips):
+        with self.lock:
+            stats = self.stats.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'round_trips': 0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['round_trips'] += round_trips
+            if self.trace is not None:
+                if self.file is None:
+                    self.file = open(self.trace, 'a', encoding='utf-8')
+                self.file.write(json.dumps({'phase': name, 'link': link, 'thread': threading.current_thread().name,
+                                            'started': started, 'seconds': seconds,
+                                            'round_trips': round_trips}) + '\n')
+
+    def report(self):
+        """
+
+        returns a DataFrame with the calls, total, mean and longest seconds and round-trips of every phase,
+        the slowest phase first
+
+        """
+
+        with self.lock:
+            frame = pd.DataFrame.from_dict(self.stats, orient='index',
+                                           columns=['calls', 'seconds', 'max_seconds', 'round_trips'])
+        frame.insert(2, 'mean_seconds', frame['seconds'] / frame['calls'])
+        frame['round_trips_per_call'] = frame['round_trips'] / frame['calls']
+        return frame.sort_values('seconds', ascending=False)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def profile(settings, name, link=None):
+    """
+
+    returns a context that times a phase with the profiler of settings, if there is one
+
+    """
+
+    profiler = (settings or DEFAULT_SETTINGS)['profiler']
+    return profiler.phase(name, link) if profiler is not None else contextlib.nullcontext()
+
+
+# ===========================Adaptive Waiting====================================
+WAIT_STATS = dict()  # call site -> counters of the time spent waiting there
+WAIT_STATS_LOCK = threading.Lock()
+WEBDRIVERWAIT_POLL = 0.5  # poll frequency of selenium's WebDriverWait, used to estimate the time saved
+SETTLE_SCRIPT = """
+var w = window;
+if (!w.__udemineObserver) {
+    w.__udemineLastMutation = 0;
+    w.__udemineSince = Date.now();
+    w.__udemineObserver = new MutationObserver(function () { w.__udemineLastMutation = Date.now(); });
+    w.__udemineObserver.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+var now = Date.now();
+if (document.readyState === 'complete' && w.__udemineLastMutation > w.__udemineSince &&
+        now - w.__udemineLastMutation >= arguments[0]) {
+    w.__udemineSince = now;
+    return true;
+}
+return false;
+"""
+
+
+def record_wait(site, waited, budget, timed_out=False):
+    """
+
+    adds a wait to the stats of its call site; budget is what the fixed sleep or wait it replaces would have taken
+
+    """
+
+    with WAIT_STATS_LOCK:
+        stats = WAIT_STATS.setdefault(
+            site, {'calls': 0, 'timeouts': 0, 'waited': 0.0, 'budget': 0.0, 'latency': None})
+        stats['calls'] += 1
+        stats['waited'] += waited
+        stats['budget'] += budget
+        if timed_out:
+            stats['timeouts'] += 1
+        elif stats['latency'] is None:
+            stats['latency'] = waited
+        else:
+            # moving average so that the typical latency follows the site as it speeds up or slows down
+            stats['latency'] = 0.8 * stats['latency'] + 0.2 * waited
+
+
+def typical_latency(site):
+    """
+
+    returns the learned time it takes for the condition of a call site to be met, or None if it is not known yet
+
+    """
+
+    with WAIT_STATS_LOCK:
+        stats = WAIT_STATS.get(site)
+        return stats['latency'] if stats else None
+
+
+def poll(browser, condition, site, timeout):
+    """
+
+    Polls condition until it returns something truthy or timeout runs out, and returns it together with the time taken.
+    Once the typical latency of the call site is known, polling waits most of it out in one go rather than sending
+    round-trips that are bound to fail, then backs off from short intervals.
+
+    """
+
+    latency = typical_latency(site)
+    if latency is not None and latency > timeout:
+        timeout = min(3 * latency, 3 * timeout)  # give a slow site longer rather than failing on it
+    interval = 0.05
+    start = time.monotonic()
+    first = True
+    while True:
+        try:
+            value = condition(browser)
+        except (NoSuchElementException, StaleElementReferenceException):
+            value = False
+        elapsed = time.monotonic() - start
+        if value or elapsed >= timeout:
+            return value, elapsed
+        if first and latency:
+            time.sleep(min(0.8 * latency, timeout - elapsed))
+            first = False
+            continue
+        time.sleep(min(interval, timeout - elapsed))
+        interval = min(interval * 1.5, WEBDRIVERWAIT_POLL)
+
+
+def wait_until(browser, condition, site, timeout=3, message=''):
+    """
+
+    Drop in for WebDriverWait(browser, timeout).until(condition, message) that records how long it took at the call site.
+
+    """
+
+    value, elapsed = poll(browser, condition, site, timeout)
+    if not value:
+        # poll gives a slow site longer than timeout, which a fixed wait would have needed as well
+        record_wait(site, elapsed, max(timeout, elapsed), timed_out=True)
+        raise TimeoutException(message)
+    # WebDriverWait would have only noticed the condition at its next poll
+    record_wait(site, elapsed, -(-elapsed // WEBDRIVERWAIT_POLL) * WEBDRIVERWAIT_POLL)
+    return value
+
+
+def settle(browser, site, budget=1, quiet=0.25):
+    """
+
+    Replaces a fixed sleep of budget seconds after an action on the page. It returns as soon as the page has finished
+    loading and the DOM has changed and then stayed quiet for the quiet period, or after budget seconds at the latest.
+
+    """
+
+    value, elapsed = poll(browser, lambda b: b.execute_script(SETTLE_SCRIPT, int(quiet * 1000)), site, budget)
+    if not value:
+        browser.execute_script("window.__udemineSince = Date.now();")
+    record_wait(site, elapsed, max(budget, elapsed), timed_out=not value)  # as in wait_until
+
+
+def retry_stale(func, site, attempts=20):
+    """
+
+    Calls func again whenever the elements it reads go stale, backing off from short intervals in between.
+    Each retry used to be a 1 second sleep, which is what it is measured against.
+
+    """
+
+    interval = 0.05
+    for attempt in range(attempts):
+        try:
+            return func()
+        except StaleElementReferenceException:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(interval)
+            record_wait(site, interval, 1)
+            interval = min(interval * 2, 1)
+
+
+def wait_stats():
+    """
+
+    returns a DataFrame of the time spent waiting at each call site and how much was saved over fixed waits
+
+    """
+
+    with WAIT_STATS_LOCK:
+        stats = pd.DataFrame.from_dict(WAIT_STATS, orient='index',
+                                       columns=['calls', 'timeouts', 'waited', 'budget', 'latency'])
+    stats['saved'] = stats['budget'] - stats['waited']
+    return stats.rename(columns={'latency': 'typical_latency'}).rename_axis('site')
+
+
+def saved_waiting():
+    """
+
+    returns the seconds saved over fixed waits at every call site so far
+
+    """
+
+    with WAIT_STATS_LOCK:
+        return sum(stats['budget'] - stats['waited'] for stats in WAIT_STATS.values())
+
+
+def panel_filter_add(browser, filter_category):
+    """
+
+    This adds filter to narrow down the search results using the filter_category provided.
+    It also adds a filter to limit the language of the courses to English.
+
+    """
+    print('Filtering search results...')
+    # attempt to expand the Topic menu list
+    while True:
+        try:
+            expandlist = wait_until(browser, EC.visibility_of_element_located(
+                (By.XPATH, "//label[contains(text(),'Topic')]/following-sibling::node()//label[@role='button']")),
+                'panel_filter_add topic menu')
+            browser.execute_script("arguments[0].click();", expandlist)
+            break
+        except TimeoutException:
+            try:
+                expose_filter_menu(browser, 'Topic')
+                continue
+            except ValueError:
+                break
+
+    # find the checkbox that match the filter category and attempt to mark it
+    filtercat = browser.find_elements_by_xpath(
+        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Topic']//span[@class='filter--count--33UW8']/parent::node()")
+    try:
+        indc = [cat.text.split("\n")[0]
+                for cat in filtercat].index(filter_category)
+    except ValueError:
+        catlist = ', '.join([cat.text.split("\n")[0] for cat in filtercat])
+        browser.quit()
+        raise ValueError(
+            f"Encountered a problem while filtering search results. Unable to filter by the category given, {filter_category}. Categories::{catlist}")
+
+    checkbox = browser.find_elements_by_xpath(
+        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Topic']//input")[indc]
+    browser.execute_script("arguments[0].click();", checkbox)
+
+    settle(browser, 'panel_filter_add')
+    gotofix = browser.find_element_by_xpath(
+        "//div[@class='filter-button-container--button-bar--DU5FK'] | //div[@class='filter-panel--container--aq5nC']")
+    browser.execute_script("arguments[0].scrollIntoView();", gotofix)
+
+    settle(browser, 'panel_filter_add')
+    expose_filter_menu(browser, 'Language')
+    # attempt to mark the English language checkbox
+    filterlang = browser.find_elements_by_xpath(
+        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Language']//span[@class='filter--count--33UW8']/parent::node()")
+    indl = [lang.text.split("(")[0].split("\n")[0]
+            for lang in filterlang].index('English')
+    checkbox = browser.find_elements_by_xpath(
+        "//div[@class='panel--content-wrapper--1yFBX']//fieldset[@name='Language']//input")[indl]
+    browser.execute_script("arguments[0].click();", checkbox)
+
+    settle(browser, 'panel_filter_add')
+    gotofix = browser.find_element_by_xpath(
+        "//div[@class='filter-button-container--button-bar--DU5FK'] | //div[@class='filter-panel--container--aq5nC']")
+    browser.execute_script("arguments[0].scrollIntoView();", gotofix)
+
+
+def get_nextpage(browser):
+    """
+
+    returns the link to the next page of search results if any is found
+
+    """
+
+    try:
+        nextpage = wait_until(browser, EC.presence_of_element_located(
+            (By.XPATH, "//div[@class='pagination--container--2wc6Z']//a[@data-page='+1'] | //span[@aria-label='Next']/parent::node()")),
+            'get_nextpage').get_attribute("href")
+    except (NoSuchElementException, TimeoutException):
+        return None
+    try:
+        attribute_value = browser.find_element_by_xpath(
+            "//ul[@class='pagination pagination-expanded']/li[last()]").get_attribute("class")
+    except NoSuchElementException:
+        return nextpage
+    else:
+        if attribute_value:
+            return None
+        return nextpage
+
+
+def scrape_links_navigator(browser, reviews, courses, links, visited_links, settings=None):
+    """
+
+    Given a list of course links, this navigates and iterate through the list.
+
+    """
+
+    for link in tqdm(links):
+        check_stop(settings or DEFAULT_SETTINGS)
+        if should_scrape(link, visited_links, settings):  # scrape links only if not in list or changed
+            reviews, courses = scrape_course_page(browser, reviews, courses, link, settings)
+            visited_links.add(link)
+
+    return reviews, courses
+
+
+def scrape_course_page(browser, reviews, courses, link, settings=None):
+    """
+
+    Navigates to a course link and scrapes the course and its reviews if it meets the minimum requirements.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    scraped = len(courses), len(reviews)
+    governed_get(browser, link, settings)
+    proceed, courses = course_scraper(browser, courses, link, settings)
+    # if requirements are not met in course scraper, the link is not to be scraped.
+    if proceed and settings['review_source'] == 'browser':
+        with profile(settings, 'review_scraper', link):
+            reviews = review_scraper(browser, reviews, link, settings)
+    archive_page(browser, link, 'course', settings)
+    if settings['refresh'] is not None:
+        settings['refresh'].record(link)
+    new_courses, new_rows = courses[scraped[0]:], reviews.rows(scraped[1])
+    record_visit(settings, link, new_courses, new_rows)
+    if settings['results'] is not None:
+        # hand the course over to the caller of iter_scrape rather than keeping it
+        del courses[scraped[0]:]
+        reviews.truncate(scraped[1])
+        for course in new_courses:
+            emit(settings, course, new_rows)
+
+    return reviews, courses
+
+
+def links_consumer(browsers, slot, pending, visited_links, progress, settings=None):
+    """
+
+    Pulls course links off the pending queue and scrapes them with the browser session in the given slot until it
+    receives None. A session that crashes is restarted in place and the link it was on is attempted once more.
+    It returns the buffer of reviews and the list of courses scraped by this session.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    session_reviews = ColumnBuffer(REVIEW_COLUMNS)
+    session_courses = list()
+    while True:
+        link = get_checked(pending, settings)
+        if link is None:
+            break
+        for attempt in range(2):
+            scraped = len(session_courses), len(session_reviews)
+            try:
+                session_reviews, session_courses = scrape_course_page(browsers[slot], session_reviews,
+                                                                      session_courses, link, settings)
+                break
+            except WebDriverException:
+                # discard a half scraped course
+                del session_courses[scraped[0]:]
+                session_reviews.truncate(scraped[1])
+                if browser_alive(browsers[slot]):
+                    print(f"Unable to parse current page. Skipping page :: {link}")
+                    record_visit(settings, link)
+                    break
+                print(f"Browser session {slot} crashed. Restarting it...")
+                browsers[slot] = restart_browser(browsers[slot], settings)
+            except (IndexError, ValueError):
+                # a page that does not parse must not take the whole session down with it
+                del session_courses[scraped[0]:]
+                session_reviews.truncate(scraped[1])
+                print(f"Unable to parse current page. Skipping page :: {link}")
+                record_visit(settings, link)
+                break
+        visited_links.add(link)
+        progress.update()
+
+    return session_reviews, session_courses
+
+
+def listings_producer(browser, links, nextpage, page_count, pending, consumers, visited_links, settings=None):
+    """
+
+    Walks the pages of search results and puts every new course link on the pending queue.
+    Putting blocks while the queue is full so the listings are never too far ahead of the course scraping.
+    When it runs out of pages, it puts one None on the queue for each consumer and returns the page count.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    queued = VisitedIndex()  # links already handed out, possibly still waiting to be scraped
+    try:
+        pages = itertools.chain([(page_count, links, nextpage)], iter_listings(browser, nextpage, page_count, settings))
+        for page_count, links, nextpage in pages:
+            for link in links:
+                if link not in queued and should_scrape(link, visited_links, settings):
+                    queued.add(link)
+                    put_checked(pending, link, settings)
+            print(f'Queued all course listings on page {page_count}!')
+    finally:
+        try:
+            for _ in range(consumers):
+                put_checked(pending, None, settings)
+        except ScrapeStopped:
+            pass  # the consumers stop on their own
+
+    return page_count
+
+
+def scrape_pipeline(browser, browsers, links, nextpage, page_count, reviews, courses, visited_links, queue_size,
+                    settings=None):
+    """
+
+    Scrapes the search results as a pipeline. The listing browser walks the pages of search results and feeds
+    course links through a queue holding at most queue_size links to the course browsers, which scrape them at the
+    same time. The courses and reviews of all the course browsers are merged at the end.
+
+    """
+
+    pending = queue.Queue(maxsize=queue_size)
+    progress = tqdm(unit='course')
+    with ThreadPoolExecutor(max_workers=len(browsers) + 1) as executor:
+        producer = executor.submit(listings_producer, browser, links, nextpage,
+                                   page_count, pending, len(browsers), visited_links, settings)
+        consumers = [executor.submit(links_consumer, browsers, slot, pending,
+                                     visited_links, progress, settings)
+                     for slot in range(len(browsers))]
+        watch_consumers(consumers, settings)
+        results = consumer_results(consumers)
+        page_count = producer.result()
+    progress.close()
+
+    for session_reviews, session_courses in results:
+        reviews.extend(session_reviews)
+        courses.extend(session_courses)
+
+    return reviews, courses, page_count
+
+
+def queue_consumer(browsers, slot, work_queue, settings=None, poll=1.0):
+    """
+
+    Leases course links off the work queue and scrapes them with the browser session in the given slot, acking each
+    with the course and reviews it gave, until the work queue is done. A session that crashes is restarted in place
+    and its link is released so that it is attempted again. It returns the number of links scraped.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    worker = f'{socket.gethostname()}:{os.getpid()}:{slot}'
+    scraped = 0
+    while True:
+        check_stop(settings)
+        link = work_queue.lease(worker)
+        if link is None:
+            if work_queue.done():
+                return scraped
+            time.sleep(poll)
+            continue
+        reviews, courses = ColumnBuffer(REVIEW_COLUMNS), list()
+        try:
+            reviews, courses = scrape_course_page(browsers[slot], reviews, courses, link, settings)
+        except WebDriverException:
+            if browser_alive(browsers[slot]):
+                print(f"Unable to parse current page. Skipping page :: {link}")
+                work_queue.ack(link)
+                continue
+            print(f"Browser session {slot} crashed. Restarting it...")
+            work_queue.release(link)
+            browsers[slot] = restart_browser(browsers[slot], settings)
+            continue
+        except (IndexError, ValueError):
+            # a page that does not parse must not take the whole session down with it
+            print(f"Unable to parse current page. Skipping page :: {link}")
+            work_queue.ack(link)
+            continue
+        work_queue.ack(link, courses, reviews.rows())
+        scraped += 1
+
+
+def queue_crawl(browser, browsers, links, nextpage, page_count, visited_links, settings, poll=1.0):
+    """
+
+    Scrapes the search results through the work queue of settings. The listing browser puts every new course link on
+    the work queue, the course browsers scrape links off it like any other worker node, and the results acked by
+    every worker are handed over as they come in. It returns the page count once the work queue is done.
+
+    """
+
+    work_queue = settings['work_queue']
+    local = {**settings, 'results': None, 'checkpoint': None}  # the course browsers ack what they scrape
+    work_queue.start()  # a new job, so nothing an earlier job left on the queue is taken for done
+
+    def produce():
+        count = page_count
+        try:
+            pages = itertools.chain([(page_count, links, nextpage)],
+                                    iter_listings(browser, nextpage, page_count, settings))
+            for count, listed, _ in pages:
+                check_stop(settings)
+                added = work_queue.put([link for link in listed if should_scrape(link, visited_links, settings)])
+                print(f'Queued {added} course listings on page {count}!')
+        finally:
+            work_queue.finish()
+        return count
+
+    with ThreadPoolExecutor(max_workers=len(browsers) + 1) as executor:
+        lister = executor.submit(produce)
+        consumers = [executor.submit(queue_consumer, browsers, slot, work_queue, local, poll)
+                     for slot in range(len(browsers))]
+        while True:
+            finished = lister.done() and work_queue.done()  # checked first so that no late result is left behind
+            failed = [c.exception() for c in consumers if c.done() and c.exception() is not None]
+            if failed:
+                settings['stop'].set()
+                raise failed[0]
+            if collect_results(work_queue, visited_links, settings):
+                continue
+            if finished:
+                break
+            time.sleep(poll)
+
+    return lister.result()
+
+
+def load_listings_page(browser, nextpage, settings=None):
+    """
+
+    Loads a page of search results and returns the course links on it together with the link to the next page.
+
+    """
+
+    governed_get(browser, nextpage, settings)
+    # trick to force javascript to expose elements in the DOM
+    while True:
+        try:
+            settle(browser, 'load_listings_page')
+            gotofix = browser.find_element_by_xpath(
+                "//div[@class='filter-button-container--button-bar--DU5FK'] | //div[@class='filter-panel--container--aq5nC']")
+            browser.execute_script("arguments[0].scrollIntoView();", gotofix)
+            break
+        except NoSuchElementException:
+            browser.execute_script("window.scrollTo(0,document.body.scrollHeight)")
+            continue
+    # check for new search results and next search result link.
+    try:
+        wait_until(browser, EC.visibility_of_any_elements_located(
+            (By.XPATH, "//div[@class='course-list--container--3zXPS']//a[contains(@class,'udlite-custom-focus-visible')]  | //div[@data-purpose='search-course-cards']//a")),
+            'load_listings_page')
+    except TimeoutException:
+        # no new search results; the scraper ends unless there is a next search result link
+        return [], get_nextpage(browser)
+
+    courses_links = browser.find_elements_by_xpath(LISTING_LINKS)
+    links = [c.get_attribute("href") for c in courses_links]
+    observe_cards(browser, LISTING_LINKS, settings)
+    archive_page(browser, nextpage, 'listing', settings)
+
+    return links, get_nextpage(browser)
+
+
+# ===========================Search URLs=========================================
+PAGINATION_SCRIPT = """
+var links = document.querySelectorAll('[class*="pagination"] a[href]'), hrefs = [];
+for (var i = 0; i < links.length; i++) hrefs.push(links[i].href);
+return hrefs;
+"""
+
+
+class FilterCache:
+    """
+
+    Remembers, for each host and filter category, the query string parameters that the filter menus add to the search
+    results URL, such as the ID of the topic and of the language. Once a category is known, the filtered search results
+    are loaded straight from their URL rather than through the filter menus. Given a path, it is kept in a JSON file.
+
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.filters = dict()
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.filters = json.load(f)
+
+    def get(self, base_url, category):
+        return self.filters.get(urlsplit(base_url).netloc.lower(), {}).get(category)
+
+    def put(self, base_url, category, params):
+        with self.lock:
+            self.filters.setdefault(urlsplit(base_url).netloc.lower(), {})[category] = params
+            if self.path is not None:
+                with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(self.filters, f, indent=1)
+                os.replace(self.path + '.tmp', self.path)
+
+
+FILTER_CACHE = FilterCache()  # shared by the scrape jobs of this process that are not given a file of their own
+
+
+def filter_params(url):
+    """
+
+    returns the query string parameters of a filtered search results URL that set the filters
+
+    """
+
+    return {k: v for k, v in parse_qsl(urlsplit(url).query) if k not in ('q', 'p', 'src')}
+
+
+def search_url(base_url, search_term, params, page=None):
+    """
+
+    builds the URL of the search results of search_term filtered by params, at the given page
+
+    """
+
+    query = {'q': search_term, **params}
+    if page is not None:
+        query['p'] = page
+    return base_url.rstrip('/') + '/courses/search/?' + urlencode(query)
+
+
+def page_number(url):
+    page = dict(parse_qsl(urlsplit(url).query)).get('p') if url else None
+    return int(page) if page and page.isdigit() else None
+
+
+def page_url(url, page):
+    """
+
+    returns url pointing at another page of the same search results
+
+    """
+
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query['p'] = page
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+def last_listing_page(browser):
+    """
+
+    returns the number of the last page of search results linked from the pagination, or None if none is linked
+
+    """
+
+    pages = [page_number(href) for href in browser.execute_script(PAGINATION_SCRIPT) or []]
+    pages = [p for p in pages if p is not None]
+    return max(pages) if pages else None
+
+
+def iter_listings(browser, nextpage, page_count, settings=None):
+    """
+
+    Yields the page count, the course links and the link to the next page for every page of search results after
+    page_count, starting at nextpage. When the number of the last page is known, the pages are loaded by number,
+    listing_workers of them at the same time; otherwise they are followed one next page link at a time.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    last = settings['last_page']
+    helpers = list()
+    try:
+        if settings['listing_workers'] > 1 and last and page_number(nextpage) == page_count + 1:
+            helpers.extend(open_browser(settings) for _ in range(settings['listing_workers'] - 1))
+            pool = [browser] + helpers
+            with ThreadPoolExecutor(max_workers=len(pool)) as executor:
+                for start in range(page_count + 1, last + 1, len(pool)):
+                    batch = list(range(start, min(start + len(pool), last + 1)))
+                    loaded = executor.map(lambda b, page: load_listings_page(b, page_url(nextpage, page), settings),
+                                          pool, batch)
+                    for page, (links, _) in zip(batch, loaded):
+                        following = page_url(nextpage, page + 1) if page < last else None
+                        record_page(settings, page, links, following)
+                        yield page, links, following
+            return
+        while nextpage:
+            links, nextpage = load_listings_page(browser, nextpage, settings)
+            page_count += 1
+            record_page(settings, page_count, links, nextpage)
+            yield page_count, links, nextpage
+    finally:
+        for b in helpers:
+            close_browser(b, settings)
+
+
+def expand_section(browser, path, settings=None):
+    """
+
+    attempts to expand a section and at the same time handles exceptions thrown
+
+    """
+
+    with profile(settings, 'expand_section', path):
+        try:
+            browser.find_element_by_xpath(path).click()
+        except NoSuchElementException:
+            pass
+        except ElementClickInterceptedException:
+            see_more_section = browser.find_element_by_xpath(path)
+            browser.execute_script("arguments[0].click();", see_more_section)
+
+
+def expand_toggle(browser, path, settings=None):
+    """
+
+    wait for element to be visible before expand a toggle; also handles exceptions thrown
+
+    """
+
+    with profile(settings, 'expand_toggle', path):
+        try:
+            toggle = wait_until(browser, EC.visibility_of_element_located((By.XPATH, path)), 'expand_toggle')
+            browser.execute_script("arguments[0].click();", toggle)
+        except TimeoutException:
+            pass
+
+
+def expose_filter_menu(browser, filter_by):
+    """
+
+    find the text of the label that matches with what is provided and attempt to expose the menu
 
     """
 
@@ -454,84 +3526,382 @@ def overlay_filter_add(browser, filter_category):
         "//fieldset[@class='filter--filter-container--1ftIU' and @name='Topic']//input")[indc]
     browser.execute_script("arguments[0].click();", checkbox)
 
-    time.sleep(2)
-    # attempt to mark the English language checkbox
-    filterlang = browser.find_elements_by_xpath(
-        "//fieldset[@class='filter--filter-container--1ftIU' and @name='Language']//span[@class='filter-option--checkbox-content--4HaUs']")
-    indl = ['English' in lang.text for lang in filterlang].index(True)
-    checkbox = browser.find_elements_by_xpath(
-        "//fieldset[@class='filter--filter-container--1ftIU' and @name='Language']//input")[indl]
-    browser.execute_script("arguments[0].click();", checkbox)
+    settle(browser, 'overlay_filter_add', budget=2)
+    # attempt to mark the English language checkbox
+    filterlang = browser.find_elements_by_xpath(
+        "//fieldset[@class='filter--filter-container--1ftIU' and @name='Language']//span[@class='filter-option--checkbox-content--4HaUs']")
+    indl = ['English' in lang.text for lang in filterlang].index(True)
+    checkbox = browser.find_elements_by_xpath(
+        "//fieldset[@class='filter--filter-container--1ftIU' and @name='Language']//input")[indl]
+    browser.execute_script("arguments[0].click();", checkbox)
+
+    settle(browser, 'overlay_filter_add')
+    while True:
+        try:
+            confirm_changes = browser.find_element_by_xpath("//button[contains(text(),'Done')]")
+            browser.execute_script("arguments[0].click();", confirm_changes)
+        except NoSuchElementException:
+            break
+
+
+# ===========================Page Snapshots======================================
+def has_class(name):
+    """
+
+    returns an XPath predicate that matches elements having name as one of their classes
+
+    """
+
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# the elements read off each kind of page, by the name of the field they feed, as a CSS selector for the browser
+# and the matching XPath for saved HTML
+Selectors = collections.namedtuple('Selectors', ['css', 'xpath'])
+
+
+class SelectorProfile:
+    """
+
+    The selectors of one course page format: an anchor whose presence tells that a page is in this format, and the
+    Selectors of its requirement and course fields. The format of a page is detected once with detect_format and its
+    profile is used for everything read off the page after that. version tells apart profiles of the same format
+    written for different versions of the page.
+
+    """
+
+    def __init__(self, name, version, anchor, requirements, course):
+        self.name = name
+        self.version = version
+        self.anchor = anchor
+        self.requirements = requirements
+        self.course = course
+
+    def __repr__(self):
+        return f"SelectorProfile({self.name!r}, version={self.version})"
+
+
+SELECTOR_PROFILES = {
+    'original': SelectorProfile(
+        'original', 1,
+        anchor=Selectors('[data-content-group*="Landing Page"]', "//div[contains(@data-content-group,'Landing Page')]"),
+        requirements=Selectors(css={
+            'enrollment': '[data-content-group*="Landing Page"] div[data-purpose="enrollment"]',
+            'rating': '[data-content-group*="Landing Page"] div.rate-count',
+            'locale': '[data-content-group*="Landing Page"] div.clp-lead__locale',
+        }, xpath={
+            'enrollment': "//div[contains(@data-content-group,'Landing Page')]//div[@data-purpose='enrollment']",
+            'rating': "//div[contains(@data-content-group,'Landing Page')]//div[@class='rate-count']",
+            'locale': "//div[contains(@data-content-group,'Landing Page')]//div[@class='clp-lead__locale']",
+        }),
+        course=Selectors(css={
+            'title': 'h1',
+            'topics': '.what-you-get__text',
+            'summary': 'div.description__title ~ * *',
+            'number_of_lectures': 'span.dib',
+            'total_video_duration': 'span.curriculum-header-length',
+            'lecture_titles': '[data-purpose="course-curriculum"] div.title',
+            'lecture_durations': '[data-purpose="course-curriculum"] div.details',
+            'original_price': 'div[data-purpose="course-old-price-text"] s span',
+            'instructor_name': '.instructor--instructor--2qudS .instructor--title__link--1NJ6S',
+            'instructor_bio': 'div.instructor--instructor--2qudS '
+                              'div[data-purpose="safely-set-inner-html:trusted-html:content"] p',
+            'instructor_stats': 'span.instructor--instructor__stat-value--2Kwe1',
+        }, xpath={
+            'title': "//h1",
+            'topics': f"//*[{has_class('what-you-get__text')}]",
+            'summary': "//div[@class='description__title']/following-sibling::*//*",
+            'number_of_lectures': "//span[@class='dib']",
+            'total_video_duration': "//span[@class='curriculum-header-length']",
+            'lecture_titles': "//div[@data-purpose='course-curriculum']//div[@class='title']",
+            'lecture_durations': "//div[@data-purpose='course-curriculum']//div[@class='details']",
+            'original_price': "//div[@data-purpose='course-old-price-text']//s/span",
+            'instructor_name': f"//*[{has_class('instructor--instructor--2qudS')}]//*[{has_class('instructor--title__link--1NJ6S')}]",
+            'instructor_bio': "//div[@class='instructor--instructor--2qudS']//div[@data-purpose='safely-set-inner-html:trusted-html:content']//p",
+            'instructor_stats': "//span[@class='instructor--instructor__stat-value--2Kwe1']",
+        })),
+    'revised': SelectorProfile(
+        'revised', 1,
+        anchor=Selectors('div.course-landing-page__main-content',
+                         "//div[@class='course-landing-page__main-content']"),
+        requirements=Selectors(css={
+            'enrollment': 'div.course-landing-page__main-content div[data-purpose="enrollment"]',
+            'rating': 'div.course-landing-page__main-content div[data-purpose="rating"]',
+            'locale': 'div.course-landing-page__main-content div.clp-lead__locale',
+        }, xpath={
+            'enrollment': "//div[@class='course-landing-page__main-content']//div[@data-purpose='enrollment']",
+            'rating': "//div[@class='course-landing-page__main-content']//div[@data-purpose='rating']",
+            'locale': "//div[@class='course-landing-page__main-content']//div[contains(@class,'clp-lead__locale')]",
+        }),
+        course=Selectors(css={
+            'title': 'h1',
+            'topics': '.what-you-will-learn--objectives-list--2cWZN',
+            'summary': 'div[data-purpose="safely-set-inner-html:description:description"] p',
+            'curriculum_stats': 'div[data-purpose="curriculum-stats"]',
+            'lecture_titles': 'div.section--lecture-title-and-description--3lul7',
+            'lecture_durations': 'span.section--lecture-content--2I4Bi',
+            'original_price': '.course-landing-page__purchase-section__main '
+                              'div[data-purpose="original-price-container"] s span',
+            'instructor_name': '.styles--instructors--2JsS3 .instructor--instructor__title--34ItB',
+            'instructor_bio': 'div[data-purpose="description-content"] p',
+            'instructor_stats': 'div.instructor--instructor__image-and-stats--1IqE7 li',
+        }, xpath={
+            'title': "//h1",
+            'topics': f"//*[{has_class('what-you-will-learn--objectives-list--2cWZN')}]",
+            'summary': "//div[@data-purpose='safely-set-inner-html:description:description']//p",
+            'curriculum_stats': "//div[@data-purpose='curriculum-stats']",
+            'lecture_titles': "//div[@class='section--lecture-title-and-description--3lul7']",
+            'lecture_durations': "//span[@class='section--lecture-content--2I4Bi']",
+            'original_price': "//div[contains(@class,'course-landing-page__purchase-section__main')]//div[@data-purpose='original-price-container']//s/span",
+            'instructor_name': f"//*[{has_class('styles--instructors--2JsS3')}]//*[{has_class('instructor--instructor__title--34ItB')}]",
+            'instructor_bio': "//div[@data-purpose='description-content']//p",
+            'instructor_stats': "//div[@class='instructor--instructor__image-and-stats--1IqE7']//li",
+        })),
+}
+REVIEW_SELECTORS = Selectors(css={
+    'review': 'div[data-purpose="landing-page-review-list"] div[data-purpose="review-comment-content"]',
+    'customer_name': 'div[data-purpose="landing-page-review-list"] div[data-purpose="review-detail-user-name"]',
+    'ratings': 'div[data-purpose="landing-page-review-list"] span.udlite-sr-only',
+    'time_posted': 'div[data-purpose="landing-page-review-list"] '
+                   'span.individual-review--individual-review__detail-date--DEkVn',
+}, xpath={
+    'review': "//div[@data-purpose='landing-page-review-list']//div[@data-purpose='review-comment-content']",
+    'customer_name': "//div[@data-purpose='landing-page-review-list']//div[@data-purpose='review-detail-user-name']",
+    'ratings': "//div[@data-purpose='landing-page-review-list']//span[@class='udlite-sr-only']",
+    'time_posted': "//div[@data-purpose='landing-page-review-list']//span[contains(@class,'individual-review--individual-review__detail-date--DEkVn')]",
+})
+
+
+def register_profile(profile):
+    """
+
+    adds a selector profile, or replaces the one of the same format; profiles added last are tried first
+
+    """
+
+    SELECTOR_PROFILES.pop(profile.name, None)
+    items = list(SELECTOR_PROFILES.items())
+    SELECTOR_PROFILES.clear()
+    SELECTOR_PROFILES[profile.name] = profile
+    SELECTOR_PROFILES.update(items)
+
+
+def detect_format(page):
+    """
+
+    returns the name of the first profile whose anchor is on the page, given as a browser or as HTML parsed with lxml,
+    or None if the page is in none of the known formats
+
+    """
+
+    if hasattr(page, 'execute_script'):
+        return page.execute_script(FORMAT_SCRIPT, [[p.name, p.anchor.css] for p in SELECTOR_PROFILES.values()])
+    for p in SELECTOR_PROFILES.values():
+        if page.xpath(p.anchor.xpath):
+            return p.name
+    return None
+
+
+SNAPSHOT_SCRIPT = """
+var fields = arguments[0], css = arguments[1], snapshot = {};
+function text(node) {
+    return (node.innerText === undefined ? node.textContent : node.innerText).trim();
+}
+for (var field in fields) {
+    snapshot[field] = [];
+    if (css) {
+        var found = document.querySelectorAll(fields[field]);
+        for (var i = 0; i < found.length; i++) snapshot[field].push(text(found[i]));
+        continue;
+    }
+    var nodes = document.evaluate(fields[field], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (var i = 0; i < nodes.snapshotLength; i++) snapshot[field].push(text(nodes.snapshotItem(i)));
+}
+return snapshot;
+"""
+FORMAT_SCRIPT = """
+for (var i = 0; i < arguments[0].length; i++) {
+    if (document.querySelector(arguments[0][i][1])) return arguments[0][i][0];
+}
+return null;
+"""
+BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption',
+              'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav',
+              'ol', 'p', 'pre', 'section', 'table', 'tr', 'ul'}
+EXTRACTIONS = ('element', 'bulk', 'html')
+COURSE_ID_SCRIPT = """
+var e = document.querySelector('[data-clp-course-id], [data-course-id]');
+return e ? (e.getAttribute('data-clp-course-id') || e.getAttribute('data-course-id')) : null;
+"""
+REQUIREMENTS = {'min_students': 500, 'min_reviews': 50, 'language': 'English'}
+DEFAULT_SETTINGS = {'extraction': 'element', 'archive': None, 'checkpoint': None, 'results': None, 'stop': None,
+                    'max_reviews': 50, 'review_source': 'browser', 'governor': None,
+                    'refresh': None, 'profiler': None, 'base_url': 'https://www.udemy.com',
+                    'requirements': REQUIREMENTS, 'prefilter': False, 'cards': None, 'avoided': None,
+                    'sessions': None, 'filter_cache': None, 'listing_workers': 1, 'last_page': None,
+                    'work_queue': None}
+
+
+def element_snapshot(browser, fields, css=False):
+    """
+
+    reads the text of the elements of every field one WebDriver round-trip per element, found by XPath or by CSS
+
+    """
+
+    find = browser.find_elements_by_css_selector if css else browser.find_elements_by_xpath
+
+    def read(path):
+        return [e.text for e in find(path)]
+
+    return {field: retry_stale(lambda: read(path), 'element_snapshot') for field, path in fields.items()}
+
+
+def bulk_snapshot(browser, fields, css=False):
+    """
+
+    reads the text of the elements of every field in a single injected script, found by XPath or by CSS
+
+    """
+
+    return browser.execute_script(SNAPSHOT_SCRIPT, fields, css)
+
+
+def element_text(element):
+    """
+
+    returns the text of a parsed HTML element laid out the way the browser shows it, one line per block element
+
+    """
+
+    parts = []
+
+    def walk(el):
+        if not isinstance(el.tag, str) or el.tag in ('script', 'style', 'noscript'):
+            return  # comments and code have no visible text, but their tail does and is added by the parent
+        block = el.tag in BLOCK_TAGS
+        if block:
+            parts.append('\n')
+        if el.text:
+            parts.append(el.text)
+        for child in el:
+            walk(child)
+            if child.tail:
+                parts.append(child.tail)
+        if block:
+            parts.append('\n')
+
+    walk(element)
+    lines = [' '.join(line.split()) for line in ''.join(parts).split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+def html_snapshot(page, fields):
+    """
+
+    Reads the text of the elements of every field out of saved page HTML, such as browser.page_source, without a browser.
+    A page that is already parsed with lxml can be passed in place of the HTML to avoid parsing it again.
+
+    """
+
+    lxml_html = optional_import('lxml.html')
+    if lxml_html is None:
+        raise ImportError("Parsing saved pages requires lxml. Install it with pip install lxml.")
+    tree = lxml_html.fromstring(page) if isinstance(page, (str, bytes)) else page
+
+    return {field: [element_text(e) for e in tree.xpath(path)] for field, path in fields.items()}
+
+
+def take_snapshot(browser, fields, extraction):
+    """
+
+    returns a dict with the text of the elements found for each field, in the way set by extraction.
+    Given Selectors, the browser finds the elements by CSS and saved HTML is searched by XPath.
+
+    """
 
-    time.sleep(1)
-    while True:
-        try:
-            confirm_changes = browser.find_element_by_xpath("//button[contains(text(),'Done')]")
-            browser.execute_script("arguments[0].click();", confirm_changes)
-        except NoSuchElementException:
-            break
+    css = isinstance(fields, Selectors)
+    if extraction == 'html':
+        return html_snapshot(browser.page_source, fields.xpath if css else fields)
+    if css:
+        fields = fields.css
+    if extraction == 'bulk':
+        return bulk_snapshot(browser, fields, css)
+    return element_snapshot(browser, fields, css)
 
 
-def scrape_original(browser, courses, link):
+def meets_requirements(enrolled, num_of_reviews, language, requirements=None):
     """
 
-    This scrapes course information from original page format
+    checks if students enrolled, number of reviews and language requirements are met
+
+    """
+
+    requirements = requirements or REQUIREMENTS
+    return (enrolled >= requirements['min_students'] and num_of_reviews >= requirements['min_reviews']
+            and language == requirements['language'])
+
+
+def parse_requirements(snapshot, page_format):
+    """
+
+    This reads the students enrolled, the number of reviews and the language off a course page in the given format.
+    It returns them after the page format, or None if any of them is missing.
+
+    """
+
+    if not snapshot['enrollment'] or not snapshot['rating'] or not snapshot['locale']:
+        return None
+    enrolled = snapshot['enrollment'][0].split(" ", 1)[0]
+    num_of_reviews = re.search(r'\(([\d,]+)', snapshot['rating'][0])  # e.g. 4.6 (1,234 ratings)
+    if num_of_reviews is None:
+        return None
+
+    return page_format, int(enrolled.replace(",", "")), int(num_of_reviews.group(1).replace(",", "")), snapshot['locale'][0]
+
+
+def parse_course(snapshot, link, page_format):
+    """
+
+    This builds the course details out of a snapshot of a course page in the given format.
+    It returns None if the page is missing details that every course should have.
 
     """
 
     course = dict()
     course['link'] = link
-    course['title'] = browser.find_element_by_xpath("//h1").text
-    # expand topic section if it is possible and capture info
-    expand_section(
-        browser, "//div[@class='what-you-get']//button[contains(@class,'js-simple-collapse-more-btn')]")
-    topics = browser.find_elements_by_class_name("what-you-get__text")
-    course['topics'] = ', '.join([t.text for t in topics])
-    # expand course description section if it is possible and capture info
-    expand_section(
-        browser, "//div[contains(@data-purpose,'course-description')]//button[contains(@class,js-simple-collapse-more-btn)]")
-    summary = browser.find_elements_by_xpath(
-        "//div[@class='description__title']/following-sibling::*//*")
-    course['summary'] = '\n'.join([s.text for s in summary[:-3]])
-    while True:
-        try:
-            course['number_of_lectures'] = browser.find_element_by_xpath(
-                "//span[@class='dib']").text
-            course['total_video_duration'] = browser.find_element_by_xpath(
-                "//span[@class='curriculum-header-length']").text
-            break
-        except NoSuchElementException:
-            return False, courses
-        except StaleElementReferenceException:
-            time.sleep(1)
-            continue
-    # expand course lectures if it is possible
-    expand_toggle(
-        browser, '//a[@data-purpose="load-full-curriculum" or @data-purpose="toggle-section"]')
-    expand_toggle(browser, '//a[@class="sections-toggle"]')
-    titles = browser.find_elements_by_xpath(
-        "//div[@data-purpose='course-curriculum']//div[@class='title']")
-    duration = browser.find_elements_by_xpath(
-        "//div[@data-purpose='course-curriculum']//div[@class='details']")
-    # attempt to capture lecture titles and durations; if encountered a change of the DOM, wait 2 seconds
-    while True:
-        try:
-            course['lectures_breakdown'] = list(
-                zip([t.text for t in titles], [d.text for d in duration]))
-        except StaleElementReferenceException:
-            time.sleep(1)
-            continue
-        break
+    if not snapshot['title']:
+        return None
+    course['title'] = snapshot['title'][0]
+    course['topics'] = ', '.join(snapshot['topics'])
+    course['summary'] = '\n'.join(snapshot['summary'][:-3])
+    if page_format == 'original':
+        if not snapshot['number_of_lectures'] or not snapshot['total_video_duration']:
+            return None
+        course['number_of_lectures'] = snapshot['number_of_lectures'][0]
+        course['total_video_duration'] = snapshot['total_video_duration'][0]
+    else:
+        curriculum_stats = snapshot['curriculum_stats'][0].split(' • ') if snapshot['curriculum_stats'] else []
+        if len(curriculum_stats) < 3:
+            return None
+        course['number_of_lectures'] = curriculum_stats[1]
+        course['total_video_duration'] = curriculum_stats[2][:-12]
+    course['lectures_breakdown'] = list(zip(snapshot['lecture_titles'], snapshot['lecture_durations']))
+
+    # Free courses will not be scraped.
+    if not snapshot['original_price']:
+        return None
+    course['original_price'] = snapshot['original_price'][0]
 
-    course['original_price'] = browser.find_element_by_xpath(
-        "//div[@data-purpose='course-old-price-text']//s/span").text
     # find out if there is one or more instructors information and process them separately
-    instructors = browser.find_elements_by_class_name("instructor--instructor--2qudS")
+    instructors = snapshot['instructor_name']
+    stats = snapshot['instructor_stats']
+    if not instructors or len(stats) < 4:
+        return None
     if len(instructors) > 1:
         # add '-&-' between the names of instructors
-        course['instructor_name'] = ' -&- '.join([i.find_element_by_class_name(
-            "instructor--title__link--1NJ6S").text for i in instructors])
-        course['instructor_bio'], stats = get_bio_stats_original(browser)
+        course['instructor_name'] = ' -&- '.join(instructors)
+        course['instructor_bio'] = '\n'.join([b.strip() for b in snapshot['instructor_bio']])
         # create a list of different instructors for each stat
         course['group_instructor_rating'] = stats[::4]
         course['group_reviews'] = stats[1::4]
@@ -539,93 +3909,477 @@ def scrape_original(browser, courses, link):
         course['group_courses'] = stats[3::4]
 
     else:
-        course['instructor_name'] = instructors[0].find_element_by_class_name(
-            "instructor--title__link--1NJ6S").text
-        course['instructor_bio'], stats = get_bio_stats_original(browser)
+        course['instructor_name'] = instructors[0]
+        course['instructor_bio'] = '\n'.join([b.strip() for b in snapshot['instructor_bio']])
         course['instructor_rating'], course['total_reviews'], course['total_students'], course['total_courses'] = stats[0], stats[1], stats[2], stats[3]
 
-    courses.append(course)
-    return True, courses
+    return course
 
 
-def scrape_revised(browser, courses, link):
+def parse_reviews(snapshot, link):
     """
 
-    This scrapes course information from revised page format
+    This turns a snapshot of the review section of a course page into rows of
+    course_link, customer_name, time_posted, review and ratings.
 
     """
 
-    course = dict()
-    course['link'] = link
-    course['title'] = browser.find_element_by_xpath("//h1").text
-    # expand topic section if it is possible and capture info
-    expand_section(
-        browser, "//div[@class='what-you-will-learn--what-will-you-learn--mnJ5T']//label')]")
-    topics = browser.find_elements_by_class_name("what-you-will-learn--objectives-list--2cWZN")
-    course['topics'] = ', '.join([t.text for t in topics])
-    # expand course description section if it is possible and capture info
-    expand_section(
-        browser, "//div[contains(@class,'styles--description--3y4KY')]//label")
-    summary = browser.find_elements_by_xpath(
-        "//div[@data-purpose='safely-set-inner-html:description:description']//p")
-    course['summary'] = '\n'.join([s.text for s in summary[:-3]])
-    while True:
+    review = snapshot['review']
+    course_link = [link]*len(review)
+    ratings = [s[8:] for s in snapshot['ratings']]
+
+    return list(zip(course_link, snapshot['customer_name'], snapshot['time_posted'], review, ratings))
+
+
+def parse_page_source(html, link, requirements=None):
+    """
+
+    This parses the saved HTML of a fully expanded course page, as found in browser.page_source, without a browser.
+    It returns the course details, or None if the course is skipped, together with the rows of its reviews.
+
+    """
+
+    lxml_html = optional_import('lxml.html')
+    if lxml_html is None:
+        raise ImportError("Parsing saved pages requires lxml. Install it with pip install lxml.")
+    tree = lxml_html.fromstring(html)
+    page_format = detect_format(tree)
+    if page_format is None:
+        return None, []
+    selectors = SELECTOR_PROFILES[page_format]
+    found = parse_requirements(html_snapshot(tree, selectors.requirements.xpath), page_format)
+    if found is None or not meets_requirements(*found[1:], requirements):
+        return None, []
+    course = parse_course(html_snapshot(tree, selectors.course.xpath), link, page_format)
+    if course is None:
+        return None, []
+    course['course_id'] = (tree.xpath("string((//*[@data-clp-course-id]/@data-clp-course-id | "
+                                      "//*[@data-course-id]/@data-course-id)[1])") or None)
+
+    return course, parse_reviews(html_snapshot(tree, REVIEW_SELECTORS.xpath), link)
+
+
+def parse_pages(pages, processes=None, requirements=None):
+    """
+
+    This parses many saved course pages at once in a pool of processes, away from any browser.
+    Pass pages as pairs of link and HTML; processes defaults to the number of cores. Give requirements as in scraper
+    to change which courses are kept.
+    It returns 2 Pandas DataFrame; the first one contains the reviews and the other is a description of the courses.
+
+    """
+
+    courses = list()
+    reviews = ColumnBuffer(REVIEW_COLUMNS)
+    pages = iter(pages)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # hand the pages over a batch at a time so that they never all have to be in memory together
+        while True:
+            batch = list(itertools.islice(pages, 256))
+            if not batch:
+                break
+            links = [link for link, _ in batch]
+            htmls = [html for _, html in batch]
+            for course, rows in executor.map(parse_page_source, htmls, links, itertools.repeat(requirements),
+                                             chunksize=16):
+                if course is not None:
+                    courses.append(course)
+                    reviews.extend(rows)
+
+    return reviews.to_frame(), pd.DataFrame(courses)
+
+
+# ===========================Page Archive========================================
+class PageArchive:
+    """
+
+    A local archive of the pages fetched while scraping. The HTML of a page is stored once no matter how many times it
+    is fetched, compressed with zstd when zstandard is installed or gzip otherwise, in a file named by its SHA-256.
+    A SQLite index records the link, kind ('course' or 'listing') and fetch time of every fetch.
+
+    """
+
+    def __init__(self, path, compression=None):
+        self.path = path
+        zstandard = optional_import('zstandard')
+        self.compression = compression or ('zstd' if zstandard is not None else 'gzip')
+        if self.compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd compression requires zstandard. Install it with pip install zstandard.")
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        self.lock = threading.Lock()
+        self.index = sqlite3.connect(os.path.join(path, 'index.sqlite'), check_same_thread=False)
+        self.index.execute("""CREATE TABLE IF NOT EXISTS fetches
+                              (link TEXT, kind TEXT, fetched_at REAL, digest TEXT, compression TEXT)""")
+        self.index.execute("CREATE INDEX IF NOT EXISTS fetches_link ON fetches (link, fetched_at)")
+        self.index.execute("CREATE INDEX IF NOT EXISTS fetches_kind ON fetches (kind, fetched_at)")
+        self.index.commit()
+
+    def object_path(self, digest, compression):
+        return os.path.join(self.path, 'objects', digest[:2], f"{digest}.{'zst' if compression == 'zstd' else 'gz'}")
+
+    def put(self, link, html, kind='course'):
+        """
+
+        stores the HTML of a page fetched from link and returns its digest
+
+        """
+
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest, self.compression)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.compression == 'zstd':
+                data = optional_import('zstandard').ZstdCompressor().compress(data)
+            else:
+                data = gzip.compress(data)
+            # write under a temporary name first so that a crash never leaves a truncated page behind
+            temp = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.replace(temp, path)
+        with self.lock:
+            self.index.execute("INSERT INTO fetches VALUES (?, ?, ?, ?, ?)",
+                               (link, kind, time.time(), digest, self.compression))
+            self.index.commit()
+
+        return digest
+
+    def read(self, digest, compression):
+        """
+
+        returns the HTML of an archived page given its digest
+
+        """
+
+        with open(self.object_path(digest, compression), 'rb') as f:
+            data = f.read()
+        if compression == 'zstd':
+            data = optional_import('zstandard').ZstdDecompressor().decompress(data)
+        else:
+            data = gzip.decompress(data)
+
+        return data.decode('utf-8')
+
+    def latest(self, link):
+        """
+
+        returns the HTML of the last fetch of link, or None if it was never archived
+
+        """
+
+        with self.lock:
+            row = self.index.execute("""SELECT digest, compression FROM fetches WHERE link = ?
+                                        ORDER BY fetched_at DESC LIMIT 1""", (link,)).fetchone()
+        return self.read(*row) if row else None
+
+    def iter_pages(self, kind='course', since=None, latest_only=True):
+        """
+
+        Yields link and HTML pairs of the archived pages of a kind, one page at a time, so that any number of pages can
+        be parsed again with parse_pages without loading them into memory. Pass a Unix time as since to leave out
+        older fetches, and set latest_only to False to get every fetch of a link rather than only the last one.
+
+        """
+
+        query = "SELECT link, digest, compression, MAX(fetched_at) FROM fetches WHERE kind = ? AND fetched_at >= ?"
+        query += " GROUP BY link" if latest_only else " GROUP BY rowid"
+        # a connection of its own lets the archive be read while pages are still being added to it
+        reader = sqlite3.connect(os.path.join(self.path, 'index.sqlite'))
         try:
-            course['number_of_lectures'] = browser.find_element_by_xpath(
-                "//div[@data-purpose='curriculum-stats']").text.split(' • ')[1]
-            course['total_video_duration'] = browser.find_element_by_xpath(
-                "//div[@data-purpose='curriculum-stats']").text.split(' • ')[2][:-12]
-            break
-        except NoSuchElementException:
+            for link, digest, compression, _ in reader.execute(query, (kind, since or 0)):
+                yield link, self.read(digest, compression)
+        finally:
+            reader.close()
+
+    def close(self):
+        with self.lock:
+            self.index.close()
+
+
+def archive_page(browser, link, kind, settings=None):
+    """
+
+    keeps a copy of the page currently in the browser if an archive is set
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    if settings['archive'] is not None:
+        settings['archive'].put(link, browser.page_source, kind)
+
+
+def course_scraper(browser, courses, link, settings=None):
+    """
+
+    This checks if minimum requirements are met before scraping all details related to the description of the course.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+# =========================Minimum Requirement Check=============================
+    with profile(settings, 'requirement check', link):
+        try:
+            wait_until(browser, EC.presence_of_element_located((By.CSS_SELECTOR, ', '.join(
+                p.requirements.css['enrollment'] for p in SELECTOR_PROFILES.values()))), 'course_scraper enrollment')
+        except TimeoutException:
+            print(f"Unable to parse current page. Skipping page :: {link}")
             return False, courses
-        except IndexError:
+        # the page format is picked once and its selectors are used for the rest of the page
+        page_format = detect_format(browser)
+        if page_format is None:
             return False, courses
-        except StaleElementReferenceException:
-            time.sleep(1)
-            continue
+        requirements = parse_requirements(take_snapshot(browser, SELECTOR_PROFILES[page_format].requirements,
+                                                        settings['extraction']), page_format)
+    if requirements is None:
+        return False, courses
+    page_format, enrolled, num_of_reviews, language = requirements
+    if not meets_requirements(enrolled, num_of_reviews, language, settings['requirements']):
+        return False, courses  # skip scraping if not
+# ===============================Scrape Page=====================================
+    if page_format == 'original':
+        with profile(settings, 'scrape_original', link):
+            proceed, courses = scrape_original(browser, courses, link, settings)
+    else:
+        with profile(settings, 'scrape_revised', link):
+            proceed, courses = scrape_revised(browser, courses, link, settings)
+
+    return proceed, courses
+
+
+def review_scraper(browser, reviews, link, settings=None):
+    """
+
+    This scrapes all details about the reviews of a course.
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    max_reviews = settings['max_reviews']
+    # when refreshing, there is no need to go past the reviews that are already stored
+    known = settings['refresh'].known_reviews(link) if settings['refresh'] is not None else set()
+
+    def reached_known():
+        rows = parse_reviews(bulk_snapshot(browser, REVIEW_SELECTORS.css, css=True), link)
+        return len(new_reviews(rows, known)) < len(rows)
+
+    # expand the review section until it shows max_reviews reviews or there are no more
+    def more_reviews_shown(b):
+        found = len(b.find_elements_by_css_selector(REVIEW_SELECTORS.css['review']))
+        return found if found > shown else False
+
+    shown = len(browser.find_elements_by_css_selector(REVIEW_SELECTORS.css['review']))
+    while shown < max_reviews and not (known and reached_known()):
+        try:
+            browser.find_element_by_xpath(
+                "//button[@data-purpose='show-more-review-button']").click()
+            shown = wait_until(browser, more_reviews_shown, 'review_scraper show more')
+        except (NoSuchElementException, StaleElementReferenceException, TimeoutException):
+            break
+    # expand to reveal the complete review of long reviews that are partially hidden
+    see_more = browser.find_elements_by_xpath(
+        "//div[@data-purpose='landing-page-review-list']//label[contains(@class,'show-more--focusable-label--14fP5')]")
+    if see_more:
+        for s in see_more:
+            try:
+                s.click()
+            except ElementClickInterceptedException:
+                browser.execute_script("arguments[0].click();", s)
+
+    rows = parse_reviews(take_snapshot(browser, REVIEW_SELECTORS, settings['extraction']), link)
+    reviews.extend(new_reviews(rows, known)[:max_reviews])
+
+    return reviews
+
+
+def expand_bio_original(browser):
+    """
+
+    expand the instructor bios of the original page format
+
+    """
+
+    see_more_bio = browser.find_elements_by_xpath(
+        "//button[contains(@class,'instructor--view-more-wrapper__button--2egB6')]")
+    for s in see_more_bio:
+        try:
+            s.click()
+        except ElementClickInterceptedException:
+            browser.execute_script("arguments[0].click();", s)
+
+
+def expand_bio_revised(browser):
+    """
+
+    expand the instructor bios of the revised page format
+
+    """
+
+    see_more_bio = browser.find_elements_by_xpath(
+        "//div[@class='styles--instructors--2JsS3']//label")
+    for s in see_more_bio:
+        try:
+            s.click()
+        except ElementClickInterceptedException:
+            browser.execute_script("arguments[0].click();", s)
+
+
+def scrape_original(browser, courses, link, settings=None):
+    """
+
+    This scrapes course information from original page format
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    # expand topic section if it is possible
+    expand_section(
+        browser, "//div[@class='what-you-get']//button[contains(@class,'js-simple-collapse-more-btn')]", settings)
+    # expand course description section if it is possible
+    expand_section(
+        browser, "//div[contains(@data-purpose,'course-description')]//button[contains(@class,js-simple-collapse-more-btn)]", settings)
     # expand course lectures if it is possible
     expand_toggle(
-        browser, '//button[contains(@class,"curriculum--show-more--2tshH")]')
-    expand_toggle(browser, '//button[@data-purpose="expand-toggle"]')
-    titles = browser.find_elements_by_xpath(
-        "//div[@class='section--lecture-title-and-description--3lul7']")
-    duration = browser.find_elements_by_xpath(
-        "//span[@class='section--lecture-content--2I4Bi']")
-    # attempt to capture lecture titles and durations; if encountered a change of the DOM, wait 2 seconds
-    while True:
-        try:
-            course['lectures_breakdown'] = list(
-                zip([t.text for t in titles], [d.text for d in duration]))
-        except StaleElementReferenceException:
-            time.sleep(1)
-            continue
-        break
+        browser, '//a[@data-purpose="load-full-curriculum" or @data-purpose="toggle-section"]', settings)
+    expand_toggle(browser, '//a[@class="sections-toggle"]', settings)
+    expand_bio_original(browser)
 
-    # Free courses will not be scraped.
-    try:
-        course['original_price'] = browser.find_element_by_xpath(
-            "//div[contains(@class,'course-landing-page__purchase-section__main')]//div[@data-purpose='original-price-container']//s/span").text
-    except NoSuchElementException:
+    course = parse_course(take_snapshot(browser, SELECTOR_PROFILES['original'].course, settings['extraction']), link, 'original')
+    if course is None:
         return False, courses
+    course['course_id'] = browser.execute_script(COURSE_ID_SCRIPT)
+    courses.append(course)
+    return True, courses
 
-    # find out if there is one or more instructors information and process them separately
-    instructors = browser.find_elements_by_class_name("styles--instructors--2JsS3")
-    if len(instructors) > 1:
-        # add '-&-' between the names of instructors
-        course['instructor_name'] = ' -&- '.join([i.find_element_by_class_name(
-            "instructor--instructor__title--34ItB").text for i in instructors])
-        course['instructor_bio'], stats = get_bio_stats_revised(browser)
-        # create a list of different instructors for each stat
-        course['group_instructor_rating'] = stats[::4]
-        course['group_reviews'] = stats[1::4]
-        course['group_students'] = stats[2::4]
-        course['group_courses'] = stats[3::4]
 
-    else:
-        course['instructor_name'] = instructors[0].find_element_by_class_name(
-            "instructor--instructor__title--34ItB").text
-        course['instructor_bio'], stats = get_bio_stats_revised(browser)
-        course['instructor_rating'], course['total_reviews'], course['total_students'], course['total_courses'] = stats[0], stats[1], stats[2], stats[3]
+def scrape_revised(browser, courses, link, settings=None):
+    """
 
+    This scrapes course information from revised page format
+
+    """
+
+    settings = settings or DEFAULT_SETTINGS
+    # expand topic section if it is possible
+    expand_section(
+        browser, "//div[@class='what-you-will-learn--what-will-you-learn--mnJ5T']//label", settings)
+    # expand course description section if it is possible
+    expand_section(
+        browser, "//div[contains(@class,'styles--description--3y4KY')]//label", settings)
+    # expand course lectures if it is possible
+    expand_toggle(
+        browser, '//button[contains(@class,"curriculum--show-more--2tshH")]', settings)
+    expand_toggle(browser, '//button[@data-purpose="expand-toggle"]', settings)
+    expand_bio_revised(browser)
+
+    course = parse_course(take_snapshot(browser, SELECTOR_PROFILES['revised'].course, settings['extraction']), link, 'revised')
+    if course is None:
+        return False, courses
+    course['course_id'] = browser.execute_script(COURSE_ID_SCRIPT)
     courses.append(course)
     return True, courses
+
+
+# ===========================Command Line========================================
+def output_sink(path):
+    """
+
+    returns the sink that writes to path going by its extension, or None for a .csv file, which is written at the end
+
+    """
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return None
+    if ext == '.jsonl':
+        return JSONLSink(path)
+    if ext in ('.sqlite', '.sqlite3', '.db'):
+        return SQLiteSink(path)
+    return ParquetSink(path)
+
+
+def main(argv=None):
+    """
+
+    Runs a scrape job from the command line, as in python -m udemine "python machine learning" -c "Machine Learning"
+    -o udemy.sqlite, and writes what it finds to every output given. Courses go to a .csv file as it is named and
+    their reviews to the same name with _reviews added; .jsonl and .sqlite outputs and Parquet folders are written
+    as the job goes along.
+
+    """
+
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m udemine', description='Scrapes Udemy courses and their reviews.')
+    parser.add_argument('search_term', nargs='?', default='python machine learning')
+    parser.add_argument('-c', '--category', default='Machine Learning', help='category to filter the results by')
+    parser.add_argument('-q', '--query', nargs=2, action='append', metavar=('SEARCH_TERM', 'CATEGORY'),
+                        help='run a batch of searches, each course scraped once; may be given more than once')
+    parser.add_argument('-o', '--output', action='append', default=[],
+                        help='.csv, .jsonl or .sqlite file or Parquet folder to write to; may be given more than once'
+                             ' (default: udemy_courses.csv)')
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('--listing-workers', type=int, default=1)
+    parser.add_argument('--extraction', choices=EXTRACTIONS, default='element')
+    parser.add_argument('--max-reviews', type=int, default=50)
+    parser.add_argument('--review-source', choices=REVIEW_SOURCES, default='browser')
+    parser.add_argument('--visited', help='SQLite file of links to leave out, updated with every link visited')
+    parser.add_argument('--checkpoint', help='file to log the progress of the job to')
+    parser.add_argument('--resume', action='store_true', help='carry on from the checkpoint')
+    parser.add_argument('--refresh', help='SQLite file of listing cards, to only scrape changed courses again')
+    parser.add_argument('--archive', help='folder to keep a copy of every page visited in')
+    parser.add_argument('--filter-cache', help='file to remember the filtered search URLs in')
+    parser.add_argument('--base-url', default='https://www.udemy.com')
+    parser.add_argument('--work-queue', help='SQLite file or redis:// URL to hand the course links out through')
+    parser.add_argument('--worker', action='store_true',
+                        help='only scrape course links off the work queue, as a worker node of a scrape job')
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        if not args.work_queue:
+            parser.error('--worker needs --work-queue')
+        queue_worker(args.work_queue, args.workers, args.extraction, args.archive, args.max_reviews,
+                     args.review_source)
+        return
+    if args.query:
+        for option, given in (('--work-queue', args.work_queue), ('--checkpoint', args.checkpoint),
+                              ('--resume', args.resume), ('--listing-workers', args.listing_workers != 1)):
+            if given:
+                parser.error(f'{option} is not used by a batch of searches')
+
+    options = dict(workers=args.workers, extraction=args.extraction, max_reviews=args.max_reviews,
+                   review_source=args.review_source, visited_path=args.visited, refresh=args.refresh,
+                   archive=args.archive, filter_cache=args.filter_cache, base_url=args.base_url)
+    try:
+        # the input variables are checked here, before any output file is made
+        if args.query:
+            results = iter_batch(args.query, **options)
+        else:
+            results = iter_scrape(args.search_term, args.category, listing_workers=args.listing_workers,
+                                  checkpoint=args.checkpoint, resume=args.resume, work_queue=args.work_queue,
+                                  **options)
+    except (TypeError, ValueError) as e:
+        parser.error(str(e))
+
+    outputs = args.output or ['udemy_courses.csv']
+    csvs = [path for path in outputs if path.lower().endswith('.csv')]
+    reviews, courses = ColumnBuffer(REVIEW_COLUMNS), list()
+    sinks = list()
+    try:
+        sinks.extend(sink for sink in map(output_sink, outputs) if sink is not None)
+        for course, rows in stream_to(results, *sinks):
+            if csvs:  # otherwise everything is streamed to the sinks and no DataFrames are built
+                courses.append(course)
+                reviews.extend(rows)
+    finally:
+        for sink in sinks:
+            sink.close()
+    if csvs:
+        reviews, courses = reviews.to_frame(), pd.DataFrame(courses)
+    for path in csvs:
+        root, ext = os.path.splitext(path)
+        courses.to_csv(path, index=False)
+        reviews.to_csv(f'{root}_reviews{ext}', index=False)
+
+if __name__ == '__main__':
+    main()